@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from dataclasses import dataclass, replace
+from typing import Callable, Deque, List, Optional, Sequence, Tuple, Union
+
+from .config import AppConfig
+
+
+logger = logging.getLogger(__name__)
+
+# (sender, subject, body) – Eingabe einer Klassifikation
+ClassifyItem = Tuple[str, str, str]
+ClassifyResult = Union[List[str], BaseException]
+
+
+@dataclass(slots=True)
+class Account:
+    """Ein Gmail-Postfach im Multi-Mailbox-Modus (eigene Token-Datei)."""
+
+    name: str
+    token_path: str
+
+
+def account_from_token(token_path: str) -> Account:
+    """Leitet den Kontonamen aus der Token-Datei ab (`token_shop.json` -> `shop`)."""
+    stem = os.path.splitext(os.path.basename(token_path))[0]
+    for prefix in ("token_", "token-", "token."):
+        if stem.startswith(prefix) and len(stem) > len(prefix):
+            stem = stem[len(prefix):]
+            break
+    return Account(name=stem, token_path=token_path)
+
+
+def account_file(path: str, name: str) -> str:
+    """`.gmail_history.json` -> `.gmail_history.<name>.json` (Zustand pro Konto getrennt)."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{name}{ext}"
+
+
+def account_config(cfg: AppConfig, account: Account) -> AppConfig:
+    """Kopie der Konfiguration mit eigenen State-/Cache-Dateien für `account`."""
+    return replace(
+        cfg,
+        history_state_file=account_file(cfg.history_state_file, account.name),
+        message_cache_file=account_file(cfg.message_cache_file, account.name),
+        label_cache_file=account_file(cfg.label_cache_file, account.name),
+    )
+
+
+def mailbox_config(cfg: AppConfig, token_path: str = "token.json") -> Tuple[AppConfig, Optional[Account]]:
+    """Konfiguration für ein einzelnes Postfach (backfill, model train) wie im Multi-Mailbox-Lauf.
+
+    Nur das Standard-Postfach ohne GMAIL_ACCOUNTS nutzt die Dateien unverändert;
+    jede andere Token-Datei bekommt eigene State-/Cache-Dateien (`account_config`).
+    """
+    if not cfg.gmail_accounts and token_path == "token.json":
+        return cfg, None
+    account = account_from_token(token_path)
+    return account_config(cfg, account), account
+
+
+class ClassificationPool:
+    """Gemeinsamer, begrenzter Klassifikations-Pool vor Ollama für mehrere Konten.
+
+    Alle Konten teilen sich eine Classifier-Instanz (ein Modell, ein Satz
+    Verbindungen). Höchstens `workers` Anfragen laufen gleichzeitig, jede mit
+    bis zu `batch_size` Mails desselben Kontos; wartende Aufträge werden reihum
+    pro Konto vergeben, damit ein volles Postfach die anderen nicht aushungert.
+    """
+
+    def __init__(
+        self,
+        classify_many: Callable[..., List[ClassifyResult]],
+        workers: int = 1,
+        batch_size: int = 1,
+    ) -> None:
+        self._classify_many = classify_many
+        self._batch_size = max(1, batch_size)
+        self._queues: "OrderedDict[str, Deque[Tuple[Future, ClassifyItem]]]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"classify-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, account: str, item: ClassifyItem) -> Future:
+        fut: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("ClassificationPool ist geschlossen")
+            self._queues.setdefault(account, deque()).append((fut, item))
+            self._cond.notify()
+        return fut
+
+    def classify_many(self, account: str, items: Sequence[ClassifyItem]) -> List[ClassifyResult]:
+        """Klassifiziert `items` für `account` (Reihenfolge bleibt, Fehler als Exception im Ergebnis)."""
+        futures = [self.submit(account, item) for item in items]
+        results: List[ClassifyResult] = []
+        for fut in futures:
+            try:
+                results.append(fut.result())
+            except Exception as exc:
+                results.append(exc)
+        return results
+
+    def _next_jobs(self) -> Optional[List[Tuple[Future, ClassifyItem]]]:
+        with self._cond:
+            while True:
+                for account, queue in self._queues.items():
+                    if queue:
+                        jobs = [queue.popleft() for _ in range(min(self._batch_size, len(queue)))]
+                        # Konto ans Ende der Reihe -> Round-Robin
+                        self._queues.move_to_end(account)
+                        return jobs
+                if self._closed:
+                    return None
+                self._cond.wait()
+
+    def _worker(self) -> None:
+        while True:
+            jobs = self._next_jobs()
+            if jobs is None:
+                return
+            jobs = [(fut, item) for fut, item in jobs if fut.set_running_or_notify_cancel()]
+            if not jobs:
+                continue
+            try:
+                # Parallelität regelt der Pool selbst (ein Worker = eine Anfrage)
+                results = self._classify_many([item for _, item in jobs], concurrency=1)
+            except Exception as exc:
+                results = [exc] * len(jobs)
+            for (fut, _), res in zip(jobs, results):
+                if isinstance(res, BaseException):
+                    fut.set_exception(res)
+                else:
+                    fut.set_result(res)
+
+    def close(self) -> None:
+        """Beendet die Worker, nachdem alle wartenden Aufträge abgearbeitet sind."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join()
@@ -0,0 +1,179 @@
+"""Backfill: ganzes Postfach (beliebige Query) blockweise klassifizieren.
+
+Verwendung:
+    python -m app.backfill --q "in:inbox" [--batch-size 100] [--dry-run] [--restart]
+
+Der Fortschritt (Seiten-Token, bereits verarbeitete IDs der aktuellen Seite,
+Zähler) wird nach jedem Block in einer Checkpoint-Datei gesichert; ein
+abgebrochener Lauf setzt beim nächsten Start an derselben Stelle fort. Im
+Speicher liegt immer nur eine Seite IDs (max. 500) plus ein Block Nachrichten.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+from .accounts import account_file, mailbox_config
+from .config import load_config
+from .main import build_classifier, build_gmail, label_messages, prepare_labels
+
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILE = ".gmail_backfill.json"
+
+
+@dataclass(slots=True)
+class BackfillCheckpoint:
+    """Fortschritt eines Backfills; `page_token` ist das Token der *aktuellen* Seite."""
+
+    query: str
+    page_token: Optional[str] = None
+    done_ids: List[str] = field(default_factory=list)
+    processed: int = 0
+    written: int = 0
+    finished: bool = False
+
+    @classmethod
+    def load(cls, path: str, query: str) -> "BackfillCheckpoint":
+        if not os.path.exists(path):
+            return cls(query=query)
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as exc:
+            logger.warning("Checkpoint %s nicht lesbar (%s), starte von vorn", path, exc)
+            return cls(query=query)
+        if data.get("query") != query:
+            logger.warning("Checkpoint %s gehört zu anderer Query (%s), starte von vorn", path, data.get("query"))
+            return cls(query=query)
+        return cls(
+            query=query,
+            page_token=data.get("page_token"),
+            done_ids=list(data.get("done_ids", [])),
+            processed=int(data.get("processed", 0)),
+            written=int(data.get("written", 0)),
+            finished=bool(data.get("finished", False)),
+        )
+
+    def save(self, path: str) -> None:
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(asdict(self), f)
+        os.replace(tmp, path)
+
+
+def _format_eta(seconds: float) -> str:
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    return f"{hours}h{rest // 60:02d}m" if hours else f"{rest // 60}m{rest % 60:02d}s"
+
+
+def backfill(
+    query: str,
+    batch_size: int = 100,
+    checkpoint_path: str = CHECKPOINT_FILE,
+    dry_run: bool | None = None,
+    restart: bool = False,
+    limit: Optional[int] = None,
+    token_path: str = "token.json",
+) -> BackfillCheckpoint:
+    """Klassifiziert alle Treffer von `query` in Blöcken von `batch_size` Nachrichten.
+
+    Für andere Postfächer als token.json (bzw. mit GMAIL_ACCOUNTS) gelten
+    eigene Label-/Cache-Dateien und ein eigener Checkpoint pro Konto.
+    """
+    cfg, account = mailbox_config(load_config(), token_path)
+    if account is not None:
+        checkpoint_path = account_file(checkpoint_path, account.name)
+        logger.info("Postfach: %s (Checkpoint %s)", token_path, checkpoint_path)
+    if dry_run is not None:
+        cfg.dry_run = dry_run
+    checkpoint = BackfillCheckpoint(query=query) if restart else BackfillCheckpoint.load(checkpoint_path, query)
+    if checkpoint.finished:
+        logger.info("Backfill für q=%.120s bereits abgeschlossen (%d Nachrichten). --restart für Neustart.", query, checkpoint.processed)
+        return checkpoint
+
+    gmail = build_gmail(cfg, token_path)
+    classifier = build_classifier(cfg)
+    try:
+        registry = prepare_labels(cfg, gmail)
+
+        logger.info(
+            "Backfill | q=%.120s | Block=%d | dry_run=%s | fortgesetzt bei %d Nachrichten",
+            query, batch_size, cfg.dry_run, checkpoint.processed,
+        )
+        started = time.monotonic()
+        session_processed = 0
+        for ids, next_token, estimate in gmail.iter_message_pages(query, checkpoint.page_token):
+            done = set(checkpoint.done_ids)
+            pending = [mid for mid in ids if mid not in done]
+            for start in range(0, len(pending), batch_size):
+                block = pending[start:start + batch_size]
+                if limit is not None:
+                    block = block[: max(0, limit - session_processed)]
+                if not block:
+                    break
+                checkpoint.written += label_messages(cfg, gmail, registry, classifier.classify_many, block)
+                checkpoint.processed += len(block)
+                checkpoint.done_ids.extend(block)
+                if not cfg.dry_run:
+                    checkpoint.save(checkpoint_path)
+                session_processed += len(block)
+
+                elapsed = max(1e-6, time.monotonic() - started)
+                rate = session_processed / elapsed
+                total = max(estimate, checkpoint.processed)
+                logger.info(
+                    "Backfill: %d/~%d (%.1f%%) | %d geändert | %.1f Nachr./s | ETA %s",
+                    checkpoint.processed, total, 100.0 * checkpoint.processed / max(1, total),
+                    checkpoint.written, rate, _format_eta((total - checkpoint.processed) / max(rate, 1e-6)),
+                )
+            if limit is not None and session_processed >= limit:
+                logger.info("Limit von %d Nachrichten erreicht, Backfill pausiert", limit)
+                break
+            # Seite vollständig: nächste Seite als Wiederaufsetzpunkt merken
+            checkpoint.page_token = next_token
+            checkpoint.done_ids = []
+            checkpoint.finished = not next_token or not ids
+            if not cfg.dry_run:
+                checkpoint.save(checkpoint_path)
+        if checkpoint.finished:
+            logger.info("Backfill abgeschlossen: %d Nachrichten, %d geändert", checkpoint.processed, checkpoint.written)
+        return checkpoint
+    finally:
+        gmail.close()
+        classifier.close()
+
+
+def main() -> None:
+    load_dotenv()
+    ap = argparse.ArgumentParser(description="Ganzes Postfach blockweise klassifizieren (fortsetzbar)")
+    ap.add_argument("--q", default="in:inbox", help="Gmail-Query für den Backfill (Default: in:inbox)")
+    ap.add_argument("--batch-size", type=int, default=100, help="Nachrichten pro Block (Default: 100)")
+    ap.add_argument("--checkpoint", default=CHECKPOINT_FILE, help=f"Checkpoint-Datei (Default: {CHECKPOINT_FILE})")
+    ap.add_argument("--dry-run", action="store_true", help="Nur anzeigen, keine Labels setzen (ohne Checkpoint)")
+    ap.add_argument("--restart", action="store_true", help="Checkpoint ignorieren und von vorn beginnen")
+    ap.add_argument("--limit", type=int, default=None, help="Höchstens N Nachrichten in diesem Lauf")
+    ap.add_argument("--token", default="token.json", help="Token-Datei des Postfachs (Default: token.json)")
+    args = ap.parse_args()
+    backfill(
+        args.q,
+        batch_size=max(1, args.batch_size),
+        checkpoint_path=args.checkpoint,
+        dry_run=True if args.dry_run else None,
+        restart=args.restart,
+        limit=args.limit,
+        token_path=args.token,
+    )
+
+
+if __name__ == "__main__":
+    main()
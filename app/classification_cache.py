@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+# (sender, subject, body) – wie in Classifier.classify_many
+CacheItem = Tuple[str, str, str]
+
+# 64-Bit-SimHash in 8 Bändern à 8 Bit: bei Hamming-Abstand <= 7 stimmt mindestens ein Band exakt
+_BANDS = 8
+_BAND_BITS = 8
+_BAND_COLUMNS = [f"band{i}" for i in range(_BANDS)]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS classifications (
+    key         TEXT PRIMARY KEY,
+    sender_key  TEXT NOT NULL,
+    simhash     INTEGER NOT NULL,
+    {bands},
+    labels      TEXT NOT NULL,
+    accessed_at REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_classifications_accessed ON classifications(accessed_at);
+{band_indexes}
+CREATE TABLE IF NOT EXISTS cache_meta (
+    name  TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+""".format(
+    bands=",\n    ".join(f"{col:<11} INTEGER NOT NULL" for col in _BAND_COLUMNS),
+    band_indexes="\n".join(
+        f"CREATE INDEX IF NOT EXISTS idx_classifications_{col} ON classifications(sender_key, {col});"
+        for col in _BAND_COLUMNS
+    ),
+)
+
+_URL_RE = re.compile(r"https?://\S+|www\.\S+", re.IGNORECASE)
+_MAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_DATE_RE = re.compile(r"\b\d{1,4}[./-]\d{1,2}[./-]\d{1,4}\b|\b\d{1,2}:\d{2}(?::\d{2})?\b")
+# Jedes Token mit Ziffer: Beträge, Bestell-/Sendungsnummern, Codes
+_NUMBER_RE = re.compile(r"[^\W\d_]*\d[\w.,/-]*")
+_SPACE_RE = re.compile(r"\s+")
+_ADDRESS_RE = re.compile(r"<([^>]+)>")
+
+# Body-Länge, die in den Fingerprint eingeht (entspricht der Klassifikationseingabe)
+NORMALIZED_BODY_CHARS = 1000
+
+
+def normalize_text(text: str) -> str:
+    """Maskiert URLs, Adressen, Datumsangaben und Zahlen; Kleinschreibung, Whitespace vereinheitlicht."""
+    text = _URL_RE.sub(" <url> ", text or "")
+    text = _MAIL_RE.sub(" <mail> ", text)
+    text = _DATE_RE.sub(" <datum> ", text)
+    text = _NUMBER_RE.sub(" # ", text)
+    return _SPACE_RE.sub(" ", text).strip().lower()
+
+
+def sender_key(sender: str) -> str:
+    """Absender-Domain (`"Shop <news@shop.de>"` -> `shop.de`); Grundlage für Nahe-Duplikate."""
+    match = _ADDRESS_RE.search(sender or "")
+    address = (match.group(1) if match else sender or "").strip().lower()
+    return address.rsplit("@", 1)[-1] if "@" in address else address
+
+
+def normalized_sender(sender: str) -> str:
+    """Absenderadresse klein, Ziffern maskiert (`bounce-4711@x.de` -> `bounce-#@x.de`)."""
+    match = _ADDRESS_RE.search(sender or "")
+    address = (match.group(1) if match else sender or "").strip().lower()
+    return _NUMBER_RE.sub("#", address)
+
+
+def _signed64(value: int) -> int:
+    """SQLite speichert INTEGER vorzeichenbehaftet (64 Bit)."""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def simhash(text: str) -> int:
+    """64-Bit-SimHash über Wort-Bigramme des normalisierten Texts."""
+    tokens = text.split()
+    shingles = [" ".join(tokens[i : i + 2]) for i in range(max(1, len(tokens) - 1))] if tokens else [""]
+    weights = [0] * 64
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def _normalized_parts(item: CacheItem) -> Tuple[str, str, str]:
+    sender, subject, body = item
+    return normalized_sender(sender), normalize_text(subject), normalize_text((body or "")[:NORMALIZED_BODY_CHARS])
+
+
+def _key(parts: Tuple[str, str, str]) -> str:
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+def exact_key(item: CacheItem) -> str:
+    """Schlüssel der normalisierten Mail; gleich für Mails, die sich nur in maskierten Teilen unterscheiden."""
+    return _key(_normalized_parts(item))
+
+
+def fingerprint(item: CacheItem) -> Tuple[str, str, int]:
+    """(exakter Schlüssel, Absender-Domain, SimHash) einer Mail."""
+    parts = _normalized_parts(item)
+    return _key(parts), sender_key(item[0]), simhash(f"{parts[1]} {parts[2]}")
+
+
+def _bands(value: int) -> List[int]:
+    mask = (1 << _BAND_BITS) - 1
+    return [(value >> (i * _BAND_BITS)) & mask for i in range(_BANDS)]
+
+
+class ClassificationCache:
+    """Lokaler SQLite-Cache für Klassifikationsergebnisse (Vorlagen-Mails).
+
+    Versand-, Bank- und Newsletter-Mails unterscheiden sich oft nur in Nummern,
+    Beträgen und Links. Absender, Betreff und Body werden daher normalisiert
+    (Zahlen, Datumsangaben, URLs maskiert) und über einen exakten Hash sowie
+    einen 64-Bit-SimHash nachgeschlagen; ähnliche Mails desselben Absenders
+    (Hamming-Abstand <= `max_distance`) übernehmen das gespeicherte Ergebnis.
+    Einträge gehören zu einer Modell-/Prompt-Version; ändert sich diese, wird
+    der Cache geleert. Ab `max_entries` werden die ältesten Zugriffe verdrängt.
+    """
+
+    def __init__(
+        self,
+        path: str = ".gmail_classifications.sqlite3",
+        max_entries: int = 20000,
+        max_distance: int = 6,
+    ) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        # Mehr als _BANDS - 1 Bit Abstand findet der Band-Index nicht garantiert
+        self.max_distance = max(0, min(max_distance, _BANDS - 1))
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def set_version(self, version: str) -> None:
+        """Verwirft alle Einträge, wenn sie zu einer anderen Modell-/Prompt-Version gehören."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM cache_meta WHERE name = 'version'").fetchone()
+            if row is not None and row[0] == version:
+                return
+            if row is not None:
+                logger.info("Klassifikations-Cache: Modell/Prompt geändert, Cache geleert")
+            self._conn.execute("DELETE FROM classifications")
+            self._conn.execute(
+                "INSERT INTO cache_meta (name, value) VALUES ('version', ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+                (version,),
+            )
+            self._conn.commit()
+
+    def lookup(self, items: Sequence[CacheItem]) -> List[Optional[List[str]]]:
+        """Gespeicherte Labels je Mail (exakt oder nahes Duplikat), sonst `None`."""
+        results: List[Optional[List[str]]] = []
+        now = time.time()
+        with self._lock:
+            for item in items:
+                key, domain, value = fingerprint(item)
+                row = self._conn.execute("SELECT labels FROM classifications WHERE key = ?", (key,)).fetchone()
+                hit_key = key if row is not None else None
+                if row is None and self.max_distance > 0:
+                    hit_key, row = self._nearest(domain, value)
+                if row is None:
+                    self.misses += 1
+                    results.append(None)
+                    continue
+                if hit_key == key:
+                    self.hits += 1
+                else:
+                    self.near_hits += 1
+                self._conn.execute("UPDATE classifications SET accessed_at = ? WHERE key = ?", (now, hit_key))
+                results.append(json.loads(row[0]))
+            self._conn.commit()
+        return results
+
+    def _nearest(self, domain: str, value: int) -> Tuple[Optional[str], Optional[Tuple[str]]]:
+        bands = _bands(value)
+        where = " OR ".join(f"{col} = ?" for col in _BAND_COLUMNS)
+        candidates = self._conn.execute(
+            f"SELECT key, simhash, labels FROM classifications WHERE sender_key = ? AND ({where})",
+            (domain, *bands),
+        ).fetchall()
+        best: Tuple[Optional[str], Optional[Tuple[str]]] = (None, None)
+        best_distance = self.max_distance + 1
+        for key, stored, labels in candidates:
+            distance = bin((stored & ((1 << 64) - 1)) ^ value).count("1")
+            if distance < best_distance:
+                best, best_distance = (key, (labels,)), distance
+        return best
+
+    def store(self, items: Sequence[CacheItem], results: Sequence[List[str]]) -> None:
+        """Speichert Ergebnisse (nur bestätigte LLM-Antworten übergeben)."""
+        now = time.time()
+        rows = []
+        for item, labels in zip(items, results):
+            key, domain, value = fingerprint(item)
+            rows.append((key, domain, _signed64(value), *_bands(value), json.dumps(list(labels), ensure_ascii=False), now))
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO classifications (key, sender_key, simhash, {bands}, labels, accessed_at)
+                VALUES ({marks})
+                ON CONFLICT(key) DO UPDATE SET
+                    labels = excluded.labels,
+                    accessed_at = excluded.accessed_at
+                """.format(bands=", ".join(_BAND_COLUMNS), marks=", ".join("?" * (_BANDS + 5))),
+                rows,
+            )
+            self._conn.commit()
+        self._evict()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "near_hits": self.near_hits, "misses": self.misses}
+
+    def _evict(self) -> None:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM classifications").fetchone()[0]
+            excess = count - self.max_entries
+            if excess <= 0:
+                return
+            self._conn.execute(
+                "DELETE FROM classifications WHERE key IN "
+                "(SELECT key FROM classifications ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+            self._conn.commit()
+        logger.debug("Klassifikations-Cache: %d Einträge verdrängt", excess)
@@ -1,13 +1,25 @@
 from __future__ import annotations
 
+import asyncio
+import functools
+import hashlib
 import json
 import logging
-from typing import List
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
 import httpx
 import time
 
-from .utils import heuristic_labels
+from .classification_cache import ClassificationCache, exact_key
+from .local_model import LocalModel
+from .sender_memory import SenderMemory
+from .heuristics import HeuristicEngine, load_engine
+
+if TYPE_CHECKING:
+    # numpy nur, wenn der Embedding-Index aktiv ist
+    from .embedding_index import EmbeddingIndex
 
 
 def _extract_labels_json(text: str) -> dict | None:
@@ -42,31 +54,433 @@ def _extract_labels_json(text: str) -> dict | None:
 
 logger = logging.getLogger(__name__)
 
+ClassifyResult = Union[List[str], BaseException]
+
+
+class _Unconfirmed(list):
+    """Labels ohne Ollama-Antwort in diesem Aufruf; werden weder gecacht noch gelernt noch gezählt.
+
+    Dazu gehören Fehler-/Heuristik-Fallbacks, Heuristik-zuerst, Cache-Treffer
+    (auch Duplikate im selben Lauf), das lokale Modell und Embedding-Nachbarn.
+    """
+
+
+# Body-Länge pro Mail im Batch-Prompt (mehrere Mails teilen sich ein Kontextfenster)
+BATCH_BODY_CHARS = 600
+# Body-Länge pro Mail für Embeddings (wie die Eingabe des lokalen Modells)
+EMBED_BODY_CHARS = 1000
+
+# Few-Shot-Beispiele (Eingabe, erwartete Labels)
+_FEW_SHOTS = [
+    ("From: rechnung@firma.de\nSubject: Ihre Rechnung 2025-09\nBody: Betrag 129,00 EUR, Zahlungsziel 14 Tage.", ["Rechnung"]),
+    ("From: shop@beispiel.de\nSubject: Versandbestätigung Bestellung 12345\nBody: Ihr Paket ist unterwegs, Tracking enthalten.", ["Shopping"]),
+    ("From: noreply@bank.de\nSubject: Neue Anmeldung erkannt\nBody: Falls Sie das nicht waren, ändern Sie sofort Ihr Passwort.", ["Warnung"]),
+    ("From: CloudPlatform-noreply@google.com\nSubject: [Legal Update] Google transitions to data processor for reCAPTCHA\nBody: We're writing to let you know... legal terms... data processor...", ["Sonstiges"]),
+    ("From: Bolt\nSubject: Fahre nach deinen Vorstellungen\nBody: Mit der Bolt App... Fahrttypen, Route anpassen, Buchung.", ["Newsletter"]),
+    ("From: news@anbieter.de\nSubject: Angebote der Woche\nBody: -20% auf alles, jetzt zugreifen.", ["Newsletter"]),
+    ("From: Schwerdhoefer, Sebastian\nSubject: Testmail\nBody: Das ist nur ein Test", ["Sonstiges"]),
+    ("From: unknown@random.org\nSubject: Fwd: Meeting\nBody: Unklarer Inhalt, keine klare Kategorie.", ["Sonstiges"]),
+]
+
+
+def _extract_json_object(text: str) -> dict | None:
+    """Erstes bis letztes `{...}` im Text als JSON (Modell schreibt ggf. Text drumherum)."""
+    text = (text or "").strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    start, end = text.find("{"), text.rfind("}")
+    if 0 <= start < end:
+        try:
+            return json.loads(text[start : end + 1])
+        except json.JSONDecodeError:
+            return None
+    return None
+
 
 class Classifier:
-    """Klassifiziert E-Mails per Ollama (lokal) und liefert strukturierte Label-Ausgaben."""
+    """Klassifiziert E-Mails per Ollama (lokal) und liefert strukturierte Label-Ausgaben.
+
+    Hält einen langlebigen `httpx.Client` (Keep-Alive, HTTP/1.1) für alle
+    Anfragen; `aclassify` nutzt analog einen `httpx.AsyncClient`. Nach Gebrauch
+    `close()` bzw. `aclose()` aufrufen (oder als Context-Manager verwenden).
+    """
 
     def __init__(
         self,
         labels_allowed: List[str],
         ollama_base_url: str | None = None,
         ollama_model: str | None = None,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 90.0,
+        max_connections: int = 4,
+        concurrency: int = 1,
+        batch_size: int = 1,
+        keep_alive: str | None = "30m",
+        cache: ClassificationCache | None = None,
+        memory: SenderMemory | None = None,
+        local_model: LocalModel | None = None,
+        heuristics: HeuristicEngine | None = None,
+        heuristics_first: bool = False,
+        embeddings: EmbeddingIndex | None = None,
     ):
         self.labels_allowed = labels_allowed
         self.ollama_base_url = ollama_base_url or "http://localhost:11434"
         self.ollama_model = ollama_model or "qwen2.5:7b-instruct"
+        self._timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(
+            max_connections=max(1, max_connections),
+            max_keepalive_connections=max(1, max_connections),
+            keepalive_expiry=300.0,
+        )
+        self._client = httpx.Client(base_url=self.ollama_base_url.rstrip("/"), timeout=self._timeout, limits=self._limits)
+        self._aclient: httpx.AsyncClient | None = None
+        # classify_many: höchstens `concurrency` Anfragen gleichzeitig (passend zu OLLAMA_NUM_PARALLEL)
+        self.concurrency = max(1, concurrency)
+        # Obergrenze pro Mail: ein Versuch plus ein Retry
+        self.item_timeout = 2 * (read_timeout + connect_timeout)
+        # Frist der laufenden Anfrage je Thread (monotonic); begrenzt die httpx-Timeouts
+        self._deadline = threading.local()
+        # Ein Pool je Parallelität: gleichzeitige Aufrufer mit anderem `concurrency` stören sich nicht
+        self._executors: Dict[int, ThreadPoolExecutor] = {}
+        self._executor_lock = threading.Lock()
+        # > 1: mehrere Mails pro Ollama-Anfrage (System-Prompt/Few-Shots nur einmal pro Batch)
+        self.batch_size = max(1, batch_size)
+        # Wie lange Ollama das Modell nach der letzten Anfrage im Speicher hält
+        self.keep_alive = keep_alive
+        # Einmal aufgebaut und nie verändert: jede Anfrage beginnt mit denselben Bytes,
+        # sodass Ollama den bereits ausgewerteten Prompt-Anfang (KV-Cache) wiederverwendet.
+        self._prefix = self._build_prefix()
+        self._batch_prefix = self._build_batch_prefix()
+        self._format = self._labels_format()
+        # Gleiche Optionen für alle Anfragen: ein abweichendes num_ctx würde das Modell neu laden
+        self._options: dict = {"temperature": 0.2}
+        if self.batch_size > 1:
+            # Mehrere Mails im Prompt: Kontextfenster über den Ollama-Default hinaus
+            self._options["num_ctx"] = 8192
+        # Ändert sich Modell, Prompt oder Schema, passen gecachte Ergebnisse nicht mehr
+        self.prompt_version = hashlib.sha256(
+            json.dumps(
+                [self.ollama_model, self._prefix, self._batch_prefix, self._format, self._options],
+                ensure_ascii=False, sort_keys=True,
+            ).encode("utf-8")
+        ).hexdigest()[:16]
+        self.cache = cache
+        if cache is not None:
+            cache.set_version(self.prompt_version)
+        self.memory = memory
+        self.local_model = local_model
+        self.heuristics = heuristics or load_engine()
+        # Eindeutige Stichwort-Treffer vor dem LLM übernehmen (sonst nur Fallback bei "Sonstiges")
+        self.heuristics_first = heuristics_first
+        # Nächste Nachbarn über Embeddings (/api/embed) vor dem Chat-Modell
+        self.embeddings = embeddings
+
+    def __enter__(self) -> "Classifier":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Schließt die Keep-Alive-Verbindungen zu Ollama."""
+        with self._executor_lock:
+            for executor in self._executors.values():
+                executor.shutdown(wait=False, cancel_futures=True)
+            self._executors.clear()
+        if self.cache is not None:
+            self.cache.close()
+        if self.memory is not None:
+            self.memory.close()
+        if self.local_model is not None:
+            self.local_model.close()
+        self._client.close()
+
+    async def aclose(self) -> None:
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient = None
 
     def classify(self, sender: str, subject: str, body: str) -> List[str]:
         ai_labels = self._classify_via_ollama(sender, subject, body)
+        return self._with_fallback(ai_labels, sender, subject, body)
+
+    def classify_many(
+        self,
+        items: Sequence[Tuple[str, str, str]],
+        concurrency: Optional[int] = None,
+        item_timeout: Optional[float] = None,
+    ) -> List[ClassifyResult]:
+        """Klassifiziert mehrere (sender, subject, body) mit bis zu `concurrency` parallelen Anfragen.
+
+        Die Reihenfolge bleibt erhalten. Fehler und Zeitüberschreitungen (`item_timeout`
+        ab Start der jeweiligen Anfrage) stehen als Exception an der Stelle der Mail,
+        die übrigen Ergebnisse sind davon nicht betroffen. Mit `batch_size` > 1 gehen
+        jeweils bis zu `batch_size` Mails in eine Anfrage; Mails ohne gültige Antwort
+        im Batch werden einzeln nachklassifiziert. Mails von Absendern mit stabiler
+        Historie (Sender-Memory), (nahezu) identische Vorgänger (Cache) und Mails mit
+        übereinstimmenden Embedding-Nachbarn brauchen keine Chat-Anfrage.
+        """
+        k = max(1, concurrency or self.concurrency)
+        timeout = item_timeout if item_timeout is not None else self.item_timeout
+        if self.memory is None or not items:
+            return self._classify_heuristic(items, k, timeout)
+
+        known = [self._known_labels(item[0]) for item in items]
+        ask = [i for i, labels in enumerate(known) if labels is None or self.memory.should_sample()]
+        if len(ask) < len(items):
+            logger.info("Sender-Memory: %d/%d Mails ohne LLM (bekannte Absender)", len(items) - len(ask), len(items))
+        fresh = self._classify_heuristic([items[i] for i in ask], k, timeout)
+        decisions = []
+        results: List[ClassifyResult] = list(known)  # type: ignore[arg-type]
+        for i, res in zip(ask, fresh):
+            results[i] = res
+            # Nur echte LLM-Antworten zählen, keine Abkürzungen (Cache, Heuristik, Modelle)
+            if isinstance(res, (BaseException, _Unconfirmed)):
+                continue
+            decisions.append((items[i][0], res))
+            if known[i] is not None and sorted(res) != sorted(known[i]):
+                logger.info("Sender-Memory Drift: %s bisher %s, LLM jetzt %s", items[i][0], known[i], res)
+        self.memory.record(decisions)
+        return results
+
+    def _known_labels(self, sender: str) -> Optional[List[str]]:
+        labels = self.memory.suggest(sender) if self.memory is not None else None
+        # Nur gültige Labels (LABELS_ALLOWED kann sich seit der Aufzeichnung geändert haben)
+        if labels and all(l in self.labels_allowed for l in labels):
+            return labels
+        return None
+
+    def _classify_heuristic(
+        self, items: Sequence[Tuple[str, str, str]], k: int, timeout: float
+    ) -> List[ClassifyResult]:
+        """Heuristik-zuerst-Modus: eindeutige Stichwort-Treffer ohne LLM."""
+        if not self.heuristics_first or not items:
+            return self._classify_cached(items, k, timeout)
+        decided = [self.heuristics.decide(subject, sender, body) for sender, subject, body in items]
+        rest = [i for i, labels in enumerate(decided) if labels is None]
+        if len(rest) < len(items):
+            logger.info("Heuristik: %d/%d Mails eindeutig, ohne LLM", len(items) - len(rest), len(items))
+        results: List[ClassifyResult] = [_Unconfirmed(labels) if labels is not None else [] for labels in decided]
+        for i, res in zip(rest, self._classify_cached([items[i] for i in rest], k, timeout)):
+            results[i] = res
+        return results
+
+    def _classify_cached(
+        self, items: Sequence[Tuple[str, str, str]], k: int, timeout: float
+    ) -> List[ClassifyResult]:
+        if self.cache is None or not items:
+            return self._classify_local(items, k, timeout)
+
+        cached = self.cache.lookup(items)
+        misses = [i for i, labels in enumerate(cached) if labels is None]
+        if len(misses) < len(items):
+            logger.info("Klassifikations-Cache: %d/%d Mails aus dem Cache", len(items) - len(misses), len(items))
+        # Gleiche Vorlage mehrfach im selben Lauf: nur eine Mail je Schlüssel an Ollama
+        keys = {i: exact_key(items[i]) for i in misses}
+        first: Dict[str, int] = {}
+        for i in misses:
+            first.setdefault(keys[i], i)
+        unique = list(first.values())
+        fresh = dict(zip(unique, self._classify_local([items[i] for i in unique], k, timeout)))
+        confirmed = [i for i in unique if not isinstance(fresh[i], (BaseException, _Unconfirmed))]
+        self.cache.store([items[i] for i in confirmed], [fresh[i] for i in confirmed])
+        # Treffer und Duplikate sind keine neue LLM-Entscheidung (nur das Original zählt)
+        results: List[ClassifyResult] = [_Unconfirmed(labels) if labels is not None else [] for labels in cached]
+        for i in misses:
+            res = fresh[first[keys[i]]]
+            dup = first[keys[i]] != i and not isinstance(res, (BaseException, _Unconfirmed))
+            results[i] = _Unconfirmed(res) if dup else res
+        return results
+
+    def _classify_local(
+        self, items: Sequence[Tuple[str, str, str]], k: int, timeout: float
+    ) -> List[ClassifyResult]:
+        """Lokales Modell zuerst; nur unsichere Mails gehen an Ollama (und trainieren das Modell)."""
+        if self.local_model is None or not items:
+            return self._classify_embedding(items, k, timeout)
+        results: List[ClassifyResult] = []
+        escalate: List[int] = []
+        for i, item in enumerate(items):
+            labels = self.local_model.confident(*item)
+            if labels is not None and all(l in self.labels_allowed for l in labels):
+                results.append(_Unconfirmed(labels))
+            else:
+                results.append([])
+                escalate.append(i)
+        if len(escalate) < len(items):
+            logger.info("Lokales Modell: %d/%d Mails ohne LLM", len(items) - len(escalate), len(items))
+        fresh = self._classify_embedding([items[i] for i in escalate], k, timeout)
+        learned = []
+        for i, res in zip(escalate, fresh):
+            results[i] = res
+            if not isinstance(res, (BaseException, _Unconfirmed)):
+                learned.append(i)
+        self.local_model.learn([items[i] for i in learned], [results[i] for i in learned])  # type: ignore[misc]
+        return results
+
+    def _classify_embedding(
+        self, items: Sequence[Tuple[str, str, str]], k: int, timeout: float
+    ) -> List[ClassifyResult]:
+        """Embedding-kNN: stimmen die nächsten gelabelten Nachbarn überein, ohne Chat-Anfrage.
+
+        Bestätigte LLM-Ergebnisse werden mit ihrem (bereits berechneten) Embedding
+        in den Index übernommen. Schlägt /api/embed fehl, gehen alle Mails an das LLM.
+        """
+        if self.embeddings is None or not items:
+            return self._classify_uncached(items, k, timeout)
+        vectors = self._embed(items)
+        if vectors is None:
+            return self._classify_uncached(items, k, timeout)
+        results: List[ClassifyResult] = []
+        escalate: List[int] = []
+        for i, labels in enumerate(self.embeddings.neighbours_agree(vectors)):
+            if labels is not None and all(l in self.labels_allowed for l in labels):
+                results.append(_Unconfirmed(labels))
+            else:
+                results.append([])
+                escalate.append(i)
+        if len(escalate) < len(items):
+            logger.info("Embedding-Index: %d/%d Mails ohne LLM (übereinstimmende Nachbarn)", len(items) - len(escalate), len(items))
+        fresh = self._classify_uncached([items[i] for i in escalate], k, timeout)
+        learned = []
+        for i, res in zip(escalate, fresh):
+            results[i] = res
+            if not isinstance(res, (BaseException, _Unconfirmed)):
+                learned.append(i)
+        self.embeddings.add([vectors[i] for i in learned], [results[i] for i in learned])  # type: ignore[misc]
+        return results
+
+    def _embed(self, items: Sequence[Tuple[str, str, str]]) -> Optional[List[List[float]]]:
+        """Ein /api/embed-Aufruf für alle Mails; `None` bei Fehler oder unvollständiger Antwort."""
+        payload = {
+            "model": self.embeddings.model,  # type: ignore[union-attr]
+            "input": [
+                f"From: {sender}\nSubject: {subject}\nBody: {(body or '')[:EMBED_BODY_CHARS]}"
+                for sender, subject, body in items
+            ],
+        }
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        try:
+            r = self._client.post("/api/embed", json=payload)
+            r.raise_for_status()
+            vectors = r.json().get("embeddings") or []
+        except Exception as exc:
+            logger.warning("Ollama-Embedding fehlgeschlagen (%s), klassifiziere per LLM", exc)
+            return None
+        if len(vectors) != len(items):
+            logger.warning("Ollama-Embedding: %d statt %d Vektoren, klassifiziere per LLM", len(vectors), len(items))
+            return None
+        return vectors
+
+    def _classify_uncached(
+        self, items: Sequence[Tuple[str, str, str]], k: int, timeout: float
+    ) -> List[ClassifyResult]:
+        results: List[Optional[ClassifyResult]] = [None] * len(items)
+        pending = list(range(len(items)))
+
+        if self.batch_size > 1 and len(items) > 1:
+            chunks = [pending[i : i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+            self._run_jobs(
+                [(chunk, functools.partial(self._classify_batch, [items[i] for i in chunk])) for chunk in chunks],
+                k, timeout, results,
+            )
+            pending = [i for i in pending if results[i] is None or isinstance(results[i], BaseException)]
+            if pending:
+                logger.info("Batch-Klassifikation: %d/%d Mails ohne gültige Antwort, einzeln nachklassifiziert", len(pending), len(items))
+                for i in pending:
+                    results[i] = None
+
+        self._run_jobs(
+            [([i], functools.partial(self._classify_one, items[i])) for i in pending],
+            k, timeout, results,
+        )
+        return results  # type: ignore[return-value]
+
+    def _classify_one(self, item: Tuple[str, str, str]) -> List[Optional[List[str]]]:
+        return [self.classify(*item)]
+
+    def _run_jobs(
+        self,
+        jobs: Sequence[Tuple[List[int], Callable[[], List[Optional[List[str]]]]]],
+        k: int,
+        timeout: float,
+        results: List[Optional[ClassifyResult]],
+    ) -> None:
+        """Führt Jobs (Indizes, Funktion) mit höchstens `k` gleichzeitig aus und trägt die Ergebnisse ein.
+
+        Jeder Job hat ab seinem Start `timeout` Sekunden; die Frist begrenzt die
+        httpx-Timeouts jeder einzelnen Anfrage (auch bei `k` == 1), danach endet
+        der Job mit `TimeoutError`.
+        """
+
+        def run(fn: Callable[[], List[Optional[List[str]]]]) -> List[Optional[List[str]]]:
+            self._deadline.window = (time.monotonic() + timeout, timeout)
+            try:
+                return fn()
+            finally:
+                self._deadline.window = None
+
+        if k == 1 or len(jobs) <= 1:
+            outcomes = []
+            for _, fn in jobs:
+                try:
+                    outcomes.append(run(fn))
+                except Exception as exc:
+                    outcomes.append(exc)
+        else:
+            executor = self._get_executor(k)
+            futures = [executor.submit(run, fn) for _, fn in jobs]
+            outcomes = []
+            for fut in futures:
+                try:
+                    outcomes.append(fut.result())
+                except Exception as exc:
+                    outcomes.append(exc)
+        for (indices, _), outcome in zip(jobs, outcomes):
+            if isinstance(outcome, BaseException):
+                for i in indices:
+                    results[i] = outcome
+            else:
+                for i, res in zip(indices, outcome):
+                    results[i] = res
+
+    def _get_executor(self, workers: int) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            executor = self._executors.get(workers)
+            if executor is None:
+                executor = self._executors[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ollama")
+            return executor
+
+    def _request_timeout(self) -> httpx.Timeout:
+        """httpx-Timeout der nächsten Anfrage, gekürzt auf die Restzeit des laufenden Jobs."""
+        window = getattr(self._deadline, "window", None)
+        if window is None:
+            return self._timeout
+        deadline, timeout = window
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"Klassifikation nach {timeout:.1f}s abgebrochen")
+        return httpx.Timeout(min(self._timeout.read, remaining), connect=min(self._timeout.connect, remaining))
+
+    async def aclassify(self, sender: str, subject: str, body: str) -> List[str]:
+        """Asynchrone Variante von `classify` (eigener `httpx.AsyncClient`, ebenfalls Keep-Alive)."""
+        ai_labels = await self._aclassify_via_ollama(sender, subject, body)
+        return self._with_fallback(ai_labels, sender, subject, body)
+
+    def _with_fallback(self, ai_labels: List[str], sender: str, subject: str, body: str) -> List[str]:
         if ai_labels == ["Sonstiges"] or not ai_labels:
-            heur = heuristic_labels(subject, sender, body)
+            heur = self.heuristics.labels(subject, sender, body)
             if heur:
                 logger.debug("Heuristik-Fallback: %s | %s -> %s", subject[:80], sender, ", ".join(heur))
-                return heur
+                # Stichwort-Treffer sind keine LLM-Entscheidung: nie cachen oder lernen
+                return _Unconfirmed(heur)
         return ai_labels
 
-    def _ollama_messages(self, sender: str, subject: str, body: str) -> list:
-        """System- und Few-Shot-Nachrichten für Ollama."""
+    def _system_rules(self) -> str:
+        """Kategorien und Entscheidungsregeln (gemeinsam für Einzel- und Batch-Prompt)."""
         # Kriterienbasiert: Label nur bei eindeutigem Kriterien-Match; sonst nur Sonstiges (nie kombiniert)
         default_rule = (
             "Prüfe für jede Kategorie: Erfüllt diese E-Mail die definierenden Kriterien **eindeutig**? "
@@ -85,71 +499,192 @@ class Classifier:
             "Versicherung=Police, Beitrag, Schaden (nicht Legal/AGB). "
             "Sonstiges=Mail erfüllt keine der obigen Kategorien eindeutig; dann **nur** [\"Sonstiges\"], kein zweites Label."
         )
+        return default_rule + "Kategorien: " + ", ".join(self.labels_allowed) + ". " + label_logic
+
+    def _build_prefix(self) -> Tuple[dict, ...]:
+        """System- und Few-Shot-Nachrichten für Einzelanfragen (fester Prompt-Anfang)."""
         closing_rule = (
             " Wenn keine Kategorie eindeutig passt: ausschließlich [\"Sonstiges\"]. Antworte nur mit JSON: {\"labels\":[\"...\"]}."
         )
-        system_msg = (
-            default_rule
-            + "Kategorien: "
-            + ", ".join(self.labels_allowed)
-            + ". "
-            + label_logic
-            + closing_rule
-        )
-        shots = [
-            ("From: rechnung@firma.de\nSubject: Ihre Rechnung 2025-09\nBody: Betrag 129,00 EUR, Zahlungsziel 14 Tage.", ["Rechnung"]),
-            ("From: shop@beispiel.de\nSubject: Versandbestätigung Bestellung 12345\nBody: Ihr Paket ist unterwegs, Tracking enthalten.", ["Shopping"]),
-            ("From: noreply@bank.de\nSubject: Neue Anmeldung erkannt\nBody: Falls Sie das nicht waren, ändern Sie sofort Ihr Passwort.", ["Warnung"]),
-            ("From: CloudPlatform-noreply@google.com\nSubject: [Legal Update] Google transitions to data processor for reCAPTCHA\nBody: We're writing to let you know... legal terms... data processor...", ["Sonstiges"]),
-            ("From: Bolt\nSubject: Fahre nach deinen Vorstellungen\nBody: Mit der Bolt App... Fahrttypen, Route anpassen, Buchung.", ["Newsletter"]),
-            ("From: news@anbieter.de\nSubject: Angebote der Woche\nBody: -20% auf alles, jetzt zugreifen.", ["Newsletter"]),
-            ("From: Schwerdhoefer, Sebastian\nSubject: Testmail\nBody: Das ist nur ein Test", ["Sonstiges"]),
-            ("From: unknown@random.org\nSubject: Fwd: Meeting\nBody: Unklarer Inhalt, keine klare Kategorie.", ["Sonstiges"]),
-        ]
-        user_msg = f"From: {sender}\nSubject: {subject}\nBody: {body[:1500]}"
-        messages = [{"role": "system", "content": system_msg}]
-        for u, labels in shots:
+        messages = [{"role": "system", "content": self._system_rules() + closing_rule}]
+        for u, labels in _FEW_SHOTS:
             messages.append({"role": "user", "content": u})
             messages.append({"role": "assistant", "content": json.dumps({"labels": labels}, ensure_ascii=False)})
-        messages.append({"role": "user", "content": user_msg})
-        return messages
+        return tuple(messages)
 
-    def _classify_via_ollama(self, sender: str, subject: str, body: str) -> List[str]:
-        messages = self._ollama_messages(sender, subject, body)
-        base_url = self.ollama_base_url.rstrip("/")
+    def _build_batch_prefix(self) -> Tuple[dict, ...]:
+        """Fester Prompt-Anfang für Batch-Anfragen; Few-Shots als ein Beispiel-Batch."""
+        closing_rule = (
+            " Du erhältst mehrere E-Mails, jeweils mit ID. Bewerte jede E-Mail einzeln und unabhängig. "
+            "Wenn keine Kategorie eindeutig passt: ausschließlich [\"Sonstiges\"]. "
+            "Antworte nur mit JSON: {\"results\":[{\"id\":\"...\",\"labels\":[\"...\"]}]} – genau ein Eintrag pro ID."
+        )
+        shot_ids = [f"b{n}" for n in range(1, len(_FEW_SHOTS) + 1)]
+        shot_user = "\n\n".join(f"### ID: {sid}\n{u}" for sid, (u, _) in zip(shot_ids, _FEW_SHOTS))
+        shot_answer = {"results": [{"id": sid, "labels": labels} for sid, (_, labels) in zip(shot_ids, _FEW_SHOTS)]}
+        return (
+            {"role": "system", "content": self._system_rules() + closing_rule},
+            {"role": "user", "content": shot_user},
+            {"role": "assistant", "content": json.dumps(shot_answer, ensure_ascii=False)},
+        )
+
+    def _labels_format(self) -> dict:
+        return {
+            "type": "array",
+            "items": {"type": "string", "enum": self.labels_allowed},
+            "minItems": 1,
+            "maxItems": 3,
+        }
+
+    def _ollama_messages(self, sender: str, subject: str, body: str) -> list:
+        """Fester Prompt-Anfang plus die zu klassifizierende Mail."""
+        user_msg = f"From: {sender}\nSubject: {subject}\nBody: {body[:1500]}"
+        return [*self._prefix, {"role": "user", "content": user_msg}]
+
+    def _batch_messages(self, items: Sequence[Tuple[str, str, str]]) -> Tuple[list, List[str]]:
+        """Ein Prompt für mehrere Mails; liefert Nachrichten und die vergebenen IDs (m1, m2, ...)."""
+        ids = [f"m{n}" for n in range(1, len(items) + 1)]
+        user_msg = "\n\n".join(
+            f"### ID: {mid}\nFrom: {sender}\nSubject: {subject}\nBody: {body[:BATCH_BODY_CHARS]}"
+            for mid, (sender, subject, body) in zip(ids, items)
+        )
+        return [*self._batch_prefix, {"role": "user", "content": user_msg}], ids
+
+    def _payload(self, messages: list, ollama_format: dict) -> dict:
+        payload = {
+            "model": self.ollama_model,
+            "messages": messages,
+            "format": ollama_format,
+            "options": self._options,
+            "stream": False,
+        }
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def _chat_payload(self, sender: str, subject: str, body: str) -> dict:
+        ollama_format = {
+            "type": "object",
+            "properties": {"labels": self._format},
+            "required": ["labels"],
+            "additionalProperties": False,
+        }
+        return self._payload(self._ollama_messages(sender, subject, body), ollama_format)
+
+    def _batch_payload(self, items: Sequence[Tuple[str, str, str]]) -> Tuple[dict, List[str]]:
+        messages, ids = self._batch_messages(items)
         ollama_format = {
             "type": "object",
             "properties": {
-                "labels": {
+                "results": {
                     "type": "array",
-                    "items": {"type": "string", "enum": self.labels_allowed},
-                    "minItems": 1,
-                    "maxItems": 3,
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "id": {"type": "string", "enum": ids},
+                            "labels": self._format,
+                        },
+                        "required": ["id", "labels"],
+                        "additionalProperties": False,
+                    },
+                    "minItems": len(ids),
+                    "maxItems": len(ids),
                 }
             },
-            "required": ["labels"],
+            "required": ["results"],
             "additionalProperties": False,
         }
-        payload = {
+        return self._payload(messages, ollama_format), ids
+
+    def warm_up(self) -> bool:
+        """Lädt das Modell und wertet den festen Prompt-Anfang aus; blockiert bis Ollama antwortet.
+
+        Nutzt dieselben Optionen wie die Klassifikation (kein erneutes Laden beim
+        ersten echten Lauf). Fehler werden nur geloggt: die Klassifikation
+        funktioniert auch ohne Warm-up (dann mit kaltem Start).
+        """
+        prefix = self._batch_prefix if self.batch_size > 1 else self._prefix
+        payload = self._payload([*prefix, {"role": "user", "content": "From: -\nSubject: -\nBody: -"}], "json")
+        payload["options"] = {**self._options, "num_predict": 1}
+        start = time.monotonic()
+        try:
+            r = self._client.post("/api/chat", json=payload)
+            r.raise_for_status()
+        except Exception as exc:
+            logger.warning("Ollama-Warm-up fehlgeschlagen (%s) – erster Lauf startet kalt", exc)
+            return False
+        logger.info("Ollama-Modell %s geladen (Warm-up %.1fs, keep_alive=%s)", self.ollama_model, time.monotonic() - start, self.keep_alive)
+        return True
+
+    def _v1_payload(self, messages: list) -> dict:
+        return {
             "model": self.ollama_model,
             "messages": messages,
-            "format": ollama_format,
-            "options": {"temperature": 0.2},
+            "temperature": 0.2,
             "stream": False,
         }
+
+    def _parse_labels(self, txt: str) -> List[str]:
+        parsed = _extract_labels_json(txt)
+        if parsed:
+            labels = [l for l in parsed.get("labels", []) if l in self.labels_allowed]
+            if labels:
+                return labels
+        return ["Sonstiges"]
+
+    def _parse_batch(self, txt: str, ids: List[str]) -> Dict[str, List[str]]:
+        """Labels pro ID aus der Batch-Antwort; unbekannte, doppelte oder leere Einträge werden verworfen."""
+        parsed = _extract_json_object(txt)
+        entries = parsed.get("results") if isinstance(parsed, dict) else None
+        found: Dict[str, List[str]] = {}
+        for entry in entries if isinstance(entries, list) else []:
+            if not isinstance(entry, dict):
+                continue
+            mid = str(entry.get("id", ""))
+            if mid not in ids or mid in found:
+                continue
+            labels = [l for l in entry.get("labels") or [] if l in self.labels_allowed]
+            if labels:
+                found[mid] = labels
+        return found
+
+    def _classify_batch(self, items: Sequence[Tuple[str, str, str]]) -> List[Optional[List[str]]]:
+        """Eine Ollama-Anfrage für alle `items`; `None` an Stellen ohne gültige Antwort."""
+        if len(items) == 1:
+            return [self.classify(*items[0])]
+        payload, ids = self._batch_payload(items)
+        txt = self._chat(payload)
+        found = self._parse_batch(txt, ids) if txt is not None else {}
+        if len(found) < len(ids):
+            logger.debug("Batch-Antwort unvollständig: %d/%d IDs", len(found), len(ids))
+        return [
+            self._with_fallback(found[mid], *item) if mid in found else None
+            for mid, item in zip(ids, items)
+        ]
+
+    def _classify_via_ollama(self, sender: str, subject: str, body: str) -> List[str]:
+        txt = self._chat(self._chat_payload(sender, subject, body))
+        if txt is None:
+            return _Unconfirmed(["Sonstiges"])
+        return self._parse_labels(txt)
+
+    def _chat(self, payload: dict) -> str | None:
+        """POST /api/chat mit Retry und /v1-Fallback; Antworttext oder `None` nach endgültigem Fehler."""
         last_err: Exception | None = None
         txt = ""
         for attempt in range(2):
             try:
-                with httpx.Client(timeout=90) as client:
-                    r = client.post(f"{base_url}/api/chat", json=payload)
-                    r.raise_for_status()
-                    data = r.json()
-                    txt = (data.get("message") or {}).get("content") or ""
-                    break
+                r = self._client.post("/api/chat", json=payload, timeout=self._request_timeout())
+                r.raise_for_status()
+                data = r.json()
+                txt = (data.get("message") or {}).get("content") or ""
+                break
+            except TimeoutError:
+                # Frist des Jobs abgelaufen: kein weiterer Versuch
+                raise
             except httpx.HTTPStatusError as e:
                 if e.response.status_code == 404:
-                    txt = self._ollama_v1_chat(messages, base_url)
+                    txt = self._ollama_v1_chat(payload["messages"])
                     if txt is not None:
                         break
                     last_err = e
@@ -170,29 +705,62 @@ class Classifier:
                 time.sleep(sleep_s)
         else:
             logger.error("Ollama-Klassifikation fehlgeschlagen: %s", last_err)
-            return ["Sonstiges"]
-
-        parsed = _extract_labels_json(txt)
-        if parsed:
-            labels = [l for l in parsed.get("labels", []) if l in self.labels_allowed]
-            if labels:
-                return labels
-        return ["Sonstiges"]
+            return None
+        return txt
 
-    def _ollama_v1_chat(self, messages: list, base_url: str) -> str | None:
+    def _ollama_v1_chat(self, messages: list) -> str | None:
         """Ollama-API /v1/chat/completions (Fallback bei 404 von /api/chat)."""
-        payload = {
-            "model": self.ollama_model,
-            "messages": messages,
-            "temperature": 0.2,
-            "stream": False,
-        }
         try:
-            with httpx.Client(timeout=90) as client:
-                r = client.post(f"{base_url}/v1/chat/completions", json=payload)
-                r.raise_for_status()
-                data = r.json()
-                return (data.get("choices") or [{}])[0].get("message", {}).get("content") or ""
+            r = self._client.post("/v1/chat/completions", json=self._v1_payload(messages), timeout=self._request_timeout())
+            r.raise_for_status()
+            data = r.json()
+            return (data.get("choices") or [{}])[0].get("message", {}).get("content") or ""
         except Exception as e:
             logger.debug("Ollama /v1/chat/completions fehlgeschlagen: %s", e)
             return None
+
+    def _async_client(self) -> httpx.AsyncClient:
+        if self._aclient is None:
+            self._aclient = httpx.AsyncClient(
+                base_url=self.ollama_base_url.rstrip("/"), timeout=self._timeout, limits=self._limits
+            )
+        return self._aclient
+
+    async def _aclassify_via_ollama(self, sender: str, subject: str, body: str) -> List[str]:
+        client = self._async_client()
+        payload = self._chat_payload(sender, subject, body)
+        last_err: Exception | None = None
+        txt: str | None = ""
+        for attempt in range(2):
+            try:
+                r = await client.post("/api/chat", json=payload)
+                r.raise_for_status()
+                txt = (r.json().get("message") or {}).get("content") or ""
+                break
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 404:
+                    try:
+                        r = await client.post("/v1/chat/completions", json=self._v1_payload(payload["messages"]))
+                        r.raise_for_status()
+                        txt = (r.json().get("choices") or [{}])[0].get("message", {}).get("content") or ""
+                        break
+                    except Exception as e2:
+                        logger.debug("Ollama /v1/chat/completions fehlgeschlagen: %s", e2)
+                    last_err = e
+                elif e.response.status_code == 400 and attempt == 0 and payload.get("format") is not None:
+                    logger.debug("Ollama format-Schema nicht unterstützt, versuche format: json")
+                    payload["format"] = "json"
+                    last_err = e
+                    continue
+                else:
+                    last_err = e
+                logger.warning("Ollama-Klassifikation Versuch %d fehlgeschlagen (%s), retry in %ds", attempt + 1, e, 2 ** attempt)
+                await asyncio.sleep(2 ** attempt)
+            except Exception as e:
+                last_err = e
+                logger.warning("Ollama-Klassifikation Versuch %d fehlgeschlagen (%s), retry in %ds", attempt + 1, e, 2 ** attempt)
+                await asyncio.sleep(2 ** attempt)
+        else:
+            logger.error("Ollama-Klassifikation fehlgeschlagen: %s", last_err)
+            return _Unconfirmed(["Sonstiges"])
+        return self._parse_labels(txt or "")
@@ -45,6 +45,72 @@ class AppConfig:
     dry_run: bool = False
     max_results: int = 20
     set_label_colors: bool = False
+    # "query" = jede Iteration GMAIL_Q ausführen, "history" = inkrementell per History API
+    sync_mode: str = "query"
+    history_state_file: str = ".gmail_history.json"
+    # Sekunden zwischen zwei Sonstiges-Neuprüfungen (Pass 2) im History-Modus, 0 = nie
+    relabel_interval: int = 3600
+    # Thread-Modus: eine Klassifikation pro Konversation statt pro Nachricht
+    thread_mode: bool = False
+    # Push-Modus (Gmail watch -> Pub/Sub -> lokaler Webhook)
+    push_host: str = "127.0.0.1"
+    push_port: int = 8080
+    push_token: str = ""
+    pubsub_topic: str = ""
+    push_fallback_interval: int = 900
+    # Lokaler SQLite-Cache für geparste Nachrichten
+    message_cache: bool = True
+    message_cache_file: str = ".gmail_messages.sqlite3"
+    message_cache_max: int = 5000
+    message_cache_label_ttl: int = 120
+    # Label-Katalog (Name <-> ID, Farben) mit TTL statt labels.list in jedem Lauf
+    label_cache_file: str = ".gmail_labels.json"
+    label_cache_ttl: int = 3600
+    # Gmail Per-User-Quota (Einheiten/Sekunde) und Wiederholungen bei 429/5xx
+    gmail_quota_units_per_second: int = 250
+    gmail_max_retries: int = 5
+    # Parallele Gmail-Verbindungen (eine pro Worker-Thread)
+    gmail_workers: int = 4
+    # Worker-Prozesse für MIME-Parsing großer Batches (0 = im Hauptprozess)
+    parse_workers: int = 0
+    # Multi-Mailbox: Token-Dateien der Postfächer (leer = nur token.json)
+    gmail_accounts: List[str] = field(default_factory=list)
+    # Gleichzeitige Klassifikationen gegen Ollama (gemeinsam für alle Postfächer)
+    ollama_concurrency: int = 1
+    # Verweildauer des Modells im Speicher nach der letzten Anfrage (Ollama keep_alive)
+    ollama_keep_alive: str = "30m"
+    # Mails pro Ollama-Anfrage (1 = eine Mail pro Anfrage)
+    classify_batch_size: int = 1
+    # Cache für Klassifikationsergebnisse (Vorlagen-Mails, nahe Duplikate)
+    classification_cache: bool = True
+    classification_cache_file: str = ".gmail_classifications.sqlite3"
+    classification_cache_max: int = 20000
+    # Max. abweichende SimHash-Bits für ein nahes Duplikat (0 = nur exakte Treffer)
+    classification_cache_distance: int = 6
+    # Label-Statistik pro Absender: stabile Absender ohne LLM labeln
+    sender_memory: bool = True
+    sender_memory_file: str = ".gmail_senders.sqlite3"
+    sender_memory_min_count: int = 10
+    sender_memory_min_agreement: float = 0.95
+    sender_memory_sample_rate: float = 0.05
+    # Lokales Vorab-Modell (Naive Bayes) vor dem LLM
+    local_model: bool = False
+    local_model_file: str = ".gmail_local_model.json"
+    local_model_threshold: float = 0.98
+    local_model_min_docs: int = 200
+    # Stichwort-Regeln (app.heuristics); HEURISTICS_FIRST: eindeutige Treffer ohne LLM
+    heuristic_rules_file: str = "prompts/heuristic_rules.json"
+    heuristics_first: bool = False
+    # Embedding-Nachbarn (Ollama /api/embed, benötigt numpy) vor dem Chat-Modell
+    embedding_index: bool = False
+    embedding_index_file: str = ".gmail_embeddings"
+    ollama_embed_model: str = "nomic-embed-text"
+    embedding_k: int = 5
+    embedding_min_similarity: float = 0.9
+    embedding_min_agreement: float = 0.8
+    # Timeouts für Ollama-Anfragen (Verbindungsaufbau / Antwort) in Sekunden
+    ollama_connect_timeout: float = 10.0
+    ollama_read_timeout: float = 90.0
 
 
 def load_config(env_file: str | None = None) -> AppConfig:
@@ -68,6 +134,138 @@ def load_config(env_file: str | None = None) -> AppConfig:
     except ValueError:
         max_results = 20
 
+    sync_mode = os.getenv("SYNC_MODE", "query").strip().lower()
+    if sync_mode not in {"query", "history"}:
+        sync_mode = "query"
+    history_state_file = os.getenv("HISTORY_STATE_FILE", ".gmail_history.json").strip()
+    try:
+        relabel_interval = max(0, int(os.getenv("RELABEL_INTERVAL", "3600")))
+    except ValueError:
+        relabel_interval = 3600
+    thread_mode = os.getenv("THREAD_MODE", "false").lower() in {"1", "true", "yes", "y"}
+
+    push_host = os.getenv("PUSH_HOST", "127.0.0.1").strip()
+    push_token = os.getenv("PUSH_TOKEN", "").strip()
+    pubsub_topic = os.getenv("GMAIL_PUBSUB_TOPIC", "").strip()
+    try:
+        push_port = int(os.getenv("PUSH_PORT", "8080"))
+    except ValueError:
+        push_port = 8080
+    try:
+        push_fallback_interval = int(os.getenv("PUSH_FALLBACK_INTERVAL", "900"))
+    except ValueError:
+        push_fallback_interval = 900
+
+    message_cache = os.getenv("MESSAGE_CACHE", "true").lower() in {"1", "true", "yes", "y"}
+    message_cache_file = os.getenv("MESSAGE_CACHE_FILE", ".gmail_messages.sqlite3").strip()
+    try:
+        message_cache_max = int(os.getenv("MESSAGE_CACHE_MAX", "5000"))
+    except ValueError:
+        message_cache_max = 5000
+    try:
+        message_cache_label_ttl = int(os.getenv("MESSAGE_CACHE_LABEL_TTL", "120"))
+    except ValueError:
+        message_cache_label_ttl = 120
+
+    label_cache_file = os.getenv("LABEL_CACHE_FILE", ".gmail_labels.json").strip()
+    try:
+        label_cache_ttl = int(os.getenv("LABEL_CACHE_TTL", "3600"))
+    except ValueError:
+        label_cache_ttl = 3600
+
+    try:
+        gmail_quota_units_per_second = int(os.getenv("GMAIL_QUOTA_UNITS_PER_SECOND", "250"))
+    except ValueError:
+        gmail_quota_units_per_second = 250
+    try:
+        gmail_max_retries = int(os.getenv("GMAIL_MAX_RETRIES", "5"))
+    except ValueError:
+        gmail_max_retries = 5
+
+    try:
+        gmail_workers = max(1, int(os.getenv("GMAIL_WORKERS", "4")))
+    except ValueError:
+        gmail_workers = 4
+    try:
+        parse_workers = max(0, int(os.getenv("PARSE_WORKERS", "0")))
+    except ValueError:
+        parse_workers = 0
+
+    accounts_env = os.getenv("GMAIL_ACCOUNTS", "").strip()
+    gmail_accounts = [a.strip() for a in accounts_env.split(",") if a.strip()]
+    # "auto" = OLLAMA_NUM_PARALLEL aus der eigenen Umgebung/.env (der Server wird nicht abgefragt), sonst 1
+    ollama_concurrency_raw = os.getenv("OLLAMA_CONCURRENCY", "auto").strip().lower()
+    if ollama_concurrency_raw in {"", "auto"}:
+        ollama_concurrency_raw = os.getenv("OLLAMA_NUM_PARALLEL", "1")
+    try:
+        ollama_concurrency = max(1, int(ollama_concurrency_raw))
+    except ValueError:
+        ollama_concurrency = 1
+    ollama_keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m").strip()
+    classification_cache = os.getenv("CLASSIFICATION_CACHE", "true").lower() in {"1", "true", "yes", "y"}
+    classification_cache_file = os.getenv("CLASSIFICATION_CACHE_FILE", ".gmail_classifications.sqlite3").strip()
+    try:
+        classification_cache_max = max(1, int(os.getenv("CLASSIFICATION_CACHE_MAX", "20000")))
+    except ValueError:
+        classification_cache_max = 20000
+    try:
+        classification_cache_distance = max(0, int(os.getenv("CLASSIFICATION_CACHE_DISTANCE", "6")))
+    except ValueError:
+        classification_cache_distance = 6
+    sender_memory = os.getenv("SENDER_MEMORY", "true").lower() in {"1", "true", "yes", "y"}
+    sender_memory_file = os.getenv("SENDER_MEMORY_FILE", ".gmail_senders.sqlite3").strip()
+    try:
+        sender_memory_min_count = max(1, int(os.getenv("SENDER_MEMORY_MIN_COUNT", "10")))
+    except ValueError:
+        sender_memory_min_count = 10
+    try:
+        sender_memory_min_agreement = float(os.getenv("SENDER_MEMORY_MIN_AGREEMENT", "0.95"))
+    except ValueError:
+        sender_memory_min_agreement = 0.95
+    try:
+        sender_memory_sample_rate = float(os.getenv("SENDER_MEMORY_SAMPLE_RATE", "0.05"))
+    except ValueError:
+        sender_memory_sample_rate = 0.05
+    local_model = os.getenv("LOCAL_MODEL", "false").lower() in {"1", "true", "yes", "y"}
+    local_model_file = os.getenv("LOCAL_MODEL_FILE", ".gmail_local_model.json").strip()
+    try:
+        local_model_threshold = float(os.getenv("LOCAL_MODEL_THRESHOLD", "0.98"))
+    except ValueError:
+        local_model_threshold = 0.98
+    try:
+        local_model_min_docs = max(0, int(os.getenv("LOCAL_MODEL_MIN_DOCS", "200")))
+    except ValueError:
+        local_model_min_docs = 200
+    heuristic_rules_file = os.getenv("HEURISTIC_RULES_FILE", "prompts/heuristic_rules.json").strip()
+    heuristics_first = os.getenv("HEURISTICS_FIRST", "false").lower() in {"1", "true", "yes", "y"}
+    embedding_index = os.getenv("EMBEDDING_INDEX", "false").lower() in {"1", "true", "yes", "y"}
+    embedding_index_file = os.getenv("EMBEDDING_INDEX_FILE", ".gmail_embeddings").strip()
+    ollama_embed_model = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text").strip() or "nomic-embed-text"
+    try:
+        embedding_k = max(1, int(os.getenv("EMBEDDING_K", "5")))
+    except ValueError:
+        embedding_k = 5
+    try:
+        embedding_min_similarity = float(os.getenv("EMBEDDING_MIN_SIMILARITY", "0.9"))
+    except ValueError:
+        embedding_min_similarity = 0.9
+    try:
+        embedding_min_agreement = float(os.getenv("EMBEDDING_MIN_AGREEMENT", "0.8"))
+    except ValueError:
+        embedding_min_agreement = 0.8
+    try:
+        classify_batch_size = max(1, int(os.getenv("CLASSIFY_BATCH_SIZE", "1")))
+    except ValueError:
+        classify_batch_size = 1
+    try:
+        ollama_connect_timeout = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "10"))
+    except ValueError:
+        ollama_connect_timeout = 10.0
+    try:
+        ollama_read_timeout = float(os.getenv("OLLAMA_READ_TIMEOUT", "90"))
+    except ValueError:
+        ollama_read_timeout = 90.0
+
     labels_env = os.getenv("LABELS_ALLOWED", "").strip()
     if labels_env:
         labels_allowed = [label.strip() for label in labels_env.split(",") if label.strip()]
@@ -93,4 +291,50 @@ def load_config(env_file: str | None = None) -> AppConfig:
         dry_run=dry_run,
         max_results=max_results,
         set_label_colors=set_label_colors,
+        sync_mode=sync_mode,
+        history_state_file=history_state_file,
+        relabel_interval=relabel_interval,
+        thread_mode=thread_mode,
+        push_host=push_host,
+        push_port=push_port,
+        push_token=push_token,
+        pubsub_topic=pubsub_topic,
+        push_fallback_interval=push_fallback_interval,
+        message_cache=message_cache,
+        message_cache_file=message_cache_file,
+        message_cache_max=message_cache_max,
+        message_cache_label_ttl=message_cache_label_ttl,
+        label_cache_file=label_cache_file,
+        label_cache_ttl=label_cache_ttl,
+        gmail_quota_units_per_second=gmail_quota_units_per_second,
+        gmail_max_retries=gmail_max_retries,
+        gmail_workers=gmail_workers,
+        parse_workers=parse_workers,
+        gmail_accounts=gmail_accounts,
+        ollama_concurrency=ollama_concurrency,
+        ollama_keep_alive=ollama_keep_alive,
+        classify_batch_size=classify_batch_size,
+        classification_cache=classification_cache,
+        classification_cache_file=classification_cache_file,
+        classification_cache_max=classification_cache_max,
+        classification_cache_distance=classification_cache_distance,
+        sender_memory=sender_memory,
+        sender_memory_file=sender_memory_file,
+        sender_memory_min_count=sender_memory_min_count,
+        sender_memory_min_agreement=sender_memory_min_agreement,
+        sender_memory_sample_rate=sender_memory_sample_rate,
+        local_model=local_model,
+        local_model_file=local_model_file,
+        local_model_threshold=local_model_threshold,
+        local_model_min_docs=local_model_min_docs,
+        heuristic_rules_file=heuristic_rules_file,
+        heuristics_first=heuristics_first,
+        embedding_index=embedding_index,
+        embedding_index_file=embedding_index_file,
+        ollama_embed_model=ollama_embed_model,
+        embedding_k=embedding_k,
+        embedding_min_similarity=embedding_min_similarity,
+        embedding_min_agreement=embedding_min_agreement,
+        ollama_connect_timeout=ollama_connect_timeout,
+        ollama_read_timeout=ollama_read_timeout,
     )
@@ -0,0 +1,219 @@
+"""Nächste-Nachbarn-Index über Mail-Embeddings (Ollama /api/embed).
+
+Dateien (Präfix EMBEDDING_INDEX_FILE):
+    <präfix>.f16          Vektoren als float16-Matrix (Zeile je Mail, nur angehängt)
+    <präfix>.labels.jsonl Labels je Zeile (gleiche Reihenfolge)
+    <präfix>.norms.f32    Zeilennormen als float32 (gleiche Reihenfolge, nur angehängt)
+    <präfix>.meta.json    Embedding-Modell und Dimension
+
+Die Matrix wird per `numpy.memmap` gelesen (nur benötigte Seiten im Speicher).
+Die Normen werden beim Anhängen mitgeschrieben; beim Laden werden nur fehlende
+Zeilen (z. B. nach abgebrochenem Anhängen) aus der Matrix nachberechnet.
+Eine Suche ist ein blockweises Matrixprodukt aller Vektoren mit allen Anfragen.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = ".gmail_embeddings"
+# Zeilen pro Block bei der Suche (float16 -> float32 nur blockweise umwandeln)
+_BLOCK_ROWS = 16384
+
+
+def _class_name(labels: Sequence[str]) -> str:
+    return "+".join(sorted(set(labels)))
+
+
+class EmbeddingIndex:
+    """Gelabelte Beispiel-Embeddings; `neighbours_agree` liefert Labels, wenn die k nächsten Nachbarn übereinstimmen.
+
+    Gezählt werden nur Nachbarn mit Kosinus-Ähnlichkeit >= `min_similarity`;
+    von den `k` nächsten müssen mindestens `min_agreement` (Anteil) dieselbe
+    Label-Kombination tragen. Ändert sich das Embedding-Modell oder die
+    Dimension, wird der Index verworfen und neu aufgebaut. Sind die Dateien
+    nicht lesbar, arbeitet der Index nur im Speicher und lässt sie unverändert.
+    """
+
+    def __init__(
+        self,
+        path: str = INDEX_FILE,
+        model: str = "nomic-embed-text",
+        k: int = 5,
+        min_similarity: float = 0.9,
+        min_agreement: float = 0.8,
+    ) -> None:
+        self.path = path
+        self.model = model
+        self.k = max(1, k)
+        self.min_similarity = min_similarity
+        self.min_agreement = min_agreement
+        self.dim: Optional[int] = None
+        self._lock = threading.Lock()
+        self._vectors: np.ndarray = np.zeros((0, 0), dtype=np.float16)
+        self._norms: np.ndarray = np.zeros(0, dtype=np.float32)
+        self._labels: List[List[str]] = []
+        # False nach Lesefehler: Dateien nicht anfassen, neue Beispiele nur im Speicher
+        self._persist = True
+        self._load()
+
+    @property
+    def _matrix_path(self) -> str:
+        return f"{self.path}.f16"
+
+    @property
+    def _labels_path(self) -> str:
+        return f"{self.path}.labels.jsonl"
+
+    @property
+    def _norms_path(self) -> str:
+        return f"{self.path}.norms.f32"
+
+    @property
+    def _meta_path(self) -> str:
+        return f"{self.path}.meta.json"
+
+    def __len__(self) -> int:
+        return len(self._labels)
+
+    def _load(self) -> None:
+        if not os.path.exists(self._meta_path):
+            return
+        try:
+            with open(self._meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("model") != self.model:
+                logger.info("Embedding-Index: Modell geändert (%s -> %s), Index wird neu aufgebaut", meta.get("model"), self.model)
+                self._reset()
+                return
+            self.dim = int(meta["dim"])
+            labels = []
+            if os.path.exists(self._labels_path):
+                with open(self._labels_path, encoding="utf-8") as f:
+                    labels = [json.loads(line) for line in f if line.strip()]
+            rows = os.path.getsize(self._matrix_path) // (2 * self.dim) if os.path.exists(self._matrix_path) else 0
+            # Abgebrochenes Anhängen: nur vollständige Zeilen mit Labels verwenden
+            n = min(rows, len(labels))
+            self._labels = labels[:n]
+            self._remap(n)
+            self._norms = self._load_norms(n)
+        except Exception as exc:
+            logger.warning("Embedding-Index %s nicht lesbar (%s), starte leer nur im Speicher", self.path, exc)
+            self._persist = False
+            self._clear()
+            return
+        logger.info("Embedding-Index: %d Beispiele (%s, %d Dimensionen)", len(self._labels), self.model, self.dim)
+
+    def _load_norms(self, rows: int) -> np.ndarray:
+        """Gespeicherte Normen der ersten `rows` Zeilen; fehlende werden nachberechnet und die Datei angeglichen."""
+        norms = np.fromfile(self._norms_path, dtype=np.float32) if os.path.exists(self._norms_path) else np.zeros(0, dtype=np.float32)
+        if len(norms) == rows:
+            return norms
+        if len(norms) < rows:
+            logger.info("Embedding-Index: %d Normen fehlen, werden nachberechnet", rows - len(norms))
+            norms = np.concatenate([norms, self._row_norms(self._vectors[len(norms):])])
+        norms = norms[:rows]
+        with open(self._norms_path, "wb") as f:
+            f.write(norms.tobytes())
+        return norms
+
+    def _reset(self) -> None:
+        """Verwirft den Index samt Dateien (nur bei geändertem Modell bzw. geänderter Dimension)."""
+        for p in (self._matrix_path, self._labels_path, self._norms_path, self._meta_path):
+            if os.path.exists(p):
+                os.remove(p)
+        self._clear()
+
+    def _clear(self) -> None:
+        self.dim = None
+        self._vectors = np.zeros((0, 0), dtype=np.float16)
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._labels = []
+
+    def _remap(self, rows: int) -> None:
+        if rows == 0:
+            self._vectors = np.zeros((0, self.dim or 0), dtype=np.float16)
+        else:
+            self._vectors = np.memmap(self._matrix_path, dtype=np.float16, mode="r", shape=(rows, self.dim))
+
+    @staticmethod
+    def _row_norms(matrix: np.ndarray) -> np.ndarray:
+        norms = np.empty(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), _BLOCK_ROWS):
+            block = np.asarray(matrix[start : start + _BLOCK_ROWS], dtype=np.float32)
+            norms[start : start + len(block)] = np.linalg.norm(block, axis=1)
+        return norms
+
+    def add(self, vectors: Sequence[Sequence[float]], labels: Sequence[Sequence[str]]) -> None:
+        """Hängt Embeddings mit ihren (bestätigten) Labels an."""
+        if not len(vectors):
+            return
+        matrix = np.asarray(vectors, dtype=np.float16)
+        if matrix.ndim != 2:
+            return
+        with self._lock:
+            if self.dim is not None and matrix.shape[1] != self.dim:
+                logger.info("Embedding-Index: Dimension geändert (%d -> %d), Index wird neu aufgebaut", self.dim, matrix.shape[1])
+                self._reset() if self._persist else self._clear()
+            if self.dim is None:
+                self.dim = int(matrix.shape[1])
+                if self._persist:
+                    with open(self._meta_path, "w", encoding="utf-8") as f:
+                        json.dump({"model": self.model, "dim": self.dim}, f)
+            if not self._persist:
+                self._vectors = np.concatenate([self._vectors.reshape(-1, self.dim), matrix])
+                self._labels.extend(sorted(set(l)) for l in labels)
+                self._norms = np.concatenate([self._norms, self._row_norms(matrix)])
+                return
+            norms = self._row_norms(matrix)
+            with open(self._matrix_path, "ab") as f:
+                f.write(matrix.tobytes())
+            with open(self._labels_path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(sorted(set(l)), ensure_ascii=False) + "\n" for l in labels)
+            with open(self._norms_path, "ab") as f:
+                f.write(norms.tobytes())
+            self._labels.extend(sorted(set(l)) for l in labels)
+            self._norms = np.concatenate([self._norms, norms])
+            self._remap(len(self._labels))
+
+    def search(self, queries: Sequence[Sequence[float]]) -> List[List[tuple]]:
+        """Je Anfrage die k nächsten (Ähnlichkeit, Zeile), absteigend sortiert."""
+        q = np.asarray(queries, dtype=np.float32)
+        with self._lock:
+            vectors, norms, n = self._vectors, self._norms, len(self._labels)
+        if n == 0 or q.ndim != 2 or q.shape[1] != self.dim:
+            return [[] for _ in range(len(q))]
+        q = q / np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+        sims = np.empty((len(q), n), dtype=np.float32)
+        for start in range(0, n, _BLOCK_ROWS):
+            block = np.asarray(vectors[start : start + _BLOCK_ROWS], dtype=np.float32)
+            sims[:, start : start + len(block)] = q @ block.T
+        sims /= np.maximum(norms[:n], 1e-12)
+        k = min(self.k, n)
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        found = []
+        for row, idx in zip(sims, top):
+            order = idx[np.argsort(-row[idx])]
+            found.append([(float(row[j]), int(j)) for j in order])
+        return found
+
+    def neighbours_agree(self, queries: Sequence[Sequence[float]]) -> List[Optional[List[str]]]:
+        """Labels je Anfrage, wenn genug ähnliche Nachbarn dieselben Labels tragen, sonst `None`."""
+        results: List[Optional[List[str]]] = []
+        for hits in self.search(queries):
+            close = [self._labels[j] for sim, j in hits if sim >= self.min_similarity]
+            if len(close) < self.k:
+                results.append(None)
+                continue
+            name, count = Counter(_class_name(l) for l in close).most_common(1)[0]
+            results.append(name.split("+") if count / self.k >= self.min_agreement else None)
+        return results
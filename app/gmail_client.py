@@ -1,10 +1,10 @@
 from __future__ import annotations
 
-import base64
 import os
 import re
 import logging
-from typing import Dict, List, Tuple, Optional
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Set, Tuple, Optional, TypeVar, Union
 
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
@@ -12,6 +12,12 @@ from google.oauth2.credentials import Credentials
 from google.auth.transport.requests import Request
 from google_auth_oauthlib.flow import InstalledAppFlow
 
+from .mime import BODY_BUDGET, extract_body
+from .parse_pool import ParsePool
+from .planner import LabelChange
+from .quota import QUOTA_UNITS, QuotaScheduler, is_rate_limited
+from .transport import SharedCredentials, TransportPool
+
 
 logger = logging.getLogger(__name__)
 
@@ -25,66 +31,222 @@ ALLOWED_LABEL_COLORS = [
     "#4986e7", "#cabdbf", "#ac725e", "#cd74e6", "#cca6ac",
 ]
 
+# Gmail erlaubt bis zu 100 Requests pro HTTP-Batch
+BATCH_MAX = 100
+
+# (subject, sender, body, labelIds, internalDate)
+MessageCore = Tuple[str, str, str, List[str], int]
+
+# Header, die beim Metadaten-Abruf (Tier 1, ohne Body) angefordert werden
+METADATA_HEADERS = ["Subject", "From", "List-Unsubscribe", "List-Id"]
+
+T = TypeVar("T")
+
+
+@dataclass(slots=True)
+class MessageMeta:
+    """Metadaten einer Nachricht ohne Body (Gmail format=metadata)."""
+
+    id: str
+    thread_id: str
+    subject: str
+    sender: str
+    label_ids: List[str] = field(default_factory=list)
+    internal_ts: int = 0
+    history_id: str = ""
+    headers: Dict[str, str] = field(default_factory=dict)
+
+
+def parse_message_meta(msg: Dict) -> MessageMeta:
+    """Zerlegt eine Gmail-Message-Ressource (format=metadata oder full) in `MessageMeta`."""
+    headers = {h["name"]: h["value"] for h in msg.get("payload", {}).get("headers", [])}
+    return MessageMeta(
+        id=msg.get("id", ""),
+        thread_id=msg.get("threadId", ""),
+        subject=headers.get("Subject", ""),
+        sender=headers.get("From", ""),
+        label_ids=msg.get("labelIds", []),
+        internal_ts=int(msg.get("internalDate", 0)),
+        history_id=str(msg.get("historyId", "")),
+        headers=headers,
+    )
+
+
+def _parse_or_none(parse: Callable[[Dict], T], msg: Dict) -> Optional[T]:
+    try:
+        return parse(msg)
+    except Exception:
+        return None
+
+
+def parse_message_core(msg: Dict, budget: int = BODY_BUDGET) -> MessageCore:
+    """Zerlegt eine Gmail-Message-Ressource (format=full) in (subject, sender, body, labelIds, internalDate).
+
+    Der Body wird über `app.mime.extract_body` auf `budget` Zeichen begrenzt extrahiert.
+    """
+    payload = msg.get("payload", {})
+    headers = {h["name"]: h["value"] for h in payload.get("headers", [])}
+    subject = headers.get("Subject", "")
+    sender = headers.get("From", "")
+    label_ids = msg.get("labelIds", [])
+    internal_ts = int(msg.get("internalDate", 0))
+
+    try:
+        body = extract_body(payload, budget)
+    except Exception:
+        body = ""
+    if not body:
+        body = re.sub(r"\s+", " ", msg.get("snippet", "")).strip()[:budget]
+    return subject, sender, body, label_ids, internal_ts
+
 
 class GmailClient:
     """Kapselt Authentifizierung und Kern-Operationen gegen die Gmail API."""
 
-    def __init__(self) -> None:
-        self.service = self._auth()
+    def __init__(
+        self,
+        store=None,
+        scheduler: Optional[QuotaScheduler] = None,
+        workers: int = 4,
+        parse_workers: int = 0,
+        token_path: str = "token.json",
+        credentials_path: str = "credentials.json",
+    ) -> None:
+        # Token-Datei pro Postfach (Multi-Mailbox); credentials.json ist der OAuth-Client
+        self.token_path = token_path
+        self.credentials_path = credentials_path
+        # Optionaler lokaler Nachrichten-Cache (app.message_store.MessageStore)
+        self.store = store
+        # Alle API-Aufrufe laufen über den Quota-Scheduler (Token-Bucket + Backoff)
+        self.scheduler = scheduler or QuotaScheduler()
+        self.creds = SharedCredentials(self._load_credentials(), on_refresh=self._save_token)
+        # Eine httplib2-Verbindung pro Thread; `service` dient nur zum Bauen der Requests
+        self.pool = TransportPool(self.creds, workers=workers)
+        # Mitgeliefertes Discovery-Dokument statt Abruf über das Netz
+        self.service = build("gmail", "v1", credentials=self.creds, static_discovery=True, cache_discovery=False)
+        # MIME-Parsing großer Batches optional in Worker-Prozessen (0 = inline)
+        self.parser = ParsePool(parse_workers)
+
+    def close(self) -> None:
+        """Gibt Worker-Threads, Parse-Prozesse und den Nachrichten-Cache (SQLite) frei."""
+        self.pool.close()
+        self.parser.close()
+        if self.store is not None:
+            self.store.close()
+
+    def _save_token(self, creds: Credentials) -> None:
+        with open(self.token_path, "w") as f:
+            f.write(creds.to_json())
 
-    def _auth(self):
+    def _load_credentials(self) -> Credentials:
         creds = None
-        if os.path.exists("token.json"):
-            creds = Credentials.from_authorized_user_file("token.json", SCOPES)
+        if os.path.exists(self.token_path):
+            creds = Credentials.from_authorized_user_file(self.token_path, SCOPES)
         if not creds or not creds.valid:
             if creds and creds.expired and creds.refresh_token:
                 creds.refresh(Request())
             else:
-                flow = InstalledAppFlow.from_client_secrets_file("credentials.json", SCOPES)
+                flow = InstalledAppFlow.from_client_secrets_file(self.credentials_path, SCOPES)
                 creds = flow.run_local_server(port=0)
-            with open("token.json", "w") as f:
-                f.write(creds.to_json())
-        return build("gmail", "v1", credentials=creds)
+            self._save_token(creds)
+        return creds
+
+    def _execute(self, request, method: str):
+        """Führt einen einzelnen API-Request über den Quota-Scheduler auf der Thread-Verbindung aus."""
+        return self.scheduler.run(lambda: request.execute(http=self.pool.http()), method=method)
+
+    def _execute_batch(self, batch, units: int) -> None:
+        """Führt einen HTTP-Batch aus; Quota = Summe der Teil-Requests, kein automatischer Retry."""
+        self.scheduler.acquire(units)
+        batch.execute(http=self.pool.http())
 
     def ensure_labels(self, names: List[str], colors: Optional[Dict[str, Dict[str, str]]] = None) -> Dict[str, str]:
         """Stellt sicher, dass alle gewünschten User-Labels existieren und setzt optional Farben.
 
         colors: Mapping Labelname -> {"backgroundColor": "#RRGGBB", "textColor": "#RRGGBB"}
         """
-        existing = self.service.users().labels().list(userId="me").execute().get("labels", [])
-        name_to_id = {l["name"]: l["id"] for l in existing if l.get("type") == "user"}
-        for name in names:
-            if name not in name_to_id:
-                # Immer ohne Farbe anlegen, Farben separat per Patch setzen
-                body = {"name": name}
-                lab = self.service.users().labels().create(userId="me", body=body).execute()
-                name_to_id[name] = lab["id"]
+        name_to_id = {l["name"]: l["id"] for l in self.list_user_labels()}
+        missing = [name for name in names if name not in name_to_id]
+        if missing:
+            name_to_id.update(self.create_labels(missing))
 
         # Für bestehende Labels ggf. Farben per Patch setzen
         if colors:
             for name, color in colors.items():
                 if name in name_to_id:
-                    self._try_set_label_color(name_to_id[name], name, color)
+                    self.set_label_color(name_to_id[name], name, color)
 
         return name_to_id
 
-    def _try_set_label_color(self, label_id: str, label_name: str, desired: Dict[str, str]) -> None:
-        """Setzt eine Farbe aus der Gmail-Palette (nur ALLOWED_LABEL_COLORS)."""
+    def list_user_labels(self) -> List[Dict]:
+        """Alle User-Labels (id, name, ggf. color) in einem Request."""
+        existing = self._execute(self.service.users().labels().list(userId="me"), "labels.list").get("labels", [])
+        return [l for l in existing if l.get("type") == "user"]
+
+    def create_labels(self, names: List[str]) -> Dict[str, str]:
+        """Legt mehrere Labels gleichzeitig (ein Batch-Round-Trip) an und liefert Name -> ID.
+
+        Immer ohne Farbe anlegen, Farben separat per Patch setzen. Labels, deren
+        Anlage scheitert (z. B. 409, weil parallel angelegt), fehlen im Ergebnis.
+        """
+        created: Dict[str, str] = {}
+
+        def on_response(request_id, response, exception):
+            name = names[int(request_id)]
+            if exception is not None:
+                logger.warning("Label '%s' konnte nicht angelegt werden: %s", name, exception)
+                return
+            created[name] = response["id"]
+
+        for start in range(0, len(names), BATCH_MAX):
+            batch = self.service.new_batch_http_request(callback=on_response)
+            count = 0
+            for i in range(start, min(start + BATCH_MAX, len(names))):
+                batch.add(self.service.users().labels().create(userId="me", body={"name": names[i]}), request_id=str(i))
+                count += 1
+            self._execute_batch(batch, count * QUOTA_UNITS["labels.create"])
+        return created
+
+    def set_label_color(
+        self,
+        label_id: str,
+        label_name: str,
+        desired: Dict[str, str],
+        known_good: Optional[List[Dict[str, str]]] = None,
+    ) -> Optional[Dict[str, str]]:
+        """Setzt eine Farbe aus der Gmail-Palette (nur ALLOWED_LABEL_COLORS).
+
+        Probiert zuerst `desired`, dann bereits bewährte Farben (`known_good`) und
+        erst danach die restliche Palette. Liefert die gesetzte Farbe oder `None`.
+        """
         start = abs(hash(label_name)) % len(ALLOWED_LABEL_COLORS)
         order = ALLOWED_LABEL_COLORS[start:] + ALLOWED_LABEL_COLORS[:start]
-        for bg in order:
-            for txt in ("#000000", "#ffffff"):
-                try:
+        candidates: List[Dict[str, str]] = []
+        if desired:
+            candidates.append(desired)
+        candidates.extend(known_good or [])
+        candidates.extend({"backgroundColor": bg, "textColor": txt} for bg in order for txt in ("#000000", "#ffffff"))
+        tried = set()
+        for color in candidates:
+            key = (color.get("backgroundColor"), color.get("textColor"))
+            if key in tried:
+                continue
+            tried.add(key)
+            try:
+                self._execute(
                     self.service.users().labels().patch(
                         userId="me",
                         id=label_id,
-                        body={"color": {"backgroundColor": bg, "textColor": txt}},
-                    ).execute()
-                    logger.info("Label '%s' Farbe gesetzt auf bg=%s txt=%s", label_name, bg, txt)
-                    return
-                except HttpError:
-                    continue
+                        body={"color": {"backgroundColor": key[0], "textColor": key[1]}},
+                    ),
+                    "labels.patch",
+                )
+                logger.info("Label '%s' Farbe gesetzt auf bg=%s txt=%s", label_name, key[0], key[1])
+                return {"backgroundColor": key[0], "textColor": key[1]}
+            except HttpError:
+                continue
         logger.warning("Keine kompatible Farbe für Label '%s' gefunden; verwende Standard.", label_name)
+        return None
 
     def list_new_message_ids(self, q: str, max_results: int = 20) -> List[str]:
         """Listet bis zu `max_results` Nachrichten-IDs mit Pagination auf."""
@@ -94,9 +256,12 @@ class GmailClient:
             batch_max = max_results - len(collected)
             if batch_max <= 0:
                 break
-            res = self.service.users().messages().list(
-                userId="me", q=q, maxResults=min(100, batch_max), pageToken=page_token
-            ).execute()
+            res = self._execute(
+                self.service.users().messages().list(
+                    userId="me", q=q, maxResults=min(100, batch_max), pageToken=page_token
+                ),
+                "messages.list",
+            )
             msgs = res.get("messages", [])
             collected.extend([m["id"] for m in msgs])
             page_token = res.get("nextPageToken")
@@ -104,61 +269,228 @@ class GmailClient:
                 break
         return collected[:max_results]
 
-    def fetch_message_core(self, msg_id: str) -> Tuple[str, str, str, List[str], int]:
-        msg = self.service.users().messages().get(userId="me", id=msg_id, format="full").execute()
-        payload = msg.get("payload", {})
-        headers = {h["name"]: h["value"] for h in payload.get("headers", [])}
-        subject = headers.get("Subject", "")
-        sender = headers.get("From", "")
-        label_ids = msg.get("labelIds", [])
-        internal_ts = int(msg.get("internalDate", 0))
-
-        body_accum = []
+    def iter_message_pages(
+        self,
+        q: str,
+        page_token: Optional[str] = None,
+        page_size: int = 500,
+    ) -> Iterator[Tuple[List[str], Optional[str], int]]:
+        """Streamt alle Treffer von `q` seitenweise (ohne Obergrenze).
 
-        def walk(part):
-            if not part:
+        Liefert je Seite (IDs, Token der nächsten Seite, resultSizeEstimate); mit
+        `page_token` wird an einer gespeicherten Stelle fortgesetzt.
+        """
+        while True:
+            res = self._execute(
+                self.service.users().messages().list(
+                    userId="me", q=q, maxResults=min(500, page_size), pageToken=page_token
+                ),
+                "messages.list",
+            )
+            ids = [m["id"] for m in res.get("messages", [])]
+            page_token = res.get("nextPageToken")
+            yield ids, page_token, int(res.get("resultSizeEstimate", 0))
+            if not page_token or not ids:
                 return
-            parts = part.get("parts")
-            if parts:
-                for sub in parts:
-                    walk(sub)
-            mime = part.get("mimeType", "")
-            data = part.get("body", {}).get("data")
-            if data and (mime.startswith("text/plain") or mime.startswith("text/html")):
-                try:
-                    decoded = base64.urlsafe_b64decode(data).decode(errors="ignore")
-                    if mime.startswith("text/html"):
-                        # Einfache HTML->Text Konvertierung
-                        text = re.sub(r"<\s*br\s*/?>", "\n", decoded, flags=re.I)
-                        text = re.sub(r"<\s*/p\s*>", "\n", text, flags=re.I)
-                        text = re.sub(r"<script[\s\S]*?</script>", " ", text, flags=re.I)
-                        text = re.sub(r"<style[\s\S]*?</style>", " ", text, flags=re.I)
-                        text = re.sub(r"<[^>]+>", " ", text)
-                        decoded = text
-                    body_accum.append(decoded)
-                except Exception:
-                    pass
-
-        walk(payload)
-        body = " ".join(body_accum).strip()
-        if not body:
-            body = msg.get("snippet", "")
-        body = re.sub(r"\s+", " ", body).strip()
-        if len(body) > 4000:
-            body = body[:4000]
-        return subject, sender, body, label_ids, internal_ts
+
+    def get_history_id(self) -> str:
+        """Aktueller historyId des Postfachs (Startpunkt für inkrementellen Sync)."""
+        return str(self._execute(self.service.users().getProfile(userId="me"), "getProfile")["historyId"])
+
+    def list_history(self, start_history_id: str, label_id: str = "INBOX") -> Optional[Tuple[List[str], str]]:
+        """Liefert (geänderte Nachrichten-IDs, neuer historyId) seit `start_history_id`.
+
+        Berücksichtigt `messageAdded` sowie `labelAdded`, sofern dabei `label_id`
+        hinzugefügt wurde (z. B. zurück in die Inbox verschoben). Alle übrigen
+        Label-Änderungen invalidieren nur den lokalen Cache. Gibt `None`
+        zurück, wenn der historyId abgelaufen ist (HTTP 404) – dann ist ein
+        voller Sync per Query nötig.
+        """
+        changed: Dict[str, None] = {}
+        latest = start_history_id
+        page_token: Optional[str] = None
+        while True:
+            try:
+                res = self._execute(
+                    self.service.users().history().list(
+                        userId="me",
+                        startHistoryId=start_history_id,
+                        historyTypes=["messageAdded", "labelAdded", "labelRemoved"],
+                        labelId=label_id,
+                        maxResults=500,
+                        pageToken=page_token,
+                    ),
+                    "history.list",
+                )
+            except HttpError as e:
+                if getattr(e, "resp", None) is not None and e.resp.status == 404:
+                    logger.info("historyId %s abgelaufen, voller Sync nötig", start_history_id)
+                    return None
+                raise
+            touched: List[str] = []
+            for record in res.get("history", []):
+                for added in record.get("messagesAdded", []):
+                    changed[added["message"]["id"]] = None
+                for added in record.get("labelsAdded", []):
+                    touched.append(added["message"]["id"])
+                    if label_id in added.get("labelIds", []):
+                        changed[added["message"]["id"]] = None
+                for removed in record.get("labelsRemoved", []):
+                    touched.append(removed["message"]["id"])
+            if self.store is not None and touched:
+                self.store.invalidate(touched)
+            latest = str(res.get("historyId", latest))
+            page_token = res.get("nextPageToken")
+            if not page_token:
+                break
+        return list(changed), latest
+
+    def watch(self, topic_name: str, label_ids: Optional[List[str]] = None) -> Dict:
+        """Registriert (bzw. erneuert) Push-Benachrichtigungen an ein Pub/Sub-Topic."""
+        body = {
+            "topicName": topic_name,
+            "labelIds": label_ids or ["INBOX"],
+            "labelFilterBehavior": "include",
+        }
+        return self._execute(self.service.users().watch(userId="me", body=body), "watch")
+
+    def fetch_message_core(self, msg_id: str) -> MessageCore:
+        msg = self._execute(self.service.users().messages().get(userId="me", id=msg_id, format="full"), "messages.get")
+        return parse_message_core(msg)
+
+    def fetch_message_meta(self, msg_id: str) -> MessageMeta:
+        msg = self._execute(
+            self.service.users().messages().get(
+                userId="me", id=msg_id, format="metadata", metadataHeaders=METADATA_HEADERS
+            ),
+            "messages.get",
+        )
+        return parse_message_meta(msg)
+
+    def fetch_messages_core(self, msg_ids: List[str]) -> List[Optional[MessageCore]]:
+        """Holt mehrere Nachrichten (format=full) per Gmail-Batch-Request.
+
+        Ergebnisliste hat dieselbe Reihenfolge wie `msg_ids`. Fehlgeschlagene
+        Teil-Requests werden einzeln nachgeholt; scheitert auch das, steht an
+        dieser Stelle `None`.
+        """
+        cached = self.store.get_cores(msg_ids) if self.store is not None else {}
+        missing = [m for m in msg_ids if m not in cached]
+        fetched = self._batch_get(
+            missing,
+            {"format": "full"},
+            lambda raws: self.parser.map(parse_message_core, raws),
+            self.fetch_message_core,
+        )
+        if self.store is not None:
+            self.store.put_cores({m: c for m, c in zip(missing, fetched) if c is not None})
+            if cached:
+                logger.debug("Nachrichten-Cache: %d/%d Bodies lokal", len(cached), len(msg_ids))
+        by_id = dict(zip(missing, fetched))
+        return [cached[m] if m in cached else by_id[m] for m in msg_ids]
+
+    def fetch_messages_metadata(self, msg_ids: List[str]) -> List[Optional[MessageMeta]]:
+        """Wie `fetch_messages_core`, aber nur Header (METADATA_HEADERS) und labelIds – ohne Body."""
+        cached = self.store.get_metas(msg_ids) if self.store is not None else {}
+        missing = [m for m in msg_ids if m not in cached]
+        fetched = self._batch_get(
+            missing,
+            {"format": "metadata", "metadataHeaders": METADATA_HEADERS},
+            lambda raws: [_parse_or_none(parse_message_meta, r) for r in raws],
+            self.fetch_message_meta,
+        )
+        if self.store is not None:
+            self.store.put_metas(m for m in fetched if m is not None)
+        by_id = dict(zip(missing, fetched))
+        return [cached[m] if m in cached else by_id[m] for m in msg_ids]
+
+    def _batch_get(
+        self,
+        msg_ids: List[str],
+        get_kwargs: Dict,
+        parse_many: Callable[[List[Dict]], List[Optional[T]]],
+        fetch_single: Callable[[str], T],
+    ) -> List[Optional[T]]:
+        """Packt bis zu BATCH_MAX `messages.get` in einen Round-Trip; Fehler werden einzeln wiederholt.
+
+        Die Batches liefern nur Roh-Payloads; geparst wird danach gesammelt über
+        `parse_many` (ggf. im Parse-Pool), damit Netzwerk-Threads nicht parsen.
+        """
+        raw: List[Optional[Dict]] = [None] * len(msg_ids)
+        results: List[Optional[T]] = [None] * len(msg_ids)
+        failed: List[int] = []
+
+        def run_chunk(start: int) -> None:
+            chunk = msg_ids[start:start + BATCH_MAX]
+
+            def on_response(request_id, response, exception, _offset=start):
+                idx = _offset + int(request_id)
+                if exception is not None:
+                    logger.debug("Batch-Get fehlgeschlagen für %s: %s", msg_ids[idx], exception)
+                    if is_rate_limited(exception):
+                        self.scheduler.note_throttled()
+                    failed.append(idx)
+                    return
+                raw[idx] = response
+
+            batch = self.service.new_batch_http_request(callback=on_response)
+            for i, msg_id in enumerate(chunk):
+                batch.add(
+                    self.service.users().messages().get(userId="me", id=msg_id, **get_kwargs),
+                    request_id=str(i),
+                )
+            try:
+                self._execute_batch(batch, len(chunk) * QUOTA_UNITS["messages.get"])
+            except HttpError as e:
+                logger.warning("Batch-Request fehlgeschlagen (%s), hole %d Nachrichten einzeln", e, len(chunk))
+                failed.extend(i for i in range(start, start + len(chunk)) if raw[i] is None)
+
+        # Mehrere Batches parallel über den Transport-Pool (je Thread eine Verbindung)
+        self.pool.map(run_chunk, range(0, len(msg_ids), BATCH_MAX))
+
+        received = [i for i, r in enumerate(raw) if r is not None]
+        for idx, value in zip(received, parse_many([raw[i] for i in received])):
+            results[idx] = value
+            if value is None:
+                logger.debug("Parsen fehlgeschlagen für %s", msg_ids[idx])
+
+        retry_idx = sorted(set(failed))
+        for idx, value in zip(retry_idx, self.pool.map(lambda i: self._safe_fetch(fetch_single, msg_ids[i]), retry_idx)):
+            results[idx] = value
+        return results
+
+    def _safe_fetch(self, fetch_single: Callable[[str], T], msg_id: str) -> Optional[T]:
+        try:
+            return fetch_single(msg_id)
+        except Exception as exc:
+            logger.error("Nachricht %s konnte nicht geladen werden: %s", msg_id, exc)
+            return None
+
+    def fetch_many(self, msg_ids: List[str], fmt: str = "full") -> List[Optional[Union[MessageCore, MessageMeta]]]:
+        """Holt Nachrichten als Einzel-Requests, bis zu `workers` gleichzeitig.
+
+        `fmt="full"` liefert `MessageCore`-Tupel, `fmt="metadata"` `MessageMeta`.
+        Fehlgeschlagene Nachrichten stehen als `None` in der Ergebnisliste.
+        """
+        fetch_single = self.fetch_message_core if fmt == "full" else self.fetch_message_meta
+        return self.pool.map(lambda mid: self._safe_fetch(fetch_single, mid), msg_ids)
 
     def batch_add_labels(self, message_ids: List[str], add_label_ids: List[str]) -> None:
         if not message_ids:
             return
         try:
-            self.service.users().messages().batchModify(
-                userId="me",
-                body={"ids": message_ids, "addLabelIds": add_label_ids},
-            ).execute()
+            self._execute(
+                self.service.users().messages().batchModify(
+                    userId="me",
+                    body={"ids": message_ids, "addLabelIds": add_label_ids},
+                ),
+                "messages.batchModify",
+            )
         except HttpError as e:
             logger.error("batchModify fehlgeschlagen: %s", e)
             raise
+        if self.store is not None:
+            self.store.apply_label_change(message_ids, add=add_label_ids)
 
     def batch_modify(self, message_ids: List[str], add_label_ids: Optional[List[str]] = None, remove_label_ids: Optional[List[str]] = None) -> None:
         if not message_ids:
@@ -169,9 +501,54 @@ class GmailClient:
         if remove_label_ids:
             body["removeLabelIds"] = remove_label_ids
         try:
-            self.service.users().messages().batchModify(userId="me", body=body).execute()
+            self._execute(self.service.users().messages().batchModify(userId="me", body=body), "messages.batchModify")
         except HttpError as e:
             logger.error("batchModify (add/remove) fehlgeschlagen: %s", e)
             raise
+        if self.store is not None:
+            self.store.apply_label_change(message_ids, add=add_label_ids, remove=remove_label_ids)
+
+    def apply_label_changes(self, changes: List[LabelChange]) -> None:
+        """Sendet alle batchModify-Aufrufe eines Plans gemeinsam per HTTP-Batch.
+
+        Fehlgeschlagene Teil-Requests werden einzeln per `batch_modify` wiederholt;
+        scheitert auch das, wird die Exception weitergereicht. Scheitert der ganze
+        Batch, werden nur Änderungen ohne erfolgreiche Antwort wiederholt.
+        """
+        failed: List[LabelChange] = []
+
+        def run_chunk(start: int) -> None:
+            chunk = changes[start:start + BATCH_MAX]
+            # Teil-Requests mit Antwort (Erfolg oder Fehler) – nicht erneut senden
+            answered: Set[int] = set()
+
+            def on_response(request_id, response, exception, _chunk=chunk):
+                answered.add(int(request_id))
+                change = _chunk[int(request_id)]
+                if exception is not None:
+                    logger.debug("batchModify im Batch fehlgeschlagen (%d IDs): %s", len(change.ids), exception)
+                    if is_rate_limited(exception):
+                        self.scheduler.note_throttled()
+                    failed.append(change)
+                elif self.store is not None:
+                    self.store.apply_label_change(change.ids, add=list(change.add), remove=list(change.remove))
 
+            batch = self.service.new_batch_http_request(callback=on_response)
+            for i, change in enumerate(chunk):
+                body: Dict[str, List[str]] = {"ids": change.ids}
+                if change.add:
+                    body["addLabelIds"] = list(change.add)
+                if change.remove:
+                    body["removeLabelIds"] = list(change.remove)
+                batch.add(self.service.users().messages().batchModify(userId="me", body=body), request_id=str(i))
+            try:
+                self._execute_batch(batch, len(chunk) * QUOTA_UNITS["messages.batchModify"])
+            except HttpError as e:
+                logger.warning("Batch-Request für Label-Änderungen fehlgeschlagen (%s), sende einzeln", e)
+                failed.extend(c for i, c in enumerate(chunk) if i not in answered)
 
+        self.pool.map(run_chunk, range(0, len(changes), BATCH_MAX))
+        self.pool.map(
+            lambda c: self.batch_modify(c.ids, add_label_ids=list(c.add), remove_label_ids=list(c.remove)),
+            failed,
+        )
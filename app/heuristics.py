@@ -0,0 +1,253 @@
+"""Kompilierte Stichwort-Heuristik (Regeln aus prompts/heuristic_rules.json).
+
+Alle Stichwörter eines Felds (Absender, Betreff, Body) werden beim Laden zu
+einem einzigen regulären Ausdruck zusammengefasst; eine Mail wird pro Feld in
+einem Durchgang gescannt. Wortgrenzen sind pro Regel wählbar (`word`,
+`prefix`, `substring`), sodass z. B. "track" nicht mehr in "Racetrack" trifft.
+
+Micro-Benchmark:
+    python -m app.heuristics --bench [--rules prompts/heuristic_rules.json]
+"""
+from __future__ import annotations
+
+import argparse
+import functools
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts", "heuristic_rules.json")
+FIELDS = ("sender", "subject", "body")
+_MODES = ("word", "prefix", "substring")
+
+# Nur diese Labels dürfen von der Heuristik zurückgegeben werden (wie in main.ALL_LABELS, ohne Sonstiges)
+HEURISTIC_ALLOWED = frozenset({
+    "Banking", "Streaming", "Rechnung", "Warnung", "Shopping",
+    "Social Media", "Support", "Newsletter", "Versicherung",
+})
+
+
+@dataclass(frozen=True, slots=True)
+class _Keyword:
+    text: str
+    mode: str
+    # Regel nennt `sender` ausdrücklich in `fields` (z. B. "newsletter@")
+    sender_rule: bool = False
+
+
+# (Feld, Startposition, Stichwort) eines Treffers
+_Hit = Tuple[str, int, _Keyword]
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+def _trie_pattern(words: Sequence[str]) -> str:
+    """Alternation als Präfixbaum: `re` prüft pro Position nur passende Zweige, längster Treffer zuerst."""
+    trie: Dict[str, Dict] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, Dict]) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        inner = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{inner})?" if "" in node else inner
+
+    return build(trie)
+
+
+class _FieldMatcher:
+    """Ein kombinierter regulärer Ausdruck (Präfixbaum) für alle Stichwörter eines Felds.
+
+    Wortgrenzen werden nach dem Treffer geprüft: für den gefundenen Text liegen
+    vorab alle Stichwörter bereit, die an derselben Stelle beginnen (z. B.
+    "fehler" und "fehler beim"), damit auch kürzere Treffer zählen.
+    """
+
+    def __init__(self, keywords: Dict[_Keyword, Set[str]]) -> None:
+        texts = sorted({kw.text for kw in keywords})
+        self.regex = re.compile(_trie_pattern(texts)) if texts else None
+        # gefundener Text -> alle Stichwörter, die Präfix davon sind (inkl. selbst)
+        self._candidates: Dict[str, List[Tuple[_Keyword, FrozenSet[str]]]] = {
+            text: [(kw, frozenset(labels)) for kw, labels in keywords.items() if text.startswith(kw.text)]
+            for text in texts
+        }
+
+    def scan(self, text: str) -> List[Tuple[_Keyword, FrozenSet[str], int]]:
+        """(Stichwort, Labels, Startposition) je Vorkommen mit passenden Wortgrenzen."""
+        if self.regex is None or not text:
+            return []
+        text = text.lower()
+        found: List[Tuple[_Keyword, FrozenSet[str], int]] = []
+        for m in self.regex.finditer(text):
+            start = m.start()
+            before = text[start - 1] if start else ""
+            for kw, labels in self._candidates[m.group()]:
+                if kw.mode != "substring" and _is_word_char(kw.text[0]) and _is_word_char(before):
+                    continue
+                after = text[start + len(kw.text) : start + len(kw.text) + 1]
+                if kw.mode == "word" and _is_word_char(kw.text[-1]) and _is_word_char(after):
+                    continue
+                found.append((kw, labels, start))
+        return found
+
+
+class HeuristicEngine:
+    """Stichwort-Klassifikation mit vorkompilierten Regeln je Feld."""
+
+    def __init__(self, rules: Sequence[Dict], max_labels: int = 3) -> None:
+        self.max_labels = max_labels
+        self.priority: List[str] = []
+        per_field: Dict[str, Dict[_Keyword, Set[str]]] = {field: {} for field in FIELDS}
+        for rule in rules:
+            label = rule["label"]
+            if label not in HEURISTIC_ALLOWED:
+                logger.warning("Heuristik-Regel mit unbekanntem Label ignoriert: %s", label)
+                continue
+            mode = rule.get("match", "word")
+            if mode not in _MODES:
+                raise ValueError(f"Unbekannter match-Modus {mode!r} (erlaubt: {', '.join(_MODES)})")
+            fields = rule.get("fields") or FIELDS
+            if label not in self.priority:
+                self.priority.append(label)
+            sender_rule = "sender" in (rule.get("fields") or ())
+            for text in rule.get("keywords", []):
+                kw = _Keyword(text.lower(), mode, sender_rule)
+                for field in fields:
+                    per_field[field].setdefault(kw, set()).add(label)
+        self._matchers = {field: _FieldMatcher(keywords) for field, keywords in per_field.items()}
+        self._rank = {label: i for i, label in enumerate(self.priority)}
+
+    @classmethod
+    def from_file(cls, path: str = DEFAULT_RULES_FILE) -> "HeuristicEngine":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("rules", []), int(data.get("max_labels", 3)))
+
+    def _matches(self, subject: str, sender: str, body: str) -> Dict[str, List[_Hit]]:
+        found: Dict[str, List[_Hit]] = {}
+        for field, text in (("sender", sender), ("subject", subject), ("body", body)):
+            for kw, labels, start in self._matchers[field].scan(text):
+                for label in labels:
+                    found.setdefault(label, []).append((field, start, kw))
+        return found
+
+    def hits(self, subject: str, sender: str, body: str) -> Dict[str, Set[Tuple[str, str]]]:
+        """Label -> getroffene (Feld, Stichwort)-Paare."""
+        return {
+            label: {(field, kw.text) for field, _, kw in matches}
+            for label, matches in self._matches(subject, sender, body).items()
+        }
+
+    def labels(self, subject: str, sender: str, body: str) -> List[str]:
+        """Getroffene Labels nach Priorität, höchstens `max_labels` (nie Sonstiges)."""
+        found = self.hits(subject, sender, body)
+        return sorted(found, key=self._rank.__getitem__)[: self.max_labels]
+
+    def decide(self, subject: str, sender: str, body: str) -> Optional[List[str]]:
+        """Eindeutiges Ergebnis für den Heuristik-zuerst-Modus, sonst `None`.
+
+        Eindeutig heißt: genau ein Label getroffen, und zwar über eine Absender-Regel
+        (`fields: ["sender"]`) oder über mindestens zwei verschiedene Stichwörter an
+        verschiedenen Stellen. Mehrere Stichwörter derselben Fundstelle
+        ("rechnungsnummer" enthält "rechnung") zählen einmal (das längste).
+        """
+        found = self._matches(subject, sender, body)
+        if len(found) != 1:
+            return None
+        label, matches = next(iter(found.items()))
+        if any(field == "sender" and kw.sender_rule for field, _, kw in matches):
+            return [label]
+        longest: Dict[Tuple[str, int], str] = {}
+        for field, start, kw in matches:
+            if len(kw.text) > len(longest.get((field, start), "")):
+                longest[(field, start)] = kw.text
+        if len(set(longest.values())) >= 2:
+            return [label]
+        return None
+
+
+@functools.lru_cache(maxsize=None)
+def load_engine(path: str = DEFAULT_RULES_FILE) -> HeuristicEngine:
+    """Regeln einmal laden und kompilieren (pro Datei zwischengespeichert)."""
+    return HeuristicEngine.from_file(path)
+
+
+_BENCH_MAILS = [
+    ("Ihre Rechnung 2025-09", "rechnung@firma.de", "Betrag 129,00 EUR, Zahlungsziel 14 Tage. Vielen Dank für Ihren Einkauf."),
+    ("Versandbestätigung Bestellung 12345", "shop@beispiel.de", "Ihr Paket ist unterwegs, Tracking enthalten. " * 10),
+    ("Neue Anmeldung erkannt", "noreply@bank.de", "Falls Sie das nicht waren, ändern Sie sofort Ihr Passwort."),
+    ("Racetrack Weekend", "friend@example.org", "Treffen wir uns am Wochenende an der Rennstrecke? Viele Grüße " * 20),
+    ("Angebote der Woche", "news@anbieter.de", "-20% auf alles, jetzt zugreifen. Newsletter abbestellen: hier klicken. " * 30),
+    ("Re: Urlaub", "anna@example.org", "Hallo, wie war eure Reise? Wir sollten bald mal wieder zusammen essen gehen. " * 13),
+]
+
+
+def _naive_scan(engine_rules: Sequence[Dict], subject: str, sender: str, body: str) -> List[str]:
+    """Vergleich: ein `in`-Substring-Scan pro Stichwort über den Gesamttext (alte Implementierung)."""
+    text = f"{subject}\n{sender}\n{body}".lower()
+    labels: List[str] = []
+    for rule in engine_rules:
+        if rule["label"] not in labels and any(k.lower() in text for k in rule.get("keywords", [])):
+            labels.append(rule["label"])
+    return labels[:3]
+
+
+def bench(path: str = DEFAULT_RULES_FILE, rounds: int = 2000) -> None:
+    start = time.perf_counter()
+    engine = HeuristicEngine.from_file(path)
+    compile_ms = (time.perf_counter() - start) * 1000
+    with open(path, encoding="utf-8") as f:
+        rules = json.load(f).get("rules", [])
+
+    def measure(fn, mail) -> float:
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            fn(*mail)
+        return (time.perf_counter() - t0) / rounds * 1e6
+
+    print(f"Regeln kompiliert in {compile_ms:.1f} ms ({sum(len(r.get('keywords', [])) for r in rules)} Stichwörter)")
+    print(f"{'Mail':40} {'kompiliert':>12} {'Substring':>12}  Labels (Substring-Scan)")
+    totals = [0.0, 0.0]
+    for mail in _BENCH_MAILS:
+        compiled_us = measure(engine.labels, mail)
+        naive_us = measure(lambda s, f, b: _naive_scan(rules, s, f, b), mail)
+        totals[0] += compiled_us
+        totals[1] += naive_us
+        subject, sender, body = mail
+        print(
+            f"{subject[:40]:40} {compiled_us:9.1f} µs {naive_us:9.1f} µs  "
+            f"{', '.join(engine.labels(*mail)) or '-'} ({', '.join(_naive_scan(rules, *mail)) or '-'})"
+        )
+    n = len(_BENCH_MAILS)
+    print(f"{'Durchschnitt':40} {totals[0] / n:9.1f} µs {totals[1] / n:9.1f} µs")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Stichwort-Heuristik: Regeln prüfen und messen")
+    ap.add_argument("--bench", action="store_true", help="Micro-Benchmark (kompiliert vs. Substring-Scan)")
+    ap.add_argument("--rules", default=DEFAULT_RULES_FILE, help="Regel-Datei (JSON)")
+    ap.add_argument("--rounds", type=int, default=2000, help="Wiederholungen für --bench")
+    args = ap.parse_args()
+    if args.bench:
+        bench(args.rules, max(1, args.rounds))
+        return
+    engine = HeuristicEngine.from_file(args.rules)
+    print(f"{args.rules}: {len(engine.priority)} Labels, Priorität: {' > '.join(engine.priority)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from typing import List, Optional
+
+from .gmail_client import GmailClient
+
+
+logger = logging.getLogger(__name__)
+
+
+class HistorySync:
+    """Inkrementeller Sync über die Gmail History API.
+
+    Merkt sich den zuletzt verarbeiteten historyId in einer kleinen JSON-Datei.
+    `changed_message_ids()` liefert nur die seitdem neuen bzw. in die Inbox
+    verschobenen Nachrichten – oder `None`, wenn ein voller Sync per Query nötig
+    ist (erster Start oder abgelaufener historyId). Zusätzlich wird der Zeitpunkt
+    der letzten Sonstiges-Neuprüfung (Pass 2) gespeichert, damit sie auch im
+    Delta-Betrieb regelmäßig läuft.
+    """
+
+    def __init__(self, gmail: GmailClient, state_path: str = ".gmail_history.json") -> None:
+        self.gmail = gmail
+        self.state_path = state_path
+        self.history_id: Optional[str] = None
+        self.relabeled_at = 0.0
+        self._load()
+        self._pending: Optional[str] = None
+
+    def _load(self) -> None:
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.history_id = data.get("historyId") or None
+            self.relabeled_at = float(data.get("relabeledAt") or 0.0)
+        except Exception as exc:
+            logger.warning("Sync-Status %s nicht lesbar (%s), starte mit vollem Sync", self.state_path, exc)
+
+    def relabel_due(self, interval: float) -> bool:
+        """Ist die letzte Neuprüfung mindestens `interval` Sekunden her? (0 = nie im Delta-Betrieb)"""
+        return interval > 0 and time.time() - self.relabeled_at >= interval
+
+    def mark_relabeled(self) -> None:
+        self.relabeled_at = time.time()
+        self._save()
+
+    def changed_message_ids(self) -> Optional[List[str]]:
+        """Geänderte Nachrichten seit dem letzten Commit, oder `None` für vollen Sync."""
+        if not self.history_id:
+            # Startpunkt vor dem vollen Sync merken, damit in der Zwischenzeit
+            # eintreffende Mails beim nächsten Delta nicht verloren gehen.
+            self._pending = self.gmail.get_history_id()
+            return None
+        delta = self.gmail.list_history(self.history_id)
+        if delta is None:
+            self._pending = self.gmail.get_history_id()
+            return None
+        ids, latest = delta
+        self._pending = latest
+        return ids
+
+    def commit(self) -> None:
+        """Übernimmt den beim letzten Abruf gesehenen historyId als neuen Startpunkt."""
+        if not self._pending:
+            return
+        self.history_id = self._pending
+        self._pending = None
+        self._save()
+
+    def _save(self) -> None:
+        if not self.history_id:
+            return
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"historyId": self.history_id, "relabeledAt": self.relabeled_at}, f)
+        os.replace(tmp, self.state_path)
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from googleapiclient.errors import HttpError
+
+from .gmail_client import GmailClient
+
+
+logger = logging.getLogger(__name__)
+
+
+def is_unknown_label_error(exc: Exception) -> bool:
+    """True, wenn Gmail eine Label-ID nicht (mehr) kennt (404 bzw. 400 'Invalid label')."""
+    if not isinstance(exc, HttpError):
+        return False
+    status = getattr(getattr(exc, "resp", None), "status", None)
+    if status == 404:
+        return True
+    content = getattr(exc, "content", b"") or b""
+    if isinstance(content, bytes):
+        content = content.decode("utf-8", errors="ignore")
+    return status == 400 and "label" in content.lower()
+
+
+class LabelRegistry:
+    """Katalog der User-Labels (Name <-> ID) mit TTL, im Speicher und auf Platte.
+
+    `labels.list` läuft nur, wenn der Katalog älter als `ttl` ist oder nach
+    `invalidate()` (z. B. weil Gmail eine Label-ID mit 404 abgelehnt hat).
+    Fehlende Labels werden gesammelt in einem Batch angelegt. Erfolgreich
+    gesetzte Farben werden gemerkt, damit die Palette nicht erneut durchprobiert
+    werden muss.
+    """
+
+    def __init__(self, gmail: GmailClient, path: str = ".gmail_labels.json", ttl: int = 3600) -> None:
+        self.gmail = gmail
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.name_to_id: Dict[str, str] = {}
+        # label_id -> {"backgroundColor", "textColor"}
+        self.colors: Dict[str, Dict[str, str]] = {}
+        # Farben, die Gmail bereits akzeptiert hat (werden bei neuen Labels zuerst probiert)
+        self.known_good: List[Dict[str, str]] = []
+        self.fetched_at = 0.0
+        self._load()
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.name_to_id = dict(data.get("labels", {}))
+            self.colors = dict(data.get("colors", {}))
+            self.known_good = list(data.get("known_good", []))
+            self.fetched_at = float(data.get("fetched_at", 0))
+        except Exception as exc:
+            logger.warning("Label-Cache %s nicht lesbar (%s), lade neu", self.path, exc)
+
+    def _save(self) -> None:
+        data = {
+            "fetched_at": self.fetched_at,
+            "labels": self.name_to_id,
+            "colors": self.colors,
+            "known_good": self.known_good,
+        }
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    @property
+    def stale(self) -> bool:
+        return time.time() - self.fetched_at > self.ttl
+
+    def invalidate(self) -> None:
+        """Erzwingt beim nächsten Zugriff ein `labels.list`."""
+        with self._lock:
+            self.fetched_at = 0.0
+
+    def refresh(self) -> None:
+        labels = self.gmail.list_user_labels()
+        with self._lock:
+            self.name_to_id = {l["name"]: l["id"] for l in labels}
+            self.colors = {l["id"]: l["color"] for l in labels if l.get("color")}
+            self.fetched_at = time.time()
+            self._save()
+        logger.debug("Label-Katalog aktualisiert (%d Labels)", len(self.name_to_id))
+
+    def ensure(self, names: List[str]) -> Dict[str, str]:
+        """Liefert Name -> ID für `names` und legt fehlende Labels an."""
+        if self.stale or any(n not in self.name_to_id for n in names):
+            if self.stale:
+                self.refresh()
+            missing = [n for n in names if n not in self.name_to_id]
+            if missing:
+                logger.info("Fehlende Labels werden angelegt: %s", ", ".join(sorted(missing)))
+                created = self.gmail.create_labels(missing)
+                if len(created) < len(missing):
+                    # z. B. parallel angelegt (409) – Katalog neu laden
+                    self.refresh()
+                with self._lock:
+                    self.name_to_id.update(created)
+                    self._save()
+        return {n: self.name_to_id[n] for n in names if n in self.name_to_id}
+
+    def ensure_colors(self, colors: Dict[str, Dict[str, str]]) -> None:
+        """Setzt Farben nur für Labels, die noch keine gemerkte Farbe haben."""
+        changed = False
+        for name, desired in colors.items():
+            label_id = self.name_to_id.get(name)
+            if not label_id or label_id in self.colors:
+                continue
+            applied = self.gmail.set_label_color(label_id, name, desired, known_good=self.known_good)
+            if applied:
+                with self._lock:
+                    self.colors[label_id] = applied
+                    if applied not in self.known_good:
+                        self.known_good.append(applied)
+                changed = True
+        if changed:
+            with self._lock:
+                self._save()
+
+    def id_to_name(self) -> Dict[str, str]:
+        return {v: k for k, v in self.name_to_id.items()}
+
+    def get(self, name: str) -> Optional[str]:
+        return self.name_to_id.get(name)
@@ -0,0 +1,263 @@
+"""Lokales Vorab-Modell: Naive Bayes über gehashte Wort-N-Gramme.
+
+Verwendung:
+    python -m app.local_model train [--max-per-label 500] [--token token.json]
+    python -m app.local_model evaluate [--max-per-label 500] [--threshold 0.98]
+
+`train` baut das Modell aus den Labels, die in Gmail tatsächlich gesetzt sind
+(inkl. manueller Korrekturen), und speichert es in LOCAL_MODEL_FILE. Im Betrieb
+lernt das Modell zusätzlich aus jeder bestätigten LLM-Entscheidung. Antworten
+mit Konfidenz >= LOCAL_MODEL_THRESHOLD ersetzen die Ollama-Anfrage.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import math
+import os
+import threading
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+from .classification_cache import normalize_text, normalized_sender, sender_key
+
+
+logger = logging.getLogger(__name__)
+
+MODEL_FILE = ".gmail_local_model.json"
+# Anzahl Hash-Buckets (Feature-Hashing, kein Vokabular nötig)
+N_FEATURES = 1 << 18
+# Laplace-Glättung
+_ALPHA = 0.1
+# Naive Bayes ist bei vielen Merkmalen extrem überkonfident: Log-Likelihood je
+# Merkmal mitteln und so gewichten, als lägen nur so viele unabhängige Merkmale vor
+_EVIDENCE_WEIGHT = 20.0
+# Änderungen, nach denen das Modell im Betrieb automatisch gespeichert wird
+_SAVE_EVERY = 50
+
+
+def features(sender: str, subject: str, body: str) -> List[int]:
+    """Gehashte Merkmale: Absender/Domain, Wörter und Wort-Bigramme aus Betreff und Body."""
+    tokens = [f"a:{normalized_sender(sender)}", f"d:{sender_key(sender)}"]
+    for prefix, text in (("s", subject), ("b", (body or "")[:1000])):
+        words = normalize_text(text).split()
+        tokens.extend(f"{prefix}:{w}" for w in words)
+        tokens.extend(f"{prefix}:{a} {b}" for a, b in zip(words, words[1:]))
+    return [zlib.crc32(t.encode("utf-8")) % N_FEATURES for t in tokens]
+
+
+def _class_name(labels: Sequence[str]) -> str:
+    return "+".join(sorted(set(labels)))
+
+
+@dataclass(slots=True)
+class _ClassStats:
+    docs: int = 0
+    total: int = 0
+    counts: Dict[int, int] = field(default_factory=dict)
+
+
+class LocalModel:
+    """Multinomial Naive Bayes über gehashte Merkmale; eine Klasse je Label-Kombination.
+
+    Training ist inkrementell (`learn`), eine Vorhersage kostet nur einige
+    Dictionary-Zugriffe. `predict` liefert nur dann Labels, wenn das Modell
+    genug Beispiele gesehen hat und die Posterior-Wahrscheinlichkeit der
+    besten Klasse mindestens `threshold` beträgt. Mit `path=None` bleibt das
+    Modell nur im Speicher (kein Laden, kein Speichern).
+    """
+
+    def __init__(self, path: Optional[str] = MODEL_FILE, threshold: float = 0.98, min_docs: int = 200) -> None:
+        self.path = path
+        self.threshold = threshold
+        self.min_docs = min_docs
+        self.classes: Dict[str, _ClassStats] = {}
+        self._lock = threading.Lock()
+        self._dirty = 0
+        self._load()
+
+    @property
+    def docs(self) -> int:
+        return sum(c.docs for c in self.classes.values())
+
+    def _load(self) -> None:
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("n_features") != N_FEATURES:
+                logger.warning("Lokales Modell %s hat andere Merkmalsgröße, wird neu aufgebaut", self.path)
+                return
+            self.classes = {
+                name: _ClassStats(c["docs"], c["total"], {int(k): v for k, v in c["counts"].items()})
+                for name, c in data.get("classes", {}).items()
+            }
+        except Exception as exc:
+            logger.warning("Lokales Modell %s nicht lesbar (%s), starte leer", self.path, exc)
+            self.classes = {}
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            data = {
+                "n_features": N_FEATURES,
+                "classes": {
+                    name: {"docs": c.docs, "total": c.total, "counts": c.counts}
+                    for name, c in self.classes.items()
+                },
+            }
+            self._dirty = 0
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, self.path)
+
+    def close(self) -> None:
+        if self._dirty:
+            self.save()
+
+    def learn(self, items: Sequence[Tuple[str, str, str]], results: Sequence[Sequence[str]]) -> None:
+        """Trainiert mit (sender, subject, body) und den zugehörigen Labels."""
+        with self._lock:
+            for item, labels in zip(items, results):
+                stats = self.classes.setdefault(_class_name(labels), _ClassStats())
+                stats.docs += 1
+                for idx in features(*item):
+                    stats.counts[idx] = stats.counts.get(idx, 0) + 1
+                    stats.total += 1
+                self._dirty += 1
+            save = self.path is not None and self._dirty >= _SAVE_EVERY
+        if save:
+            self.save()
+
+    def probabilities(self, sender: str, subject: str, body: str) -> Dict[str, float]:
+        """Posterior je Klasse (Label-Kombination)."""
+        feats = features(sender, subject, body)
+        with self._lock:
+            total_docs = sum(c.docs for c in self.classes.values())
+            if not total_docs:
+                return {}
+            scores: Dict[str, float] = {}
+            for name, c in self.classes.items():
+                denom = math.log(c.total + _ALPHA * N_FEATURES)
+                loglik = sum(math.log(c.counts.get(idx, 0) + _ALPHA) - denom for idx in feats)
+                scores[name] = math.log(c.docs / total_docs) + _EVIDENCE_WEIGHT * loglik / max(1, len(feats))
+        top = max(scores.values())
+        exp = {name: math.exp(s - top) for name, s in scores.items()}
+        norm = sum(exp.values())
+        return {name: v / norm for name, v in exp.items()}
+
+    def predict(self, sender: str, subject: str, body: str) -> Optional[Tuple[List[str], float]]:
+        """(Labels, Konfidenz) der besten Klasse, unabhängig vom Schwellwert."""
+        probs = self.probabilities(sender, subject, body)
+        if not probs:
+            return None
+        name, p = max(probs.items(), key=lambda kv: kv[1])
+        return name.split("+"), p
+
+    def confident(self, sender: str, subject: str, body: str) -> Optional[List[str]]:
+        """Labels, wenn das Modell ausreichend trainiert und sicher genug ist, sonst `None`."""
+        if self.docs < self.min_docs:
+            return None
+        prediction = self.predict(sender, subject, body)
+        if prediction is None or prediction[1] < self.threshold:
+            return None
+        return prediction[0]
+
+
+def _labelled_examples(cfg, token_path: str, max_per_label: int) -> List[Tuple[str, Tuple[str, str, str], List[str]]]:
+    """(id, Eingabe, Labels) für Mails mit gesetzten Gmail-Labels aus ALL_LABELS."""
+    from .accounts import mailbox_config
+    from .main import ALL_LABELS, build_gmail
+
+    gmail = build_gmail(mailbox_config(cfg, token_path)[0], token_path)
+    try:
+        labels_by_id: Dict[str, List[str]] = {}
+        for name in ALL_LABELS:
+            count = 0
+            for ids, _, _ in gmail.iter_message_pages(f'label:"{name}"'):
+                ids = ids[: max_per_label - count]
+                for mid in ids:
+                    labels_by_id.setdefault(mid, []).append(name)
+                count += len(ids)
+                if count >= max_per_label:
+                    break
+            logger.info("Label %s: %d Nachrichten", name, count)
+        ids = list(labels_by_id)
+        examples = []
+        for start in range(0, len(ids), 100):
+            chunk = ids[start:start + 100]
+            for mid, core in zip(chunk, gmail.fetch_messages_core(chunk)):
+                if core is None:
+                    continue
+                subject, sender, body, _, _ = core
+                labels = labels_by_id[mid]
+                # Sonstiges wird nie mit anderen Labels kombiniert
+                if len(labels) > 1 and "Sonstiges" in labels:
+                    labels = [l for l in labels if l != "Sonstiges"]
+                examples.append((mid, (sender, subject, body[:1000]), labels))
+        return examples
+    finally:
+        gmail.close()
+
+
+def _is_holdout(message_id: str) -> bool:
+    """Deterministische 80/20-Aufteilung nach Nachrichten-ID."""
+    return zlib.crc32(message_id.encode("utf-8")) % 5 == 0
+
+
+def main() -> None:
+    from .config import load_config
+
+    load_dotenv()
+    cfg = load_config()
+    ap = argparse.ArgumentParser(description="Lokales Vorab-Modell trainieren/bewerten")
+    ap.add_argument("command", choices=["train", "evaluate"])
+    ap.add_argument("--max-per-label", type=int, default=500, help="Höchstens N Mails je Label aus Gmail (Default: 500)")
+    ap.add_argument("--threshold", type=float, default=cfg.local_model_threshold, help="Konfidenz-Schwelle für evaluate")
+    ap.add_argument("--token", default="token.json", help="Token-Datei des Postfachs (Default: token.json)")
+    args = ap.parse_args()
+
+    examples = _labelled_examples(cfg, args.token, max(1, args.max_per_label))
+    if not examples:
+        logger.error("Keine gelabelten Mails gefunden – zuerst Labels setzen (run/backfill)")
+        return
+
+    if args.command == "train":
+        # Gmail-Labels sind die Wahrheit (inkl. manueller Korrekturen): neu aufbauen
+        model = LocalModel(cfg.local_model_file, cfg.local_model_threshold, cfg.local_model_min_docs)
+        model.classes = {}
+        model.learn([item for _, item, _ in examples], [labels for _, _, labels in examples])
+        model.save()
+        logger.info("Lokales Modell trainiert: %d Mails, %d Klassen -> %s", model.docs, len(model.classes), cfg.local_model_file)
+        return
+
+    train = [(item, labels) for mid, item, labels in examples if not _is_holdout(mid)]
+    test = [(item, labels) for mid, item, labels in examples if _is_holdout(mid)]
+    model = LocalModel(None, args.threshold, min_docs=0)
+    model.learn([item for item, _ in train], [labels for _, labels in train])
+    correct = confident = confident_correct = 0
+    for item, labels in test:
+        prediction = model.predict(*item)
+        hit = prediction is not None and _class_name(prediction[0]) == _class_name(labels)
+        correct += hit
+        if prediction is not None and prediction[1] >= args.threshold:
+            confident += 1
+            confident_correct += hit
+    n = max(1, len(test))
+    logger.info("Evaluation: %d Trainings-, %d Testmails", len(train), len(test))
+    logger.info("Genauigkeit gesamt: %.1f%%", 100.0 * correct / n)
+    logger.info(
+        "Ab Schwelle %.2f: %.1f%% der Mails ohne LLM, davon %.1f%% korrekt",
+        args.threshold, 100.0 * confident / n, 100.0 * confident_correct / max(1, confident),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,34 @@
 from __future__ import annotations
 
 import argparse
+import functools
 import logging
-from typing import Dict, List, Set
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
 
 from dotenv import load_dotenv
-import time
 
-from .config import load_config
-from .gmail_client import GmailClient, ALLOWED_LABEL_COLORS
+from .accounts import ClassificationPool, ClassifyItem, ClassifyResult, account_config, account_from_token
+from .config import AppConfig, load_config
+from .gmail_client import GmailClient, MessageCore, MessageMeta, ALLOWED_LABEL_COLORS
 from .classifier import Classifier
+from .classification_cache import ClassificationCache
+from .heuristics import load_engine
+from .local_model import LocalModel
+from .sender_memory import SenderMemory
+from .history_sync import HistorySync
+from .message_store import MessageStore
+from .labels import LabelRegistry, is_unknown_label_error
+from .planner import plan_label_changes
+from .quota import QuotaScheduler
+from . import push
 
 
 logger = logging.getLogger(__name__)
 
+# Klassifiziert mehrere (sender, subject, body) auf einmal; Fehler stehen als Exception im Ergebnis
+ClassifyMany = Callable[[Sequence[ClassifyItem]], List[ClassifyResult]]
+
 
 ALL_LABELS = [
     "Banking",
@@ -28,6 +43,9 @@ ALL_LABELS = [
     "Sonstiges",
 ]
 
+# Höchstens so viele Seiten (à 500 IDs) der Query beim Filtern eines History-Deltas
+_DELTA_QUERY_PAGES = 10
+
 # Nur Gmail-erlaubte Farben (ALLOWED_LABEL_COLORS); Textfarbe #ffffff für dunklere Töne
 _DARK_BG = frozenset({"#5484ed", "#46d6db", "#51b749", "#dc2127", "#4986e7", "#ac725e", "#cd74e6"})
 LABEL_COLORS = {}
@@ -37,142 +55,449 @@ for i, name in enumerate(ALL_LABELS):
     LABEL_COLORS[name] = {"backgroundColor": bg, "textColor": txt}
 
 
-def run(dry_run_cli: bool | None = None, q_cli: str | None = None, max_results_cli: int | None = None) -> None:
+def run(
+    dry_run_cli: bool | None = None,
+    q_cli: str | None = None,
+    max_results_cli: int | None = None,
+    sync_cli: str | None = None,
+    threads_cli: bool | None = None,
+) -> None:
     load_dotenv()
-    cfg = load_config()
+    cfg = apply_overrides(load_config(), dry_run_cli, q_cli, max_results_cli, sync_cli, threads_cli)
+    log_start(cfg)
+
+    with build_classifier(cfg) as classifier:
+        if not cfg.gmail_accounts:
+            _run_account(cfg, classifier.classify_many)
+            return
+
+        # Multi-Mailbox: Abruf/Schreiben pro Konto parallel, Klassifikation über einen gemeinsamen Pool
+        accounts = [account_from_token(path) for path in cfg.gmail_accounts]
+        pool = ClassificationPool(classifier.classify_many, workers=cfg.ollama_concurrency, batch_size=cfg.classify_batch_size)
+        try:
+            run_mailboxes([
+                (
+                    account.name,
+                    functools.partial(
+                        _run_account,
+                        account_config(cfg, account),
+                        functools.partial(pool.classify_many, account.name),
+                        account.token_path,
+                    ),
+                )
+                for account in accounts
+            ])
+        finally:
+            pool.close()
+
 
-    # CLI-Flags überschreiben ENV/Defaults
+def apply_overrides(
+    cfg: AppConfig,
+    dry_run_cli: bool | None = None,
+    q_cli: str | None = None,
+    max_results_cli: int | None = None,
+    sync_cli: str | None = None,
+    threads_cli: bool | None = None,
+) -> AppConfig:
+    """CLI-Flags überschreiben ENV/Defaults."""
     if dry_run_cli is not None:
         cfg.dry_run = dry_run_cli
     if q_cli:
         cfg.gmail_query = q_cli
     if max_results_cli is not None:
         cfg.max_results = max_results_cli
+    if sync_cli:
+        cfg.sync_mode = sync_cli
+    if threads_cli:
+        cfg.thread_mode = True
+    return cfg
 
-    logger.info("Starte Gmail-Klassifikation | dry_run=%s | q=%.80s | max=%d", cfg.dry_run, cfg.gmail_query, cfg.max_results)
 
-    gmail = GmailClient()
-    name_to_id = gmail.ensure_labels(ALL_LABELS, colors=None)
-    logger.info("Vorhandene/angelegte Labels: %s", ", ".join(sorted(name_to_id.keys())))
+def log_start(cfg: AppConfig) -> None:
+    logger.info(
+        "Starte Gmail-Klassifikation | dry_run=%s | sync=%s | threads=%s | q=%.80s | max=%d",
+        cfg.dry_run, cfg.sync_mode, cfg.thread_mode, cfg.gmail_query, cfg.max_results,
+    )
+
+
+def run_mailboxes(jobs: List[Tuple[str, Callable[[], None]]]) -> None:
+    """Führt die Läufe mehrerer Postfächer parallel aus; Fehler eines Kontos stoppen die anderen nicht."""
+    with ThreadPoolExecutor(max_workers=max(1, len(jobs)), thread_name_prefix="konto") as executor:
+        futures = {executor.submit(job): name for name, job in jobs}
+        for fut in as_completed(futures):
+            try:
+                fut.result()
+            except Exception as exc:
+                logger.exception("[%s] Lauf fehlgeschlagen: %s", futures[fut], exc)
 
+
+def build_classifier(cfg: AppConfig) -> Classifier:
+    """Classifier mit Keep-Alive-Verbindungen; lädt das Modell vorab (Warm-up)."""
     allowed = [l for l in ALL_LABELS if l != "Sonstiges"] + ["Sonstiges"]
+    cache = None
+    if cfg.classification_cache:
+        cache = ClassificationCache(
+            cfg.classification_cache_file, cfg.classification_cache_max, cfg.classification_cache_distance
+        )
+    memory = None
+    if cfg.sender_memory:
+        memory = SenderMemory(
+            cfg.sender_memory_file,
+            cfg.sender_memory_min_count,
+            cfg.sender_memory_min_agreement,
+            cfg.sender_memory_sample_rate,
+        )
+    local_model = None
+    if cfg.local_model:
+        local_model = LocalModel(cfg.local_model_file, cfg.local_model_threshold, cfg.local_model_min_docs)
+    embeddings = None
+    if cfg.embedding_index:
+        # Import erst hier: numpy wird nur für den Embedding-Index benötigt
+        from .embedding_index import EmbeddingIndex
+
+        embeddings = EmbeddingIndex(
+            cfg.embedding_index_file,
+            cfg.ollama_embed_model,
+            cfg.embedding_k,
+            cfg.embedding_min_similarity,
+            cfg.embedding_min_agreement,
+        )
     classifier = Classifier(
         labels_allowed=allowed,
         ollama_base_url=cfg.ollama_base_url,
         ollama_model=cfg.ollama_model,
+        connect_timeout=cfg.ollama_connect_timeout,
+        read_timeout=cfg.ollama_read_timeout,
+        max_connections=cfg.ollama_concurrency,
+        concurrency=cfg.ollama_concurrency,
+        batch_size=cfg.classify_batch_size,
+        keep_alive=cfg.ollama_keep_alive or None,
+        cache=cache,
+        memory=memory,
+        local_model=local_model,
+        heuristics=load_engine(cfg.heuristic_rules_file),
+        heuristics_first=cfg.heuristics_first,
+        embeddings=embeddings,
     )
+    classifier.warm_up()
+    return classifier
+
+
+def _run_account(cfg: AppConfig, classify_many: ClassifyMany, token_path: str = "token.json") -> None:
+    """Baut Store, Quota-Scheduler und Gmail-Client für ein Postfach und verarbeitet es."""
+    if cfg.gmail_accounts:
+        logger.info("Postfach: %s", token_path)
+    gmail = build_gmail(cfg, token_path)
+    try:
+        process(cfg, gmail, gmail.scheduler, classify_many)
+    finally:
+        gmail.close()
+
+
+def build_gmail(cfg: AppConfig, token_path: str = "token.json") -> GmailClient:
+    """Gmail-Client mit Nachrichten-Cache und Quota-Scheduler laut Konfiguration."""
+    store = None
+    if cfg.message_cache:
+        store = MessageStore(cfg.message_cache_file, cfg.message_cache_max, cfg.message_cache_label_ttl)
+    scheduler = QuotaScheduler(cfg.gmail_quota_units_per_second, max_retries=cfg.gmail_max_retries)
+    return GmailClient(
+        store=store,
+        scheduler=scheduler,
+        workers=cfg.gmail_workers,
+        parse_workers=cfg.parse_workers,
+        token_path=token_path,
+    )
+
+
+def prepare_labels(cfg: AppConfig, gmail: GmailClient) -> LabelRegistry:
+    """Label-Katalog aus dem Cache laden (labels.list nur nach Ablauf der TTL), fehlende Labels anlegen."""
+    registry = LabelRegistry(gmail, cfg.label_cache_file, cfg.label_cache_ttl)
+    name_to_id = registry.ensure(ALL_LABELS)
+    if cfg.set_label_colors and not cfg.dry_run:
+        registry.ensure_colors(LABEL_COLORS)
+    logger.info("Vorhandene/angelegte Labels: %s", ", ".join(sorted(name_to_id.keys())))
+    return registry
+
+
+def process(cfg: AppConfig, gmail: GmailClient, scheduler: QuotaScheduler, classify_many: ClassifyMany) -> None:
+    """Ein Durchlauf: Nachrichten auswählen, klassifizieren und Labels schreiben."""
+    registry = prepare_labels(cfg, gmail)
 
     effective_max = min(cfg.max_results, 20)
-    # PASS 1: Unread der letzten 2 Tage
-    message_ids = gmail.list_new_message_ids(cfg.gmail_query, effective_max)
-    logger.info("Gefundene Nachrichten: %d (q=%.120s)", len(message_ids), cfg.gmail_query)
-    # Preview der ersten Betreffzeilen zur schnellen Diagnose
-    preview_max = min(5, len(message_ids))
-    for i in range(preview_max):
-        try:
-            subj, sndr, _body, _lbls, its = gmail.fetch_message_core(message_ids[i])
-            logger.debug("Preview[%d]: %s | %s", i, subj[:120], sndr)
-        except Exception as e:
-            logger.debug("Preview[%d] Fehler: %s", i, e)
+    # Im History-Modus liefert die History API nur geänderte Nachrichten (ohne Obergrenze);
+    # die Query läuft nur beim ersten Start oder nach Ablauf des historyId,
+    # Pass 2 danach nur alle RELABEL_INTERVAL Sekunden.
+    sync = HistorySync(gmail, cfg.history_state_file) if cfg.sync_mode == "history" else None
+    delta_ids = sync.changed_message_ids() if sync else None
+    full_sync = delta_ids is None
+    relabel = full_sync or sync.relabel_due(cfg.relabel_interval)
+    if full_sync:
+        # PASS 1: Unread der letzten 2 Tage
+        message_ids = gmail.list_new_message_ids(cfg.gmail_query, effective_max)
+        logger.info("Gefundene Nachrichten: %d (q=%.120s)", len(message_ids), cfg.gmail_query)
+    else:
+        message_ids = _filter_by_query(gmail, cfg.gmail_query, delta_ids)
+        logger.info(
+            "Geänderte Nachrichten seit historyId %s: %d, davon %d passend zu q=%.120s",
+            sync.history_id, len(delta_ids), len(message_ids), cfg.gmail_query,
+        )
     if not message_ids:
         logger.info("Keine neuen Nachrichten gefunden.")
+        if sync and not cfg.dry_run:
+            sync.commit()
+        if not (sync and relabel):
+            return
+    else:
+        label_messages(cfg, gmail, registry, classify_many, message_ids)
+        if not cfg.dry_run:
+            logger.info("Batch-Labeling abgeschlossen.")
+            if sync:
+                sync.commit()
+        logger.debug("Gmail-Quota nach Pass 1: %s", scheduler.headroom())
+
+    if not relabel:
+        # Zwischen zwei Neuprüfungen werden unveränderte 'Sonstiges'-Mails nicht erneut klassifiziert
         return
 
-    plan: Dict[str, List[str]] = {}
-    remove_sonstiges: List[str] = []
-    # Hilfs-Mapping für Label-ID → -Name
-    id_to_name = {v: k for k, v in name_to_id.items()}
+    # PASS 2: Re-Label für bestehende 'Sonstiges' innerhalb 7 Tage
+    q_relabel = "in:inbox label:Sonstiges newer_than:7d"
+    message_ids2 = gmail.list_new_message_ids(q_relabel, effective_max)
+    logger.info("Gefundene 'Sonstiges' zur Neuprüfung: %d (q=%.120s)", len(message_ids2), q_relabel)
 
-    for mid in message_ids:
+    desired2: Dict[str, Tuple[Set[str], Set[str]]] = {}
+    # Aktuelle labelIds aus Tier 1 (gecacht), damit bereits vorhandene Labels nicht erneut gesetzt werden
+    metas2 = gmail.fetch_messages_metadata(message_ids2)
+    current2: Dict[str, Optional[List[str]]] = {
+        mid: (meta.label_ids if meta is not None else None) for mid, meta in zip(message_ids2, metas2)
+    }
+    groups2 = _group_by_thread(message_ids2, dict(zip(message_ids2, metas2)), cfg.thread_mode)
+    cores2 = gmail.fetch_messages_core(list(groups2))
+    results2 = _classify_cores(classify_many, list(groups2), cores2)
+    for mid, core in zip(groups2, cores2):
         try:
-            subject, sender, body, label_ids, internal_ts = gmail.fetch_message_core(mid)
+            if core is None:
+                raise RuntimeError(f"Nachricht {mid} konnte nicht geladen werden")
+            subject, sender, body, label_ids, internal_ts = core
+            result2 = results2[mid]
+            if isinstance(result2, BaseException):
+                raise result2
+            labels2: Set[str] = set(result2)
+            remove2: Set[str] = set()
+            # Wenn spezifische Labels gefunden wurden, Sonstiges entfernen
+            if any(l for l in labels2 if l != "Sonstiges"):
+                remove2.add("Sonstiges")
+            # 'Sonstiges' ist bereits gesetzt (Query), nur spezifische Labels ergänzen
+            labels2.discard("Sonstiges")
+            logger.info(
+                "Re-Label: %s | %s -> %s%s",
+                mid, subject[:80], ", ".join(sorted(labels2)) or "Sonstiges", _thread_suffix(groups2[mid]),
+            )
+        except Exception as exc:
+            logger.exception("Fehler bei Re-Labeling: %s", exc)
+            labels2, remove2 = {"Warnung"}, set()
+        for member in groups2[mid]:
+            desired2[member] = (labels2, remove2)
+
+    _apply_plan(gmail, registry, desired2, current2, cfg.dry_run, context="Re-Label")
+    if not cfg.dry_run:
+        logger.info("Re-Labeling abgeschlossen.")
+        if sync:
+            sync.mark_relabeled()
+    logger.debug("Gmail-Quota nach Pass 2: %s", scheduler.headroom())
+
+
+def _filter_by_query(gmail: GmailClient, query: str, message_ids: List[str]) -> List[str]:
+    """Beschränkt History-Delta-IDs auf Treffer von GMAIL_Q (z. B. is:unread, newer_than:).
+
+    Die History API kennt keine Query; die Treffer werden daher seitenweise
+    (neueste zuerst) gelistet, bis alle Delta-IDs gefunden sind. Die Query wird
+    auf das Empfangsdatum der ältesten Delta-Nachricht begrenzt (`after:`, aus den
+    gecachten Metadaten), damit nur wenige Seiten anfallen; als Schranke gelten
+    höchstens `_DELTA_QUERY_PAGES` Seiten.
+    """
+    if not query.strip() or not message_ids:
+        return message_ids
+    stamps = [meta.internal_ts for meta in gmail.fetch_messages_metadata(message_ids) if meta is not None and meta.internal_ts]
+    if stamps:
+        # after: ist sekundengenau und exklusiv -> eine Sekunde Puffer
+        query = f"({query}) after:{min(stamps) // 1000 - 1}"
+    wanted = set(message_ids)
+    matched: Set[str] = set()
+    for page, (ids, _, _) in enumerate(gmail.iter_message_pages(query), start=1):
+        matched.update(wanted.intersection(ids))
+        if len(matched) == len(wanted) or page >= _DELTA_QUERY_PAGES:
+            break
+    return [mid for mid in message_ids if mid in matched]
+
+
+def label_messages(
+    cfg: AppConfig,
+    gmail: GmailClient,
+    registry: LabelRegistry,
+    classify_many: ClassifyMany,
+    message_ids: List[str],
+) -> int:
+    """Pass 1 für `message_ids`: Metadaten, Skip, Klassifikation und Label-Schreiben.
+
+    Wird auch vom Backfill (app.backfill) pro Block verwendet. Liefert die Anzahl
+    der Nachrichten, deren Labels geändert wurden (bzw. im Dry-Run würden).
+    """
+    # Tier 1: nur Metadaten (Header + labelIds) in einem Batch-Round-Trip holen
+    metas = gmail.fetch_messages_metadata(message_ids)
+    # Preview der ersten Betreffzeilen zur schnellen Diagnose
+    for i, meta in enumerate(metas[:5]):
+        if meta is None:
+            logger.debug("Preview[%d] Fehler: Nachricht nicht geladen", i)
+            continue
+        logger.debug("Preview[%d]: %s | %s", i, meta.subject[:120], meta.sender)
+
+    # Gewünschter Endzustand je Nachricht: (hinzuzufügende, zu entfernende Label-Namen)
+    desired: Dict[str, Tuple[Set[str], Set[str]]] = {}
+    current: Dict[str, Optional[List[str]]] = {
+        mid: (meta.label_ids if meta is not None else None) for mid, meta in zip(message_ids, metas)
+    }
+    # Hilfs-Mapping für Label-ID → -Name
+    id_to_name = registry.id_to_name()
+
+    # Skip-Entscheidung allein anhand der Metadaten; nur der Rest braucht den Body
+    to_classify: List[str] = []
+    for mid, meta in zip(message_ids, metas):
+        if meta is not None:
             # Skip nur wenn bereits ein spezifisches User-Label (≠ Sonstiges, ≠ ai/*) existiert
-            existing_user_labels = [id_to_name.get(lid, "") for lid in label_ids]
+            existing_user_labels = [id_to_name.get(lid, "") for lid in meta.label_ids]
             has_specific = any(
                 (lbl in ALL_LABELS) and (lbl != "Sonstiges")
                 for lbl in existing_user_labels
             )
             if has_specific:
-                logger.info("Skip (bereits spezifisch gelabelt): %s | %s | vorhanden=%s", mid, subject[:80], ", ".join(existing_user_labels))
+                logger.info("Skip (bereits spezifisch gelabelt): %s | %s | vorhanden=%s", mid, meta.subject[:80], ", ".join(existing_user_labels))
                 continue
-            # Payload begrenzen
-            safe_body = body[:1000]
-            labels: Set[str] = set(classifier.classify(sender, subject, safe_body))
-            logger.info("Klassifiziert: %s | %s -> %s", mid, subject[:80], ", ".join(sorted(labels)))
+        to_classify.append(mid)
+    # Thread-Modus: pro Konversation nur die neueste Nachricht klassifizieren
+    groups = _group_by_thread(to_classify, dict(zip(message_ids, metas)), cfg.thread_mode)
+    if len(groups) < len(message_ids):
+        logger.info("Body wird nur für %d von %d Nachrichten geladen", len(groups), len(message_ids))
+
+    # Tier 2: volle Nachricht nur für Mails, die wirklich klassifiziert werden
+    cores = gmail.fetch_messages_core(list(groups))
+    results = _classify_cores(classify_many, list(groups), cores)
+    for mid, core in zip(groups, cores):
+        try:
+            if core is None:
+                raise RuntimeError(f"Nachricht {mid} konnte nicht geladen werden")
+            subject, sender, body, label_ids, internal_ts = core
+            result = results[mid]
+            if isinstance(result, BaseException):
+                raise result
+            labels: Set[str] = set(result)
+            logger.info(
+                "Klassifiziert: %s | %s -> %s%s",
+                mid, subject[:80], ", ".join(sorted(labels)), _thread_suffix(groups[mid]),
+            )
+            remove: Set[str] = set()
             # Wenn wir spezifische Labels haben, und 'Sonstiges' dabei ist, entferne Sonstiges
             if len(labels) > 1 and "Sonstiges" in labels:
                 labels.discard("Sonstiges")
-                remove_sonstiges.append(mid)
+                remove.add("Sonstiges")
         except Exception as exc:
             logger.exception("Fehler bei Klassifikation, markiere als Warnung: %s", exc)
-            labels = {"Warnung"}
+            labels, remove = {"Warnung"}, set()
+        # Gleiches Ergebnis für alle Nachrichten des Threads -> ein gemeinsamer batchModify
+        for member in groups[mid]:
+            desired[member] = (labels, remove)
 
-        for label_name in labels:
-            plan.setdefault(label_name, []).append(mid)
+    return _apply_plan(gmail, registry, desired, current, cfg.dry_run)
 
-    if cfg.dry_run:
-        for name, mids in plan.items():
-            logger.info("[DRY-RUN] Würde Label '%s' zu %d Nachrichten hinzufügen", name, len(mids))
-    else:
-        # Sicherstellen, dass alle im Plan vorkommenden Labels existieren
-        needed = set(plan.keys()) - set(name_to_id.keys())
-        if needed:
-            logger.info("Fehlende Labels werden angelegt: %s", ", ".join(sorted(needed)))
-            extra_map = gmail.ensure_labels(list(needed), colors=None)
-            name_to_id.update(extra_map)
-        for name, mids in plan.items():
-            if name not in name_to_id:
-                logger.warning("Überspringe unbekanntes Label '%s' (keine ID)", name)
-                continue
-            gmail.batch_add_labels(mids, [name_to_id[name]])
-        if remove_sonstiges:
-            gmail.batch_modify(remove_sonstiges, remove_label_ids=[name_to_id.get("Sonstiges", "")])
-        logger.info("Batch-Labeling abgeschlossen.")
 
-    # PASS 2: Re-Label für bestehende 'Sonstiges' innerhalb 7 Tage
-    q_relabel = "in:inbox label:Sonstiges newer_than:7d"
-    message_ids2 = gmail.list_new_message_ids(q_relabel, effective_max)
-    logger.info("Gefundene 'Sonstiges' zur Neuprüfung: %d (q=%.120s)", len(message_ids2), q_relabel)
+def _classify_cores(
+    classify_many: ClassifyMany,
+    message_ids: List[str],
+    cores: List[Optional[MessageCore]],
+) -> Dict[str, ClassifyResult]:
+    """Klassifiziert alle geladenen Nachrichten gesammelt (Body auf 1000 Zeichen begrenzt)."""
+    loaded = [(mid, core) for mid, core in zip(message_ids, cores) if core is not None]
+    items = [(core[1], core[0], core[2][:1000]) for _, core in loaded]
+    return {mid: result for (mid, _), result in zip(loaded, classify_many(items))}
+
+
+def _group_by_thread(
+    message_ids: List[str],
+    metas: Dict[str, Optional[MessageMeta]],
+    enabled: bool,
+) -> Dict[str, List[str]]:
+    """Repräsentant -> alle Nachrichten-IDs, die sein Klassifikationsergebnis übernehmen.
+
+    Im Thread-Modus ist der Repräsentant die neueste Nachricht (internalDate) je
+    threadId; sonst (oder ohne Metadaten) steht jede Nachricht für sich.
+    """
+    if not enabled:
+        return {mid: [mid] for mid in message_ids}
+    threads: Dict[str, List[str]] = {}
+    for mid in message_ids:
+        meta = metas.get(mid)
+        threads.setdefault(meta.thread_id if meta is not None and meta.thread_id else mid, []).append(mid)
+    groups: Dict[str, List[str]] = {}
+    for members in threads.values():
+        rep = max(members, key=lambda m: metas[m].internal_ts if metas.get(m) is not None else 0)
+        groups[rep] = members
+    return groups
+
 
-    plan2: Dict[str, List[str]] = {}
-    remove_sonstiges2: List[str] = []
-    for mid in message_ids2:
+def _thread_suffix(members: List[str]) -> str:
+    return f" (+{len(members) - 1} im Thread)" if len(members) > 1 else ""
+
+
+def _apply_plan(
+    gmail: GmailClient,
+    registry: LabelRegistry,
+    desired: Dict[str, Tuple[Set[str], Set[str]]],
+    current: Dict[str, Optional[List[str]]],
+    dry_run: bool,
+    context: str = "Labeling",
+) -> int:
+    """Schreibt den gewünschten Label-Endzustand mit möglichst wenigen batchModify-Aufrufen.
+
+    Bei unbekannter Label-ID wird einmal mit frischem Label-Katalog wiederholt.
+    Liefert die Anzahl geänderter Nachrichten.
+    """
+    names = sorted({n for add, remove in desired.values() for n in add | remove})
+    for attempt in range(2):
+        # Sicherstellen, dass alle im Plan vorkommenden Labels existieren
+        name_to_id = registry.ensure(names)
+        unknown = [n for n in names if n not in name_to_id]
+        if unknown:
+            logger.warning("Überspringe unbekannte Labels (keine ID): %s", ", ".join(unknown))
+        desired_ids = {
+            mid: (
+                {name_to_id[n] for n in add if n in name_to_id},
+                {name_to_id[n] for n in remove if n in name_to_id},
+            )
+            for mid, (add, remove) in desired.items()
+        }
+        changes = plan_label_changes(desired_ids, current)
+        id_to_name = {v: k for k, v in name_to_id.items()}
+        unchanged = len(desired) - sum(len(c.ids) for c in changes)
+        for change in changes:
+            logger.info(
+                "%s%s: +[%s] -[%s] für %d Nachrichten",
+                "[DRY-RUN] " if dry_run else "", context,
+                ", ".join(id_to_name.get(l, l) for l in change.add),
+                ", ".join(id_to_name.get(l, l) for l in change.remove),
+                len(change.ids),
+            )
+        if unchanged:
+            logger.info("%s: %d Nachrichten bereits korrekt gelabelt, keine Änderung", context, unchanged)
+        written = len(desired) - unchanged
+        if dry_run or not changes:
+            return written
         try:
-            subject, sender, body, label_ids, internal_ts = gmail.fetch_message_core(mid)
-            safe_body = body[:1000]
-            labels2: Set[str] = set(classifier.classify(sender, subject, safe_body))
-            # Wenn spezifische Labels gefunden wurden, Sonstiges entfernen
-            if any(l for l in labels2 if l != "Sonstiges"):
-                remove_sonstiges2.append(mid)
-            if "Sonstiges" in labels2 and len(labels2) > 1:
-                labels2.discard("Sonstiges")
-            for name in labels2:
-                plan2.setdefault(name, []).append(mid)
-            logger.info("Re-Label: %s | %s -> %s", mid, subject[:80], ", ".join(sorted(labels2)))
+            gmail.apply_label_changes(changes)
+            return written
         except Exception as exc:
-            logger.exception("Fehler bei Re-Labeling: %s", exc)
-            plan2.setdefault("Warnung", []).append(mid)
-
-    if cfg.dry_run:
-        for name, mids in plan2.items():
-            logger.info("[DRY-RUN] (Re-Label) Würde Label '%s' zu %d Nachrichten hinzufügen", name, len(mids))
-    else:
-        # Sicherstellen, dass auch hier alle Labels existieren
-        needed2 = set(plan2.keys()) - set(name_to_id.keys()) - {"Sonstiges"}
-        if needed2:
-            logger.info("Fehlende Labels (Re-Label) werden angelegt: %s", ", ".join(sorted(needed2)))
-            extra_map2 = gmail.ensure_labels(list(needed2), colors=None)
-            name_to_id.update(extra_map2)
-        for name, mids in plan2.items():
-            if name == "Sonstiges":
-                continue
-            if name not in name_to_id:
-                logger.warning("Überspringe unbekanntes Label '%s' (keine ID) im Re-Label", name)
-                continue
-            gmail.batch_add_labels(mids, [name_to_id[name]])
-        if remove_sonstiges2:
-            gmail.batch_modify(remove_sonstiges2, remove_label_ids=[name_to_id.get("Sonstiges", "")])
-        logger.info("Re-Labeling abgeschlossen.")
+            if attempt or not is_unknown_label_error(exc):
+                raise
+            logger.info("Label-ID unbekannt (%s), lade Label-Katalog neu", exc)
+            registry.invalidate()
 
 
 def main() -> None:
@@ -182,20 +507,59 @@ def main() -> None:
     ap.add_argument("--max-results", type=int, default=None, help="Max Anzahl Nachrichten")
     ap.add_argument("--loop", action="store_true", help="Im Intervall wiederholt ausführen (alle 30s)")
     ap.add_argument("--interval", type=int, default=30, help="Intervall in Sekunden für Loop-Modus")
+    ap.add_argument(
+        "--sync",
+        choices=["query", "history"],
+        default=None,
+        help="Sync-Modus: 'query' (GMAIL_Q jede Iteration) oder 'history' (inkrementell per History API)",
+    )
+    ap.add_argument(
+        "--threads",
+        action="store_true",
+        help="Thread-Modus: pro Konversation nur die neueste Nachricht klassifizieren und das Ergebnis auf alle übertragen",
+    )
+    ap.add_argument(
+        "--push",
+        action="store_true",
+        help="Event-getrieben: auf Gmail-Push-Benachrichtigungen warten statt im Intervall zu pollen",
+    )
     args = ap.parse_args()
+    run_args = dict(
+        dry_run_cli=args.dry_run,
+        q_cli=args.q,
+        max_results_cli=args.max_results,
+        sync_cli=args.sync,
+        threads_cli=args.threads,
+    )
 
-    if args.loop:
-        while True:
-            start_ts = time.time()
-            try:
-                run(dry_run_cli=args.dry_run, q_cli=args.q, max_results_cli=args.max_results)
-            except Exception as exc:
-                logger.exception("Unbehandelter Fehler in Loop-Iteration: %s", exc)
-            duration = time.time() - start_ts
-            logger.info("Iteration beendet (%.1fs). Warte %ds bis zum nächsten Lauf ...", duration, max(5, args.interval))
-            time.sleep(max(5, args.interval))
+    if args.push or args.loop:
+        # Langlebige Laufzeit: Clients/Classifier einmal bauen (Import hier, da runtime auf main aufbaut)
+        from .runtime import Runtime
+
+        if args.push:
+            # Push liefert nur "es hat sich etwas geändert" – verarbeitet wird immer inkrementell
+            run_args["sync_cli"] = "history"
+        runtime = Runtime(run_args)
+        runtime.install_signal_handlers()
+        try:
+            if args.push:
+                cfg = runtime.cfg
+                runtime.trigger = push.PushTrigger()
+                push.serve(
+                    runtime.run_once,
+                    host=cfg.push_host,
+                    port=cfg.push_port,
+                    token=cfg.push_token or None,
+                    fallback_interval=cfg.push_fallback_interval,
+                    renew_watch=runtime.renew_watch if cfg.pubsub_topic and not cfg.dry_run else None,
+                    trigger=runtime.trigger,
+                )
+            else:
+                runtime.loop(max(5, args.interval))
+        finally:
+            runtime.close()
     else:
-        run(dry_run_cli=args.dry_run, q_cli=args.q, max_results_cli=args.max_results)
+        run(**run_args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from .gmail_client import MessageCore, MessageMeta
+
+
+logger = logging.getLogger(__name__)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id          TEXT PRIMARY KEY,
+    thread_id   TEXT NOT NULL DEFAULT '',
+    subject     TEXT NOT NULL DEFAULT '',
+    sender      TEXT NOT NULL DEFAULT '',
+    body        TEXT,
+    label_ids   TEXT NOT NULL DEFAULT '[]',
+    internal_ts INTEGER NOT NULL DEFAULT 0,
+    history_id  TEXT NOT NULL DEFAULT '',
+    headers     TEXT NOT NULL DEFAULT '{}',
+    labels_at   REAL NOT NULL DEFAULT 0,
+    accessed_at REAL NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_messages_accessed ON messages(accessed_at);
+"""
+
+
+class MessageStore:
+    """Lokaler SQLite-Cache für geparste Gmail-Nachrichten.
+
+    Betreff, Absender und Body sind in Gmail unveränderlich und werden daher
+    dauerhaft gehalten (bis zur LRU-Verdrängung ab `max_entries`). Die labelIds
+    gelten nur `label_ttl` Sekunden (Standard 120) als aktuell; ein historyId-
+    Vergleich findet nicht statt. Früher verworfen werden sie nur über
+    `invalidate` (Label-Änderungen aus dem History-Delta, SYNC_MODE=history);
+    eigene Label-Änderungen werden direkt nachgezogen.
+    """
+
+    def __init__(self, path: str = ".gmail_messages.sqlite3", max_entries: int = 5000, label_ttl: int = 120) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.label_ttl = label_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _select(self, ids: List[str], where: str, args: tuple = ()) -> List[sqlite3.Row]:
+        if not ids:
+            return []
+        rows: List[sqlite3.Row] = []
+        now = time.time()
+        with self._lock:
+            # SQLite begrenzt die Anzahl Parameter; in Häppchen abfragen
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows.extend(self._conn.execute(
+                    f"SELECT * FROM messages WHERE id IN ({marks}) AND {where}", (*chunk, *args)
+                ).fetchall())
+            self._conn.executemany(
+                "UPDATE messages SET accessed_at = ? WHERE id = ?", [(now, r["id"]) for r in rows]
+            )
+            self._conn.commit()
+        return rows
+
+    def get_cores(self, ids: List[str]) -> Dict[str, MessageCore]:
+        """Bereits gespeicherte Nachrichten mit Body (labelIds ggf. veraltet)."""
+        return {
+            r["id"]: (r["subject"], r["sender"], r["body"], json.loads(r["label_ids"]), r["internal_ts"])
+            for r in self._select(ids, "body IS NOT NULL")
+        }
+
+    def get_metas(self, ids: List[str]) -> Dict[str, MessageMeta]:
+        """Gespeicherte Metadaten, deren labelIds noch als aktuell gelten."""
+        fresh_since = time.time() - self.label_ttl
+        return {
+            r["id"]: MessageMeta(
+                id=r["id"],
+                thread_id=r["thread_id"],
+                subject=r["subject"],
+                sender=r["sender"],
+                label_ids=json.loads(r["label_ids"]),
+                internal_ts=r["internal_ts"],
+                history_id=r["history_id"],
+                headers=json.loads(r["headers"]),
+            )
+            for r in self._select(ids, "labels_at >= ?", (fresh_since,))
+        }
+
+    def put_metas(self, metas: Iterable[MessageMeta]) -> None:
+        now = time.time()
+        rows = [
+            (m.id, m.thread_id, m.subject, m.sender, json.dumps(m.label_ids), m.internal_ts,
+             m.history_id, json.dumps(m.headers), now, now)
+            for m in metas
+        ]
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO messages (id, thread_id, subject, sender, label_ids, internal_ts,
+                                      history_id, headers, labels_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    thread_id = excluded.thread_id,
+                    subject = excluded.subject,
+                    sender = excluded.sender,
+                    label_ids = excluded.label_ids,
+                    internal_ts = excluded.internal_ts,
+                    history_id = excluded.history_id,
+                    headers = excluded.headers,
+                    labels_at = excluded.labels_at,
+                    accessed_at = excluded.accessed_at
+                """,
+                rows,
+            )
+            self._conn.commit()
+        self._evict()
+
+    def put_cores(self, cores: Dict[str, MessageCore]) -> None:
+        """Speichert Bodies; Metadaten (Thread, Header) gelten erst nach `put_metas` als aktuell."""
+        now = time.time()
+        rows = [
+            (mid, subject, sender, body, json.dumps(label_ids), internal_ts, now)
+            for mid, (subject, sender, body, label_ids, internal_ts) in cores.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO messages (id, subject, sender, body, label_ids, internal_ts, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    body = excluded.body,
+                    accessed_at = excluded.accessed_at
+                """,
+                rows,
+            )
+            self._conn.commit()
+        self._evict()
+
+    def invalidate(self, ids: Iterable[str]) -> None:
+        """Markiert die labelIds der Nachrichten als veraltet (Body bleibt erhalten)."""
+        with self._lock:
+            self._conn.executemany("UPDATE messages SET labels_at = 0 WHERE id = ?", [(i,) for i in ids])
+            self._conn.commit()
+
+    def apply_label_change(
+        self, ids: Iterable[str], add: Optional[List[str]] = None, remove: Optional[List[str]] = None
+    ) -> None:
+        """Zieht eine eigene, erfolgreiche Label-Änderung lokal nach."""
+        add_set, remove_set = set(add or []), set(remove or [])
+        with self._lock:
+            for mid in ids:
+                row = self._conn.execute("SELECT label_ids FROM messages WHERE id = ?", (mid,)).fetchone()
+                if row is None:
+                    continue
+                current = [l for l in json.loads(row[0]) if l not in remove_set]
+                current += [l for l in add_set if l not in current]
+                self._conn.execute("UPDATE messages SET label_ids = ? WHERE id = ?", (json.dumps(current), mid))
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+            excess = count - self.max_entries
+            if excess <= 0:
+                return
+            self._conn.execute(
+                "DELETE FROM messages WHERE id IN (SELECT id FROM messages ORDER BY accessed_at LIMIT ?)",
+                (excess,),
+            )
+            self._conn.commit()
+        logger.debug("MessageStore: %d Einträge verdrängt", excess)
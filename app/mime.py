@@ -0,0 +1,187 @@
+"""Text-Extraktion aus Gmail-MIME-Payloads mit Zeichen-Budget.
+
+Bevorzugt text/plain vor text/html, dekodiert Base64 stückweise und bricht ab,
+sobald das Budget erreicht ist – ein Newsletter mit mehreren MB HTML kostet so
+nur die ersten paar Kilobyte.
+"""
+from __future__ import annotations
+
+import base64
+import codecs
+import html
+import re
+from typing import Dict, Iterator, List
+
+
+# Standard-Budget für den extrahierten Body (Zeichen nach Whitespace-Normalisierung)
+BODY_BUDGET = 4000
+
+# Base64-Zeichen pro Dekodier-Schritt (Vielfaches von 4)
+_B64_CHUNK = 16384
+
+_WS = re.compile(r"\s+")
+# Ein Durchlauf über das HTML: Tags, Kommentare und Entities
+_HTML_TOKEN = re.compile(r"<!--.*?-->|<(/?)([a-zA-Z][\w:-]*)[^>]*>|<![^>]*>|&(#?\w{1,10});", re.S)
+_SKIP_TAGS = frozenset({"script", "style", "head", "title"})
+
+
+class _TextBudget:
+    """Sammelt whitespace-normalisierten Text bis zum Budget."""
+
+    def __init__(self, budget: int) -> None:
+        self.budget = budget
+        self.parts: List[str] = []
+        self.length = 0
+        self._last_space = True
+
+    @property
+    def full(self) -> bool:
+        return self.length >= self.budget
+
+    def add(self, text: str) -> None:
+        if not text or self.full:
+            return
+        text = _WS.sub(" ", text)
+        if self._last_space:
+            text = text.lstrip(" ")
+        if not text:
+            return
+        text = text[: self.budget - self.length]
+        self.parts.append(text)
+        self.length += len(text)
+        self._last_space = text.endswith(" ")
+
+    def space(self) -> None:
+        if not self._last_space and not self.full:
+            self.parts.append(" ")
+            self.length += 1
+            self._last_space = True
+
+    def text(self) -> str:
+        return "".join(self.parts).strip()
+
+
+class _HtmlToText:
+    """Inkrementeller HTML->Text-Konverter (ein Regex-Durchlauf pro Stück)."""
+
+    def __init__(self, out: _TextBudget) -> None:
+        self.out = out
+        self._pending = ""
+        self._skip_until: str | None = None
+
+    def feed(self, chunk: str) -> None:
+        buf = self._pending + chunk
+        self._pending = ""
+        pos = 0
+        while pos < len(buf) and not self.out.full:
+            if self._skip_until:
+                # Inhalt von <script>/<style> überspringen, ohne ihn zu tokenisieren
+                end = buf.lower().find(self._skip_until, pos)
+                if end == -1:
+                    self._pending = buf[-len(self._skip_until):]
+                    return
+                close = buf.find(">", end)
+                if close == -1:
+                    self._pending = buf[end:]
+                    return
+                pos = close + 1
+                self._skip_until = None
+                self.out.space()
+                continue
+            m = _HTML_TOKEN.search(buf, pos)
+            if m is None:
+                break
+            self.out.add(buf[pos:m.start()])
+            pos = m.end()
+            if m.group(3) is not None:
+                self.out.add(html.unescape(m.group(0)))
+                continue
+            tag = (m.group(2) or "").lower()
+            if tag in _SKIP_TAGS and not m.group(1) and not m.group(0).endswith("/>"):
+                self._skip_until = f"</{tag}"
+            self.out.space()
+        if self.out.full or pos >= len(buf):
+            return
+        rest = buf[pos:]
+        # Unvollständigen Tag bzw. Entity am Ende für das nächste Stück aufheben
+        cut = len(rest)
+        lt = rest.rfind("<")
+        if lt != -1 and ">" not in rest[lt:]:
+            cut = lt
+        amp = rest.rfind("&", max(0, len(rest) - 12))
+        if amp != -1 and ";" not in rest[amp:]:
+            cut = min(cut, amp)
+        self.out.add(rest[:cut])
+        self._pending = rest[cut:]
+        if len(self._pending) > 65536:
+            # Kaputtes HTML ohne schließendes '>' – als Text behandeln
+            self.out.add(self._pending)
+            self._pending = ""
+
+    def close(self) -> None:
+        if self._pending and not self._skip_until:
+            self.out.add(self._pending)
+        self._pending = ""
+
+
+def _decoded_chunks(data: str) -> Iterator[str]:
+    """Dekodiert Base64url-Daten stückweise zu Text (UTF-8, Fehler ignoriert)."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+    for start in range(0, len(data), _B64_CHUNK):
+        chunk = data[start:start + _B64_CHUNK]
+        chunk += "=" * (-len(chunk) % 4)
+        try:
+            raw = base64.urlsafe_b64decode(chunk)
+        except Exception:
+            return
+        yield decoder.decode(raw)
+    yield decoder.decode(b"", final=True)
+
+
+def _text_parts(payload: Dict) -> Dict[str, List[str]]:
+    """Sammelt Base64-Daten aller text/plain- und text/html-Teile (Tiefensuche, Dokumentreihenfolge)."""
+    found: Dict[str, List[str]] = {"text/plain": [], "text/html": []}
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        if not part:
+            continue
+        subparts = part.get("parts")
+        if subparts:
+            stack.extend(reversed(subparts))
+        mime = part.get("mimeType", "")
+        data = part.get("body", {}).get("data")
+        if not data:
+            continue
+        if mime.startswith("text/plain"):
+            found["text/plain"].append(data)
+        elif mime.startswith("text/html"):
+            found["text/html"].append(data)
+    return found
+
+
+def extract_body(payload: Dict, budget: int = BODY_BUDGET) -> str:
+    """Extrahiert bis zu `budget` Zeichen normalisierten Text aus einem Gmail-Payload.
+
+    text/plain-Teile haben Vorrang; HTML wird nur verwendet, wenn kein
+    Plaintext vorhanden ist (typisch für reine HTML-Newsletter).
+    """
+    parts = _text_parts(payload)
+    out = _TextBudget(budget)
+    for data in parts["text/plain"]:
+        for text in _decoded_chunks(data):
+            out.add(text)
+            if out.full:
+                return out.text()
+        out.space()
+    if out.length:
+        return out.text()
+    for data in parts["text/html"]:
+        converter = _HtmlToText(out)
+        for text in _decoded_chunks(data):
+            converter.feed(text)
+            if out.full:
+                return out.text()
+        converter.close()
+        out.space()
+    return out.text()
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import logging
+import math
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, TypeVar
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Unterhalb dieser Menge lohnt sich der IPC-Aufwand nicht – dann wird inline geparst
+PARSE_POOL_MIN_ITEMS = 32
+
+
+def _safe_call(fn: Callable[[Dict], T], item: Dict) -> Optional[T]:
+    try:
+        return fn(item)
+    except Exception:
+        return None
+
+
+class _Call:
+    """Picklebarer Wrapper: `fn(item)` mit Fehler -> `None` (läuft im Worker-Prozess)."""
+
+    __slots__ = ("fn",)
+
+    def __init__(self, fn: Callable[[Dict], T]) -> None:
+        self.fn = fn
+
+    def __call__(self, item: Dict) -> Optional[T]:
+        return _safe_call(self.fn, item)
+
+
+class ParsePool:
+    """Parst rohe Gmail-Payloads in Worker-Prozessen statt im Haupt-Thread.
+
+    HTML->Text ist reine Python-Arbeit und skaliert in Threads nicht (GIL). Bei
+    `workers > 0` und ausreichend vielen Nachrichten werden die Payloads in
+    Blöcken (`chunksize`) an einen `ProcessPoolExecutor` gegeben; zurück kommen
+    nur die kleinen, normalisierten Ergebnisse. `workers = 0` parst inline.
+    `fn` muss eine Funktion auf Modulebene sein (picklebar).
+    """
+
+    def __init__(self, workers: int = 0, min_items: int = PARSE_POOL_MIN_ITEMS) -> None:
+        self.workers = max(0, workers)
+        self.min_items = min_items
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def map(self, fn: Callable[[Dict], T], items: List[Dict]) -> List[Optional[T]]:
+        """Wendet `fn` auf alle `items` an (Reihenfolge bleibt, Fehler -> `None`)."""
+        if not self.workers or len(items) < self.min_items:
+            return [_safe_call(fn, item) for item in items]
+        # Wenige große Blöcke pro Worker amortisieren das Pickling/IPC
+        chunksize = max(1, math.ceil(len(items) / (self.workers * 4)))
+        try:
+            return list(self._get_executor().map(_Call(fn), items, chunksize=chunksize))
+        except Exception as exc:
+            logger.warning("Parse-Pool fehlgeschlagen (%s), parse %d Nachrichten inline", exc, len(items))
+            self.close()
+            return [_safe_call(fn, item) for item in items]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
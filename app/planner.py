@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Set, Tuple
+
+
+# Gmail users.messages.batchModify akzeptiert maximal 1000 IDs pro Aufruf
+MODIFY_MAX_IDS = 1000
+
+
+@dataclass(slots=True)
+class LabelChange:
+    """Ein batchModify-Aufruf: identische Add/Remove-Label-IDs für alle `ids`."""
+
+    add: Tuple[str, ...]
+    remove: Tuple[str, ...]
+    ids: List[str]
+
+
+def plan_label_changes(
+    desired: Dict[str, Tuple[Set[str], Set[str]]],
+    current: Dict[str, Optional[List[str]]],
+    max_ids: int = MODIFY_MAX_IDS,
+) -> List[LabelChange]:
+    """Berechnet die minimale Menge an batchModify-Aufrufen.
+
+    desired: Nachrichten-ID -> (Label-IDs, die vorhanden sein sollen; Label-IDs, die fehlen sollen)
+    current: Nachrichten-ID -> aktuelle labelIds (`None` = unbekannt, dann wird alles geschrieben)
+
+    Nachrichten, die bereits korrekt gelabelt sind, erzeugen keinen Schreibzugriff.
+    Nachrichten mit identischem (add, remove)-Diff werden zusammengefasst und
+    bei `max_ids` aufgeteilt.
+    """
+    groups: Dict[Tuple[Tuple[str, ...], Tuple[str, ...]], List[str]] = {}
+    for mid, (add, remove) in desired.items():
+        add = set(add)
+        remove = set(remove) - add
+        have = current.get(mid)
+        if have is not None:
+            have_set = set(have)
+            add -= have_set
+            remove &= have_set
+        if not add and not remove:
+            continue
+        groups.setdefault((tuple(sorted(add)), tuple(sorted(remove))), []).append(mid)
+
+    changes: List[LabelChange] = []
+    for (add, remove), ids in groups.items():
+        for start in range(0, len(ids), max_ids):
+            changes.append(LabelChange(add=add, remove=remove, ids=ids[start:start + max_ids]))
+    return changes
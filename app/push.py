@@ -0,0 +1,200 @@
+"""Push-Modus: lokaler Webhook für Gmail-Watch/Pub/Sub-Benachrichtigungen.
+
+Statt im festen Intervall zu pollen, wartet der Prozess auf Push-Nachrichten
+(Pub/Sub Push-Subscription auf `PUSH_HOST:PUSH_PORT/gmail/push`) und startet dann
+sofort einen inkrementellen Lauf. Benachrichtigungen, die während eines Laufs
+eintreffen, werden zu genau einem Folgelauf zusammengefasst.
+
+Lokal testen ohne Google Cloud:
+    python -m app.push notify --url http://127.0.0.1:8080/gmail/push
+"""
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+
+logger = logging.getLogger(__name__)
+
+PUSH_PATH = "/gmail/push"
+# Gmail-Watches laufen nach 7 Tagen ab; täglich erneuern
+WATCH_RENEW_SECONDS = 24 * 3600
+
+
+def parse_push_notification(raw: bytes) -> Optional[Dict[str, str]]:
+    """Dekodiert eine Pub/Sub-Push-Nachricht zu {"emailAddress", "historyId"}.
+
+    Akzeptiert das Pub/Sub-Format (`message.data` base64-kodiert) sowie das
+    unverpackte Gmail-Format, wie es der lokale Stand-in sendet.
+    """
+    try:
+        envelope = json.loads(raw.decode("utf-8") or "{}")
+    except Exception:
+        return None
+    if not isinstance(envelope, dict):
+        return None
+    message = envelope.get("message")
+    if isinstance(message, dict) and message.get("data"):
+        try:
+            data = json.loads(base64.b64decode(message["data"]).decode("utf-8"))
+        except Exception:
+            return None
+    else:
+        data = envelope
+    if not isinstance(data, dict) or "historyId" not in data:
+        return None
+    return {"emailAddress": str(data.get("emailAddress", "")), "historyId": str(data["historyId"])}
+
+
+class PushTrigger:
+    """Fasst beliebig viele Benachrichtigungen zu höchstens einem ausstehenden Lauf zusammen."""
+
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._pending = False
+        self._stopped = False
+        self.received = 0
+
+    def notify(self) -> None:
+        with self._cond:
+            self.received += 1
+            self._pending = True
+            self._cond.notify_all()
+
+    def stop(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Blockiert bis eine Benachrichtigung vorliegt (True) oder `timeout` abläuft (False)."""
+        with self._cond:
+            if not self._pending and not self._stopped:
+                self._cond.wait(timeout)
+            fired = self._pending
+            self._pending = False
+            return fired
+
+
+def _make_handler(trigger: PushTrigger, token: str | None):
+    class _PushHandler(BaseHTTPRequestHandler):
+        def do_POST(self) -> None:  # noqa: N802 - http.server API
+            url = urlparse(self.path)
+            if url.path != PUSH_PATH:
+                self.send_response(404)
+                self.end_headers()
+                return
+            if token and parse_qs(url.query).get("token", [""])[0] != token:
+                self.send_response(403)
+                self.end_headers()
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            note = parse_push_notification(self.rfile.read(length))
+            if note is None:
+                # Trotzdem bestätigen: auf Nicht-2xx stellt Pub/Sub dieselbe Nachricht endlos erneut zu
+                logger.warning("Push-Nachricht nicht lesbar, verworfen")
+            else:
+                logger.debug("Push empfangen: %s historyId=%s", note["emailAddress"], note["historyId"])
+                trigger.notify()
+            # 2xx bestätigt die Nachricht gegenüber Pub/Sub
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, fmt: str, *args) -> None:
+            logger.debug("push-http: " + fmt, *args)
+
+    return _PushHandler
+
+
+def start_push_server(trigger: PushTrigger, host: str, port: int, token: str | None = None) -> ThreadingHTTPServer:
+    """Startet den Webhook-Empfänger in einem Hintergrund-Thread."""
+    server = ThreadingHTTPServer((host, port), _make_handler(trigger, token))
+    threading.Thread(target=server.serve_forever, name="push-http", daemon=True).start()
+    logger.info("Push-Empfänger lauscht auf http://%s:%d%s", host, server.server_address[1], PUSH_PATH)
+    return server
+
+
+def serve(
+    run_once: Callable[[], None],
+    host: str,
+    port: int,
+    token: str | None = None,
+    fallback_interval: int = 900,
+    renew_watch: Callable[[], None] | None = None,
+    trigger: PushTrigger | None = None,
+) -> None:
+    """Event-getriebene Hauptschleife.
+
+    Führt sofort einen Lauf aus und danach jeweils einen pro (zusammengefasster)
+    Benachrichtigung. `fallback_interval` sorgt für einen gelegentlichen Lauf,
+    falls Push-Nachrichten verloren gehen (0 = deaktiviert). Über einen
+    übergebenen `trigger` lässt sich die Schleife von außen beenden (`stop()`).
+    """
+    trigger = trigger or PushTrigger()
+    server = start_push_server(trigger, host, port, token)
+    next_renew = 0.0
+    try:
+        fired = True
+        while not trigger.stopped:
+            if renew_watch and time.time() >= next_renew:
+                try:
+                    renew_watch()
+                    next_renew = time.time() + WATCH_RENEW_SECONDS
+                except Exception as exc:
+                    logger.warning("Gmail-Watch konnte nicht erneuert werden: %s", exc)
+                    next_renew = time.time() + 300
+            start_ts = time.time()
+            try:
+                run_once()
+            except Exception as exc:
+                logger.exception("Unbehandelter Fehler in Push-Lauf: %s", exc)
+            logger.info(
+                "Lauf beendet (%.1fs, Anlass: %s). Warte auf Push-Benachrichtigung ...",
+                time.time() - start_ts, "push" if fired else "fallback",
+            )
+            fired = trigger.wait(fallback_interval or None)
+    finally:
+        server.shutdown()
+
+
+def send_fake_notification(url: str, email: str = "me@example.com", history_id: str = "1") -> int:
+    """Lokaler Stand-in für Pub/Sub: sendet eine Push-Nachricht im Pub/Sub-Format."""
+    data = base64.b64encode(json.dumps({"emailAddress": email, "historyId": history_id}).encode()).decode()
+    envelope = {
+        "message": {"data": data, "messageId": str(int(time.time() * 1000))},
+        "subscription": "projects/local/subscriptions/gmail-helper",
+    }
+    r = httpx.post(url, json=envelope, timeout=10)
+    return r.status_code
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Hilfswerkzeuge für den Push-Modus")
+    sub = ap.add_subparsers(dest="command", required=True)
+    notify = sub.add_parser("notify", help="Fake-Benachrichtigung an den lokalen Empfänger senden")
+    notify.add_argument("--url", default=f"http://127.0.0.1:8080{PUSH_PATH}")
+    notify.add_argument("--email", default="me@example.com")
+    notify.add_argument("--history-id", default="1")
+    notify.add_argument("--count", type=int, default=1, help="Anzahl Benachrichtigungen (testet Zusammenfassung)")
+    args = ap.parse_args()
+
+    for _ in range(max(1, args.count)):
+        status = send_fake_notification(args.url, args.email, args.history_id)
+        print(f"{args.url} -> HTTP {status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import json
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, TypeVar
+
+from googleapiclient.errors import HttpError
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Quota-Einheiten je Gmail-API-Methode (siehe Gmail API "Usage limits")
+QUOTA_UNITS: Dict[str, int] = {
+    "getProfile": 1,
+    "watch": 100,
+    "history.list": 2,
+    "labels.list": 1,
+    "labels.get": 1,
+    "labels.create": 5,
+    "labels.patch": 5,
+    "messages.list": 5,
+    "messages.get": 5,
+    "messages.modify": 5,
+    "messages.batchModify": 50,
+    "threads.get": 10,
+    "threads.modify": 10,
+}
+DEFAULT_UNITS = 5
+
+# Per-User-Limit der Gmail API: 250 Quota-Einheiten pro Sekunde
+PER_USER_UNITS_PER_SECOND = 250
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+_RATE_LIMIT_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+
+
+def _error_reason(exc: HttpError) -> str:
+    content = getattr(exc, "content", b"") or b""
+    try:
+        data = json.loads(content.decode("utf-8") if isinstance(content, bytes) else content)
+        errors = data.get("error", {}).get("errors") or [{}]
+        return str(errors[0].get("reason", ""))
+    except Exception:
+        return ""
+
+
+def is_rate_limited(exc: BaseException) -> bool:
+    """True bei 429 bzw. 403 mit Grund rateLimitExceeded/userRateLimitExceeded."""
+    if not isinstance(exc, HttpError):
+        return False
+    status = getattr(getattr(exc, "resp", None), "status", None)
+    return status == 429 or (status == 403 and _error_reason(exc) in _RATE_LIMIT_REASONS)
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Vorübergehende Fehler: Rate-Limit, 5xx und Verbindungsabbrüche."""
+    if isinstance(exc, HttpError):
+        status = getattr(getattr(exc, "resp", None), "status", None)
+        return status in _RETRY_STATUS or is_rate_limited(exc)
+    return isinstance(exc, (ConnectionError, TimeoutError))
+
+
+class QuotaScheduler:
+    """Zentraler Token-Bucket für alle Gmail-Aufrufe eines Users.
+
+    Jeder Aufruf zieht die Quota-Einheiten seiner Methode ab; ist der Bucket
+    leer, wird gewartet. Vorübergehende Fehler (429/403-Rate-Limit/5xx) werden
+    mit exponentiellem Backoff plus Jitter wiederholt; bei Rate-Limits wird der
+    Bucket zusätzlich geleert, damit parallele Aufrufe ebenfalls bremsen.
+    """
+
+    def __init__(
+        self,
+        units_per_second: float = PER_USER_UNITS_PER_SECOND,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 64.0,
+    ) -> None:
+        self.rate = float(units_per_second)
+        self.capacity = float(units_per_second)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.throttled = 0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, units: float) -> None:
+        """Blockiert, bis `units` Einheiten verfügbar sind (große Batches dürfen den Bucket überziehen)."""
+        need = min(units, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = max(0.0, self._blocked_until - now)
+                if not wait and self._tokens >= need:
+                    self._tokens -= units
+                    return
+                if not wait:
+                    wait = (need - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def note_throttled(self, delay: float | None = None) -> None:
+        """Gmail hat gedrosselt: Bucket leeren und alle Aufrufe kurz pausieren."""
+        with self._lock:
+            self.throttled += 1
+            self._tokens = min(self._tokens, 0.0)
+            pause = delay if delay is not None else self.base_delay
+            self._blocked_until = max(self._blocked_until, time.monotonic() + pause)
+
+    def headroom(self) -> Dict[str, float]:
+        """Aktueller Stand: verfügbare Einheiten, Kapazität und verbleibende Pause."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                "units": round(max(0.0, self._tokens), 1),
+                "capacity": self.capacity,
+                "blocked_for": round(max(0.0, self._blocked_until - now), 2),
+                "throttled": self.throttled,
+            }
+
+    def run(self, fn: Callable[[], T], method: Optional[str] = None, units: Optional[float] = None) -> T:
+        """Führt `fn` quota-gesteuert aus und wiederholt vorübergehende Fehler mit Backoff."""
+        cost = units if units is not None else QUOTA_UNITS.get(method or "", DEFAULT_UNITS)
+        attempt = 0
+        while True:
+            self.acquire(cost)
+            try:
+                return fn()
+            except Exception as exc:
+                if attempt >= self.max_retries or not is_retryable(exc):
+                    raise
+                delay = min(self.max_delay, self.base_delay * (2 ** attempt)) * (0.5 + random.random())
+                if is_rate_limited(exc):
+                    self.note_throttled(delay)
+                logger.warning(
+                    "Gmail %s vorübergehend fehlgeschlagen (%s), Versuch %d/%d in %.1fs",
+                    method or "Batch", exc, attempt + 1, self.max_retries, delay,
+                )
+                time.sleep(delay)
+                attempt += 1
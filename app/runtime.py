@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import functools
+import logging
+import signal
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+from google.auth.transport.requests import Request
+
+from .accounts import ClassificationPool, account_config, account_from_token
+from .config import AppConfig, load_config
+from .gmail_client import GmailClient
+from .main import (
+    ClassifyMany,
+    apply_overrides,
+    build_classifier,
+    build_gmail,
+    log_start,
+    process,
+    run_mailboxes,
+)
+from .push import PushTrigger
+
+
+logger = logging.getLogger(__name__)
+
+# Abstand der Hintergrundprüfung, ob ein Token bald abläuft
+CREDENTIAL_CHECK_SECONDS = 60
+
+
+@dataclass(slots=True)
+class Mailbox:
+    """Ein verbundenes Postfach mit eigener Konfiguration (State-/Cache-Dateien)."""
+
+    name: str
+    cfg: AppConfig
+    gmail: GmailClient
+    classify_many: ClassifyMany
+
+
+class Runtime:
+    """Langlebige Laufzeit für Dauerlauf (--loop) und Push-Modus.
+
+    Konfiguration, Gmail-Clients (Credentials, Service, Verbindungen, Cache) und
+    der Classifier werden einmal aufgebaut und über alle Iterationen
+    wiederverwendet. Ein Hintergrund-Thread erneuert OAuth-Tokens vor Ablauf,
+    SIGHUP lädt `.env` vor dem nächsten Lauf neu, SIGTERM/SIGINT beendet nach
+    dem laufenden Durchgang.
+    """
+
+    def __init__(self, overrides: Optional[Dict] = None) -> None:
+        self.overrides = overrides or {}
+        self.stop_event = threading.Event()
+        self.trigger: Optional[PushTrigger] = None
+        self._reload_requested = False
+        self._lock = threading.Lock()
+        # Schützt nur das Auswechseln/Schließen der Clients, nicht ganze Läufe (Token-Refresh)
+        self._clients_lock = threading.Lock()
+        self.mailboxes: List[Mailbox] = []
+        self._pool: Optional[ClassificationPool] = None
+        self._build()
+        self._refresher = threading.Thread(target=self._refresh_loop, name="token-refresh", daemon=True)
+        self._refresher.start()
+
+    def _load_config(self) -> AppConfig:
+        # override=True: bei SIGHUP geänderte Werte aus .env übernehmen
+        load_dotenv(override=True)
+        return apply_overrides(load_config(), **self.overrides)
+
+    def _build(self) -> None:
+        self.cfg = self._load_config()
+        self.classifier = build_classifier(self.cfg)
+        mailboxes: List[Mailbox] = []
+        if not self.cfg.gmail_accounts:
+            mailboxes.append(
+                Mailbox(
+                    name="token",
+                    cfg=self.cfg,
+                    gmail=build_gmail(self.cfg),
+                    classify_many=self.classifier.classify_many,
+                )
+            )
+        else:
+            self._pool = ClassificationPool(
+                self.classifier.classify_many, workers=self.cfg.ollama_concurrency, batch_size=self.cfg.classify_batch_size
+            )
+            for account in (account_from_token(path) for path in self.cfg.gmail_accounts):
+                acc_cfg = account_config(self.cfg, account)
+                mailboxes.append(
+                    Mailbox(
+                        name=account.name,
+                        cfg=acc_cfg,
+                        gmail=build_gmail(acc_cfg, account.token_path),
+                        classify_many=functools.partial(self._pool.classify_many, account.name),
+                    )
+                )
+        with self._clients_lock:
+            self.mailboxes = mailboxes
+
+    def _teardown(self) -> None:
+        with self._clients_lock:
+            for mailbox in self.mailboxes:
+                mailbox.gmail.close()
+            self.mailboxes = []
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
+        self.classifier.close()
+
+    def request_reload(self, *_args) -> None:
+        """Signal-Handler (SIGHUP): Konfiguration vor dem nächsten Lauf neu laden."""
+        self._reload_requested = True
+        logger.info("SIGHUP: Konfiguration wird vor dem nächsten Lauf neu geladen")
+
+    def request_stop(self, *_args) -> None:
+        """Signal-Handler (SIGTERM/SIGINT): nach dem laufenden Durchgang beenden."""
+        logger.info("Beende nach dem aktuellen Lauf ...")
+        self.stop_event.set()
+        if self.trigger is not None:
+            self.trigger.stop()
+
+    def install_signal_handlers(self) -> None:
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self.request_reload)
+
+    def _refresh_loop(self) -> None:
+        while not self.stop_event.wait(CREDENTIAL_CHECK_SECONDS):
+            # Nicht unter self._lock: die Prüfung soll auch während eines langen Laufs
+            # stattfinden; _clients_lock verhindert nur, dass ein Reload (SIGHUP) die
+            # Clients währenddessen schließt.
+            with self._clients_lock:
+                for mailbox in self.mailboxes:
+                    try:
+                        # Erneuert nur, wenn das Token in weniger als REFRESH_MARGIN_SECONDS abläuft
+                        mailbox.gmail.creds.ensure_fresh(Request())
+                    except Exception as exc:
+                        logger.warning("[%s] Token-Erneuerung fehlgeschlagen: %s", mailbox.name, exc)
+
+    def run_once(self) -> None:
+        """Ein Durchgang über alle Postfächer mit den bestehenden Clients."""
+        with self._lock:
+            if self._reload_requested:
+                self._reload_requested = False
+                self._teardown()
+                self._build()
+                logger.info("Konfiguration neu geladen")
+            log_start(self.cfg)
+            if len(self.mailboxes) == 1:
+                mb = self.mailboxes[0]
+                process(mb.cfg, mb.gmail, mb.gmail.scheduler, mb.classify_many)
+                return
+            run_mailboxes([
+                (mb.name, functools.partial(process, mb.cfg, mb.gmail, mb.gmail.scheduler, mb.classify_many))
+                for mb in self.mailboxes
+            ])
+
+    def renew_watch(self) -> None:
+        """Gmail-Watch aller Postfächer auf das Pub/Sub-Topic erneuern."""
+        for mb in list(self.mailboxes):
+            res = mb.gmail.watch(mb.cfg.pubsub_topic)
+            logger.info("[%s] Gmail-Watch aktiv bis %s (historyId=%s)", mb.name, res.get("expiration"), res.get("historyId"))
+
+    def loop(self, interval: int) -> None:
+        """Dauerlauf: alle `interval` Sekunden ein Durchgang, bis SIGTERM/SIGINT."""
+        while not self.stop_event.is_set():
+            start_ts = time.time()
+            try:
+                self.run_once()
+            except Exception as exc:
+                logger.exception("Unbehandelter Fehler in Loop-Iteration: %s", exc)
+            logger.info("Iteration beendet (%.1fs). Warte %ds bis zum nächsten Lauf ...", time.time() - start_ts, interval)
+            self.stop_event.wait(interval)
+
+    def close(self) -> None:
+        self.stop_event.set()
+        with self._lock:
+            self._teardown()
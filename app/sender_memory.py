@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Sequence, Tuple
+
+from .classification_cache import normalized_sender, sender_key
+
+
+logger = logging.getLogger(__name__)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sender_labels (
+    sender     TEXT NOT NULL,
+    labels     TEXT NOT NULL,
+    count      INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (sender, labels)
+);
+"""
+
+
+# Freemail- und geteilte Domains: Absender dort haben nichts gemeinsam, nur die Adresse zählt
+SHARED_DOMAINS = frozenset({
+    "gmail.com", "googlemail.com", "gmx.de", "gmx.net", "gmx.at", "gmx.ch", "web.de", "t-online.de",
+    "freenet.de", "posteo.de", "mailbox.org", "arcor.de", "online.de", "yahoo.com", "yahoo.de",
+    "outlook.com", "outlook.de", "hotmail.com", "hotmail.de", "live.com", "live.de", "msn.com",
+    "icloud.com", "me.com", "mac.com", "aol.com", "aol.de", "proton.me", "protonmail.com",
+    "gmx.com", "mail.de", "email.de", "yandex.com", "zoho.com",
+})
+
+
+def _keys(sender: str) -> Tuple[str, ...]:
+    """Statistik-Schlüssel: Adresse (genauer) und Domain (Fallback für wechselnde Adressen).
+
+    Für Freemail-Domains (`SHARED_DOMAINS`) gibt es keinen Domain-Schlüssel.
+    """
+    address = normalized_sender(sender)
+    if not address:
+        return ()
+    domain = sender_key(sender)
+    if not domain or domain in SHARED_DOMAINS:
+        return (f"addr:{address}",)
+    return f"addr:{address}", f"domain:{domain}"
+
+
+class SenderMemory:
+    """Label-Statistik pro Absender und Domain (SQLite).
+
+    Jede bestätigte Klassifikation zählt für Adresse und Domain des Absenders
+    (bei Freemail-Anbietern nur für die Adresse).
+    Hat ein Absender mindestens `min_count` Entscheidungen und stimmen davon
+    mindestens `min_agreement` überein, liefert `suggest` dieses Ergebnis
+    direkt. `sample_rate` der bekannten Absender geht trotzdem an das LLM, damit
+    sich ändernde Absender (Drift) auffallen und die Statistik aktuell bleibt.
+    """
+
+    def __init__(
+        self,
+        path: str = ".gmail_senders.sqlite3",
+        min_count: int = 10,
+        min_agreement: float = 0.95,
+        sample_rate: float = 0.05,
+    ) -> None:
+        self.path = path
+        self.min_count = max(1, min_count)
+        self.min_agreement = min_agreement
+        self.sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def suggest(self, sender: str) -> Optional[List[str]]:
+        """Labels für einen Absender mit stabiler Historie, sonst `None`."""
+        with self._lock:
+            for key in _keys(sender):
+                rows = self._conn.execute(
+                    "SELECT labels, count FROM sender_labels WHERE sender = ? ORDER BY count DESC", (key,)
+                ).fetchall()
+                total = sum(count for _, count in rows)
+                if total >= self.min_count and rows[0][1] / total >= self.min_agreement:
+                    return json.loads(rows[0][0])
+        return None
+
+    def should_sample(self) -> bool:
+        """Stichprobe: bekannten Absender trotzdem vom LLM prüfen lassen."""
+        return random.random() < self.sample_rate
+
+    def record(self, decisions: Sequence[Tuple[str, List[str]]]) -> None:
+        """Zählt (sender, labels)-Entscheidungen für Adresse und Domain."""
+        now = time.time()
+        rows = [
+            (key, json.dumps(sorted(labels), ensure_ascii=False), now)
+            for sender, labels in decisions
+            for key in _keys(sender)
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                """
+                INSERT INTO sender_labels (sender, labels, count, updated_at)
+                VALUES (?, ?, 1, ?)
+                ON CONFLICT(sender, labels) DO UPDATE SET
+                    count = count + 1,
+                    updated_at = excluded.updated_at
+                """,
+                rows,
+            )
+            self._conn.commit()
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Iterable, List, Optional, TypeVar
+
+import httplib2
+import google_auth_httplib2
+import google.auth.credentials
+from google.oauth2.credentials import Credentials
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Token so rechtzeitig erneuern, dass laufende Requests nicht in ein 401 laufen
+REFRESH_MARGIN_SECONDS = 300
+
+
+class SharedCredentials(google.auth.credentials.Credentials):
+    """Gemeinsame OAuth-Credentials für alle Threads mit gesperrtem Refresh.
+
+    Delegiert an die echten `Credentials` und ist selbst ein
+    `google.auth.credentials.Credentials`, damit `build()`, `AuthorizedHttp` und
+    Batch-Requests sie wie gewohnt verwenden. Mehrere Threads, die gleichzeitig
+    ein abgelaufenes Token bemerken, lösen nur einen Refresh aus.
+    """
+
+    def __init__(self, creds: Credentials, on_refresh: Optional[Callable[[Credentials], None]] = None) -> None:
+        # Bewusst kein super().__init__(): Token/Expiry liegen ausschließlich in `_creds`
+        self._creds = creds
+        self._on_refresh = on_refresh
+        self._lock = threading.Lock()
+        self._refreshed_at = 0.0
+
+    @property
+    def credentials(self) -> Credentials:
+        return self._creds
+
+    @property
+    def token(self):
+        return self._creds.token
+
+    @property
+    def expiry(self):
+        return self._creds.expiry
+
+    @property
+    def expired(self) -> bool:
+        return self._creds.expired
+
+    @property
+    def valid(self) -> bool:
+        return self._creds.valid
+
+    def _needs_refresh(self) -> bool:
+        if not self._creds.valid:
+            return True
+        expiry = self._creds.expiry
+        if expiry is None:
+            return False
+        # google-auth speichert expiry als naive UTC-Zeit
+        remaining = (expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()
+        return remaining < REFRESH_MARGIN_SECONDS
+
+    def refresh(self, request, force: bool = False) -> None:
+        with self._lock:
+            # Ein anderer Thread hat soeben erneuert – nicht doppelt refreshen
+            if not force and time.time() - self._refreshed_at < 5 and self._creds.valid:
+                return
+            self._creds.refresh(request)
+            self._refreshed_at = time.time()
+            logger.debug("OAuth-Token erneuert (gültig bis %s)", getattr(self._creds, "expiry", None))
+        if self._on_refresh is not None:
+            try:
+                self._on_refresh(self._creds)
+            except Exception as exc:
+                logger.warning("Erneuertes Token konnte nicht gespeichert werden: %s", exc)
+
+    def ensure_fresh(self, request) -> None:
+        if self._needs_refresh():
+            self.refresh(request, force=True)
+
+    def before_request(self, request, method, url, headers) -> None:
+        self.ensure_fresh(request)
+        self.apply(headers)
+
+    def apply(self, headers, token=None) -> None:
+        self._creds.apply(headers, token=token)
+
+    def __getattr__(self, name):
+        # Übrige Attribute (z. B. `valid`, `token`) an die echten Credentials durchreichen
+        return getattr(self._creds, name)
+
+
+class TransportPool:
+    """Thread-sichere Transporte für die Gmail API.
+
+    httplib2 ist nicht thread-safe; jeder Worker-Thread bekommt deshalb eine
+    eigene, wiederverwendete (keep-alive) `AuthorizedHttp`-Verbindung. Alle
+    Verbindungen teilen sich dieselben `SharedCredentials`.
+    """
+
+    def __init__(self, creds: SharedCredentials, workers: int = 4, timeout: float = 60.0) -> None:
+        self.creds = creds
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self._local = threading.local()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def http(self) -> google_auth_httplib2.AuthorizedHttp:
+        """Die Verbindung des aktuellen Threads (wird beim ersten Zugriff angelegt)."""
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = google_auth_httplib2.AuthorizedHttp(self.creds, http=httplib2.Http(timeout=self.timeout))
+            self._local.http = http
+        return http
+
+    def map(self, fn: Callable[[T], R], items: Iterable[T]) -> List[R]:
+        """Führt `fn` für alle `items` parallel auf bis zu `workers` Threads aus (Reihenfolge bleibt)."""
+        items = list(items)
+        if self.workers == 1 or len(items) <= 1:
+            return [fn(item) for item in items]
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="gmail")
+        return list(self._executor.map(fn, items))
+
+    def close(self) -> None:
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
@@ -0,0 +1,66 @@
+"""Gemeinsame Fixtures: Classifier gegen ein simuliertes Ollama (httpx.MockTransport)."""
+import hashlib
+import json
+from typing import Callable, List, Optional
+
+import httpx
+import pytest
+
+from app.classifier import Classifier
+
+LABELS = ["Rechnung", "Shopping", "Banking", "Sonstiges"]
+# Stichwort-Heuristik trifft "Rechnung" (Betreff + Body), ein LLM-"Sonstiges" wird zum Fallback
+RECHNUNG_MAIL = ("rechnung@firma.de", "Ihre Rechnung 2025-09", "Betrag 129,00 EUR, Zahlungsziel 14 Tage.")
+
+
+def _embedding(text: str, dim: int = 8) -> List[float]:
+    """Deterministischer Pseudo-Vektor je Text (gleicher Text -> gleicher Vektor)."""
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [b / 255.0 - 0.5 for b in digest[:dim]]
+
+
+class FakeOllama:
+    """Antwortet auf /api/chat mit festen Labels und auf /api/embed mit Pseudo-Vektoren."""
+
+    def __init__(self, labels: List[str], chat: Optional[Callable[[dict], dict]] = None) -> None:
+        self.labels = labels
+        self.chat = chat
+        self.paths: List[str] = []
+        # read-Timeout je Anfrage (httpx legt ihn in request.extensions ab)
+        self.timeouts: List[Optional[float]] = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.paths.append(request.url.path)
+        self.timeouts.append(request.extensions.get("timeout", {}).get("read"))
+        body = json.loads(request.content)
+        if request.url.path == "/api/embed":
+            return httpx.Response(200, json={"embeddings": [_embedding(t) for t in body["input"]]})
+        content = self.chat(body) if self.chat else {"labels": self.labels}
+        return httpx.Response(200, json={"message": {"content": json.dumps(content)}})
+
+    @property
+    def chat_calls(self) -> int:
+        return self.paths.count("/api/chat")
+
+
+@pytest.fixture
+def rechnung_mail():
+    return RECHNUNG_MAIL
+
+
+@pytest.fixture
+def make_classifier():
+    """Fabrik `make_classifier(labels, chat=None, **kwargs)` -> (Classifier, FakeOllama)."""
+    created: List[Classifier] = []
+
+    def factory(llm_labels=("Sonstiges",), chat=None, **kwargs):
+        ollama = FakeOllama(list(llm_labels), chat)
+        c = Classifier(LABELS, keep_alive=None, **kwargs)
+        c._client.close()
+        c._client = httpx.Client(base_url="http://ollama", transport=httpx.MockTransport(ollama))
+        created.append(c)
+        return c, ollama
+
+    yield factory
+    for c in created:
+        c.close()
@@ -0,0 +1,25 @@
+"""Postfach-Konfiguration für Einzel-Läufe (backfill, model train)."""
+from app.accounts import account_file, mailbox_config
+from app.config import AppConfig
+
+
+def test_default_mailbox_keeps_files():
+    cfg = AppConfig()
+    assert mailbox_config(cfg) == (cfg, None)
+
+
+def test_other_token_gets_own_files():
+    cfg = AppConfig()
+    acc_cfg, account = mailbox_config(cfg, "token_shop.json")
+    assert account.name == "shop"
+    assert acc_cfg.label_cache_file == account_file(cfg.label_cache_file, "shop")
+    assert acc_cfg.message_cache_file == account_file(cfg.message_cache_file, "shop")
+    assert acc_cfg.history_state_file == account_file(cfg.history_state_file, "shop")
+    assert account_file(".gmail_backfill.json", "shop") == ".gmail_backfill.shop.json"
+
+
+def test_multi_mailbox_default_token_matches_run():
+    cfg = AppConfig(gmail_accounts=["token.json", "token_shop.json"])
+    acc_cfg, account = mailbox_config(cfg, "token.json")
+    assert account.name == "token"
+    assert acc_cfg.label_cache_file == account_file(cfg.label_cache_file, "token")
@@ -0,0 +1,85 @@
+"""Backfill: Abbruch und Fortsetzen über den Checkpoint."""
+import pytest
+
+from app import backfill as bf
+from app.config import AppConfig
+
+PAGES = [["m1", "m2", "m3"], ["m4", "m5"], ["m6"]]
+
+
+class _Gmail:
+    store = None
+
+    def iter_message_pages(self, q, page_token=None):
+        n = int(page_token or 0)
+        while n < len(PAGES):
+            next_token = str(n + 1) if n + 1 < len(PAGES) else None
+            yield PAGES[n], next_token, 6
+            n += 1
+
+    def close(self):
+        pass
+
+
+class _Classifier:
+    classify_many = None
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def run(monkeypatch, tmp_path):
+    labelled = []
+    state = {"fail_at": None}
+
+    def label_messages(cfg, gmail, registry, classify_many, block):
+        if state["fail_at"] is not None and state["fail_at"] in block:
+            raise RuntimeError("Abbruch")
+        labelled.extend(block)
+        return len(block)
+
+    monkeypatch.setattr(bf, "load_config", lambda: AppConfig())
+    monkeypatch.setattr(bf, "build_gmail", lambda cfg, token_path: _Gmail())
+    monkeypatch.setattr(bf, "build_classifier", lambda cfg: _Classifier())
+    monkeypatch.setattr(bf, "prepare_labels", lambda cfg, gmail: None)
+    monkeypatch.setattr(bf, "label_messages", label_messages)
+    path = str(tmp_path / "backfill.json")
+
+    def _run(fail_at=None, **kwargs):
+        state["fail_at"] = fail_at
+        return bf.backfill("in:inbox", batch_size=2, checkpoint_path=path, dry_run=False, **kwargs)
+
+    return _run, labelled
+
+
+def test_resume_after_abort_processes_each_message_once(run):
+    _run, labelled = run
+    with pytest.raises(RuntimeError):
+        _run(fail_at="m5")
+    # Block ["m4", "m5"] ist abgebrochen, Seite 1 vollständig
+    assert labelled == ["m1", "m2", "m3"]
+    checkpoint = _run()
+    assert labelled == ["m1", "m2", "m3", "m4", "m5", "m6"]
+    assert checkpoint.finished and checkpoint.processed == 6 and checkpoint.written == 6
+
+
+def test_finished_backfill_is_not_repeated(run):
+    _run, labelled = run
+    _run()
+    _run()
+    assert len(labelled) == 6
+
+
+def test_restart_ignores_checkpoint(run):
+    _run, labelled = run
+    _run()
+    _run(restart=True)
+    assert len(labelled) == 12
+
+
+def test_checkpoint_of_other_query_is_ignored(tmp_path):
+    path = str(tmp_path / "backfill.json")
+    bf.BackfillCheckpoint(query="in:inbox", page_token="3", processed=10).save(path)
+    assert bf.BackfillCheckpoint.load(path, "label:x").processed == 0
+    assert bf.BackfillCheckpoint.load(path, "in:inbox").page_token == "3"
@@ -0,0 +1,125 @@
+"""Unbestätigte Ergebnisse (Heuristik-/Fehler-Fallback) dürfen nie persistiert werden."""
+import time
+
+import httpx
+import pytest
+
+from app.classification_cache import ClassificationCache
+from app.classifier import _Unconfirmed
+from app.local_model import LocalModel
+from app.sender_memory import SenderMemory
+
+
+def _embedding_index(path):
+    pytest.importorskip("numpy")
+    from app.embedding_index import EmbeddingIndex
+
+    return EmbeddingIndex(str(path / "emb"), "m")
+
+
+# Name -> (Classifier-Argument, Fabrik(tmp_path), "hat die Mail gespeichert?")
+STORES = {
+    "cache": ("cache", lambda p: ClassificationCache(str(p / "cache.sqlite3")), lambda s, m: s.lookup([m]) != [None]),
+    "memory": (
+        "memory",
+        lambda p: SenderMemory(str(p / "senders.sqlite3"), min_count=1, sample_rate=0.0),
+        lambda s, m: s.suggest(m[0]) is not None,
+    ),
+    "local_model": ("local_model", lambda p: LocalModel(None, threshold=0.5, min_docs=1), lambda s, m: s.docs > 0),
+    "embeddings": ("embeddings", _embedding_index, lambda s, m: len(s) > 0),
+}
+
+
+@pytest.mark.parametrize("llm_labels, confirmed", [(["Sonstiges"], False), (["Shopping"], True)])
+def test_classify_marks_heuristic_fallback_unconfirmed(make_classifier, rechnung_mail, llm_labels, confirmed):
+    c, _ = make_classifier(llm_labels)
+    labels = c.classify(*rechnung_mail)
+    # "Sonstiges" vom LLM -> Heuristik-Fallback "Rechnung"
+    assert labels == (["Shopping"] if confirmed else ["Rechnung"])
+    assert isinstance(labels, _Unconfirmed) is not confirmed
+
+
+@pytest.mark.parametrize("store", list(STORES))
+@pytest.mark.parametrize("llm_labels, persisted", [(["Sonstiges"], False), (["Shopping"], True)])
+def test_only_confirmed_answers_are_persisted(make_classifier, rechnung_mail, tmp_path, store, llm_labels, persisted):
+    arg, build, contains = STORES[store]
+    target = build(tmp_path)
+    c, _ = make_classifier(llm_labels, **{arg: target})
+    for _ in range(3):
+        c.classify_many([rechnung_mail])
+    assert contains(target, rechnung_mail) is persisted
+
+
+def test_cache_hit_skips_llm(make_classifier, rechnung_mail, tmp_path):
+    c, ollama = make_classifier(["Shopping"], cache=ClassificationCache(str(tmp_path / "cache.sqlite3")))
+    c.classify_many([rechnung_mail])
+    assert c.classify_many([rechnung_mail]) == [["Shopping"]]
+    assert ollama.chat_calls == 1
+
+
+def test_batch_falls_back_to_single_calls_for_missing_ids(make_classifier):
+    def chat(body):
+        if "results" in str(body.get("format")):
+            # Antwort nur für m1, dazu eine unbekannte ID
+            return {"results": [{"id": "m1", "labels": ["Shopping"]}, {"id": "m9", "labels": ["Banking"]}]}
+        return {"labels": ["Banking"]}
+
+    c, ollama = make_classifier(chat=chat, batch_size=3)
+    results = c.classify_many([("a@x.de", f"Hallo {i}", "Text") for i in range(3)])
+    assert results == [["Shopping"], ["Banking"], ["Banking"]]
+    assert ollama.chat_calls == 3
+
+
+def _trained_model(mail):
+    model = LocalModel(None, threshold=0.0, min_docs=0)
+    model.learn([mail], [["Shopping"]])
+    return model
+
+
+# Abkürzungen vor dem LLM: (Classifier-Argumente, Vorbereitung mit erstem LLM-Lauf?)
+SHORTCUTS = {
+    "cache": (lambda p, m: {"cache": ClassificationCache(str(p / "cache.sqlite3"))}, True),
+    "duplicate": (lambda p, m: {"cache": ClassificationCache(str(p / "cache.sqlite3"))}, False),
+    "heuristics_first": (lambda p, m: {"heuristics_first": True}, False),
+    "local_model": (lambda p, m: {"local_model": _trained_model(m)}, False),
+}
+
+
+@pytest.mark.parametrize("shortcut", list(SHORTCUTS))
+def test_shortcut_answers_are_not_recorded_in_sender_memory(make_classifier, rechnung_mail, tmp_path, shortcut):
+    build, warm = SHORTCUTS[shortcut]
+    memory = SenderMemory(str(tmp_path / "senders.sqlite3"), min_count=100, sample_rate=0.0)
+    c, ollama = make_classifier(["Shopping"], memory=memory, **build(tmp_path, rechnung_mail))
+    if warm:
+        c.classify_many([rechnung_mail])
+    before = ollama.chat_calls
+    batch = [rechnung_mail, rechnung_mail] if shortcut == "duplicate" else [rechnung_mail]
+    c.classify_many(batch)
+    counted = memory._conn.execute("SELECT COALESCE(SUM(count), 0) FROM sender_labels WHERE sender LIKE 'addr:%'").fetchone()[0]
+    # Gezählt werden nur die LLM-Anfragen dieses Tests
+    assert counted == ollama.chat_calls
+    assert ollama.chat_calls - before == (1 if shortcut == "duplicate" else 0)
+
+
+def test_item_timeout_bounds_requests_without_parallelism(make_classifier, rechnung_mail, monkeypatch):
+    real_sleep = time.sleep
+
+    def slow(body):
+        real_sleep(0.3)
+        raise httpx.ReadTimeout("Ollama antwortet nicht")
+
+    c, ollama = make_classifier(chat=slow, concurrency=1)
+    monkeypatch.setattr("app.classifier.time.sleep", lambda s: None)
+    [result] = c.classify_many([rechnung_mail], item_timeout=0.2)
+    assert isinstance(result, TimeoutError)
+    # Nur ein Versuch, dessen read-Timeout auf die Frist gekürzt ist
+    assert ollama.chat_calls == 1
+    assert ollama.timeouts[0] <= 0.2
+
+
+def test_executors_are_kept_per_concurrency(make_classifier):
+    c, _ = make_classifier()
+    two = c._get_executor(2)
+    assert c._get_executor(3) is not two
+    assert c._get_executor(2) is two
+    assert two.submit(lambda: 1).result() == 1
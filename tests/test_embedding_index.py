@@ -0,0 +1,74 @@
+"""Embedding-Index: Laden, gespeicherte Normen, Lesefehler, Modellwechsel."""
+import os
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.embedding_index import EmbeddingIndex  # noqa: E402
+
+
+def _vectors(n, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).tolist()
+
+
+def test_index_reloads_from_disk(tmp_path):
+    path = str(tmp_path / "emb")
+    EmbeddingIndex(path, "m", k=1).add(_vectors(3), [["Shopping"]] * 3)
+    index = EmbeddingIndex(path, "m", k=1)
+    assert len(index) == 3
+    assert index.neighbours_agree(_vectors(3)[:1]) == [["Shopping"]]
+
+
+def test_unreadable_meta_keeps_files(tmp_path):
+    path = str(tmp_path / "emb")
+    EmbeddingIndex(path, "m").add(_vectors(3), [["Shopping"]] * 3)
+    with open(f"{path}.meta.json", "w", encoding="utf-8") as f:
+        f.write('{"model": "m", "di')
+    before = {p: open(p, "rb").read() for p in (f"{path}.f16", f"{path}.labels.jsonl", f"{path}.meta.json")}
+
+    index = EmbeddingIndex(path, "m", k=1)
+    assert len(index) == 0
+    index.add(_vectors(2, seed=1), [["Banking"]] * 2)
+    assert len(index) == 2
+    assert {p: open(p, "rb").read() for p in before} == before
+
+
+def test_model_change_rebuilds_index(tmp_path):
+    path = str(tmp_path / "emb")
+    EmbeddingIndex(path, "m").add(_vectors(3), [["Shopping"]] * 3)
+    assert len(EmbeddingIndex(path, "other")) == 0
+    assert not os.path.exists(f"{path}.f16")
+    assert not os.path.exists(f"{path}.norms.f32")
+
+
+def test_norms_are_loaded_not_recomputed(tmp_path, monkeypatch):
+    path = str(tmp_path / "emb")
+    EmbeddingIndex(path, "m").add(_vectors(3), [["Shopping"]] * 3)
+    monkeypatch.setattr(EmbeddingIndex, "_row_norms", staticmethod(lambda m: pytest.fail("Normen neu berechnet")))
+    index = EmbeddingIndex(path, "m")
+    assert np.allclose(index._norms, np.linalg.norm(np.asarray(_vectors(3), dtype=np.float16).astype(np.float32), axis=1))
+
+
+def test_missing_norms_are_recomputed(tmp_path):
+    path = str(tmp_path / "emb")
+    EmbeddingIndex(path, "m").add(_vectors(3), [["Shopping"]] * 3)
+    # Abgebrochenes Anhängen: nur die Norm der ersten Zeile steht in der Datei
+    with open(f"{path}.norms.f32", "r+b") as f:
+        f.truncate(4)
+    index = EmbeddingIndex(path, "m", k=1)
+    assert len(index._norms) == 3
+    assert os.path.getsize(f"{path}.norms.f32") == 3 * 4
+    assert index.neighbours_agree(_vectors(3)[2:]) == [["Shopping"]]
+
+
+def test_neighbour_answers_are_not_recorded_in_sender_memory(make_classifier, rechnung_mail, tmp_path):
+    from app.sender_memory import SenderMemory
+
+    memory = SenderMemory(str(tmp_path / "senders.sqlite3"), min_count=100, sample_rate=0.0)
+    index = EmbeddingIndex(str(tmp_path / "emb"), "m", k=1)
+    c, ollama = make_classifier(["Shopping"], memory=memory, embeddings=index)
+    c.classify_many([rechnung_mail])
+    assert c.classify_many([rechnung_mail]) == [["Shopping"]]
+    assert ollama.chat_calls == 1
+    assert memory._conn.execute("SELECT SUM(count) FROM sender_labels WHERE sender LIKE 'addr:%'").fetchone()[0] == 1
@@ -0,0 +1,91 @@
+"""apply_label_changes: Wiederholung nur für Änderungen ohne erfolgreiche Antwort."""
+import httplib2
+from googleapiclient.errors import HttpError
+
+from app.gmail_client import GmailClient
+from app.planner import LabelChange
+from app.quota import QuotaScheduler
+from app.transport import TransportPool
+
+
+def _http_error(status: int) -> HttpError:
+    return HttpError(httplib2.Response({"status": status}), b'{"error": {"message": "x"}}')
+
+
+class _Request:
+    def __init__(self, service, body):
+        self.service, self.body = service, body
+
+    def execute(self, http=None, num_retries=0):
+        self.service.single.append(self.body["ids"])
+        return {}
+
+
+class _Batch:
+    """Beantwortet Teil-Requests der Reihe nach und bricht nach `answer` Antworten ab."""
+
+    def __init__(self, service, callback):
+        self.service, self.callback, self.requests = service, callback, []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self, http=None):
+        for n, (request_id, request) in enumerate(self.requests):
+            if n == self.service.answer:
+                raise _http_error(500)
+            self.service.batched.append(request.body["ids"])
+            error = _http_error(400) if request.body["ids"] in self.service.fail else None
+            self.callback(request_id, None if error else {}, error)
+
+
+class _Service:
+    def __init__(self, answer, fail=()):
+        self.answer, self.fail = answer, list(fail)
+        self.batched, self.single = [], []
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def batchModify(self, userId, body):
+        return _Request(self, body)
+
+    def new_batch_http_request(self, callback=None):
+        return _Batch(self, callback)
+
+
+def _client(service) -> GmailClient:
+    gmail = GmailClient.__new__(GmailClient)
+    gmail.store = None
+    gmail.scheduler = QuotaScheduler(10000, base_delay=0.01)
+    gmail.pool = TransportPool(None, workers=1)
+    gmail.pool.http = lambda: None
+    gmail.service = service
+    return gmail
+
+
+def _changes(n):
+    return [LabelChange(add=("L1",), remove=(), ids=[f"m{i}"]) for i in range(n)]
+
+
+def test_batch_error_requeues_only_unanswered_changes():
+    service = _Service(answer=2)
+    _client(service).apply_label_changes(_changes(5))
+    assert service.batched == [["m0"], ["m1"]]
+    assert service.single == [["m2"], ["m3"], ["m4"]]
+
+
+def test_failed_callback_is_retried_once():
+    service = _Service(answer=2, fail=[["m1"]])
+    _client(service).apply_label_changes(_changes(4))
+    assert sorted(service.single) == [["m1"], ["m2"], ["m3"]]
+
+
+def test_successful_batch_sends_nothing_twice():
+    service = _Service(answer=-1)
+    _client(service).apply_label_changes(_changes(3))
+    assert service.batched == [["m0"], ["m1"], ["m2"]]
+    assert service.single == []
@@ -0,0 +1,62 @@
+"""Stichwort-Heuristik: Wortgrenzen und eindeutige Treffer (Heuristik-zuerst)."""
+import pytest
+
+from app.heuristics import HeuristicEngine, load_engine
+
+RULES = [
+    {"label": "Rechnung", "match": "prefix", "keywords": ["rechnung", "rechnungsnummer", "zahlungsziel"]},
+    {"label": "Banking", "match": "word", "keywords": ["konto"]},
+    {"label": "Shopping", "match": "word", "keywords": ["track", "bestellung"]},
+    {"label": "Newsletter", "match": "substring", "fields": ["sender"], "keywords": ["newsletter@"]},
+    {"label": "Support", "match": "word", "keywords": ["support"]},
+]
+
+
+@pytest.fixture
+def engine():
+    return HeuristicEngine(RULES)
+
+
+@pytest.mark.parametrize(
+    "subject, labels",
+    [
+        ("Racetrack Weekend", []),
+        ("Track your order", ["Shopping"]),
+        ("Neues Bankkonto", []),
+        ("Ihr Konto", ["Banking"]),
+        ("Rechnungsnummer 123", ["Rechnung"]),
+        ("Rechnungen März", ["Rechnung"]),
+    ],
+)
+def test_word_boundaries(engine, subject, labels):
+    assert engine.labels(subject, "a@example.org", "") == labels
+
+
+def test_prefix_keywords_of_one_word_are_not_decisive(engine):
+    # "rechnungsnummer" enthält "rechnung": eine Fundstelle, kein zweites Stichwort
+    assert engine.decide("Ihre Rechnungsnummer 123", "a@example.org", "") is None
+
+
+def test_two_keywords_at_different_places_are_decisive(engine):
+    assert engine.decide("Rechnungsnummer 123", "a@example.org", "Ihre Rechnung, Zahlungsziel 14 Tage") == ["Rechnung"]
+    assert engine.decide("Ihre Rechnung", "a@example.org", "Rechnung im Anhang") is None
+
+
+def test_sender_only_hit_of_sender_rule_is_decisive(engine):
+    assert engine.decide("Angebote der Woche", "newsletter@shop.de", "") == ["Newsletter"]
+
+
+def test_generic_keyword_in_sender_address_is_not_decisive(engine):
+    # "support" steht nur zufällig in der Adresse, die Regel zielt nicht auf den Absender
+    assert engine.labels("Hallo", "support@firma.de", "") == ["Support"]
+    assert engine.decide("Hallo", "support@firma.de", "") is None
+
+
+def test_several_labels_are_never_decisive(engine):
+    assert engine.decide("Rechnung Bestellung", "a@example.org", "Zahlungsziel") is None
+
+
+def test_shipped_rules_load():
+    engine = load_engine()
+    assert engine.labels("Versandbestätigung Bestellung 12345", "shop@beispiel.de", "") == ["Shopping"]
+    assert engine.labels("Racetrack Weekend", "friend@example.org", "") == []
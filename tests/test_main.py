@@ -0,0 +1,64 @@
+"""History-Delta: nur Nachrichten, die auch GMAIL_Q treffen; Pass 2 im Intervall."""
+from app import main
+from app.gmail_client import MessageMeta
+from app.history_sync import HistorySync
+
+
+class _Gmail:
+    def __init__(self, pages, stamps=None):
+        self.pages = pages
+        self.stamps = stamps or {}
+        self.listed = 0
+        self.queries = []
+
+    def fetch_messages_metadata(self, ids):
+        return [MessageMeta(mid, mid, "", "", internal_ts=self.stamps[mid]) if mid in self.stamps else None for mid in ids]
+
+    def iter_message_pages(self, q, page_token=None):
+        self.queries.append(q)
+        for n, ids in enumerate(self.pages):
+            self.listed += 1
+            yield ids, str(n + 1) if n + 1 < len(self.pages) else None, 0
+
+
+def test_delta_is_filtered_by_query():
+    gmail = _Gmail([["m1", "m2"], ["m3"]])
+    assert main._filter_by_query(gmail, "is:unread", ["m3", "x", "m1"]) == ["m3", "m1"]
+
+
+def test_delta_filter_stops_when_all_ids_found():
+    gmail = _Gmail([["m1", "m2"], ["m3"], ["m4"]])
+    assert main._filter_by_query(gmail, "is:unread", ["m2"]) == ["m2"]
+    assert gmail.listed == 1
+
+
+def test_delta_filter_is_bounded(monkeypatch):
+    monkeypatch.setattr(main, "_DELTA_QUERY_PAGES", 2)
+    gmail = _Gmail([["a"], ["b"], ["m1"]])
+    assert main._filter_by_query(gmail, "in:inbox", ["m1"]) == []
+    assert gmail.listed == 2
+
+
+def test_empty_query_keeps_delta():
+    assert main._filter_by_query(_Gmail([]), "", ["m1"]) == ["m1"]
+
+
+def test_delta_query_is_bounded_by_oldest_message():
+    gmail = _Gmail([["m1", "m2"]], stamps={"m1": 1_700_000_500_000, "m2": 1_700_000_000_999})
+    assert main._filter_by_query(gmail, "is:unread", ["m1", "m2", "gone"]) == ["m1", "m2"]
+    assert gmail.queries == ["(is:unread) after:1699999999"]
+
+
+def test_relabel_interval_is_persisted(tmp_path, monkeypatch):
+    state = str(tmp_path / "history.json")
+    sync = HistorySync(None, state)
+    sync.history_id = "42"
+    assert sync.relabel_due(3600)
+    monkeypatch.setattr("app.history_sync.time.time", lambda: 10_000.0)
+    sync.mark_relabeled()
+    reloaded = HistorySync(None, state)
+    assert reloaded.history_id == "42"
+    assert not reloaded.relabel_due(3600)
+    assert not reloaded.relabel_due(0)
+    monkeypatch.setattr("app.history_sync.time.time", lambda: 13_600.0)
+    assert reloaded.relabel_due(3600)
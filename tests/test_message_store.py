@@ -0,0 +1,29 @@
+"""labelIds im Nachrichten-Cache: nur per TTL oder explizitem invalidate veraltet."""
+import time
+
+from app.gmail_client import MessageMeta
+from app.message_store import MessageStore
+
+
+def _store(tmp_path, label_ttl=120):
+    store = MessageStore(str(tmp_path / "messages.sqlite3"), label_ttl=label_ttl)
+    store.put_metas([MessageMeta("m1", "t1", "Betreff", "a@x.de", label_ids=["INBOX"], history_id="5")])
+    return store
+
+
+def test_labels_expire_after_ttl(tmp_path, monkeypatch):
+    store = _store(tmp_path)
+    assert list(store.get_metas(["m1"])) == ["m1"]
+    later = time.time() + 121
+    monkeypatch.setattr("app.message_store.time.time", lambda: later)
+    assert store.get_metas(["m1"]) == {}
+    store.close()
+
+
+def test_invalidate_keeps_body_but_drops_labels(tmp_path):
+    store = _store(tmp_path)
+    store.put_cores({"m1": ("Betreff", "a@x.de", "Text", ["INBOX"], 0)})
+    store.invalidate(["m1"])
+    assert store.get_metas(["m1"]) == {}
+    assert store.get_cores(["m1"])["m1"][2] == "Text"
+    store.close()
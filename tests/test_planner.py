@@ -0,0 +1,29 @@
+"""plan_label_changes: nur nötige Schreibzugriffe, gruppiert und aufgeteilt."""
+from app.planner import plan_label_changes
+
+
+def test_already_labelled_messages_are_skipped():
+    desired = {"m1": ({"L1"}, set()), "m2": ({"L1"}, set())}
+    current = {"m1": ["L1", "INBOX"], "m2": ["INBOX"]}
+    changes = plan_label_changes(desired, current)
+    assert [(c.add, c.remove, c.ids) for c in changes] == [(("L1",), (), ["m2"])]
+
+
+def test_identical_diffs_are_grouped_and_split():
+    desired = {f"m{i}": ({"L1"}, {"L2"}) for i in range(5)}
+    current = {f"m{i}": ["L2"] for i in range(5)}
+    changes = plan_label_changes(desired, current, max_ids=2)
+    assert [c.ids for c in changes] == [["m0", "m1"], ["m2", "m3"], ["m4"]]
+    assert all(c.add == ("L1",) and c.remove == ("L2",) for c in changes)
+
+
+def test_unknown_state_writes_everything():
+    desired = {"m1": ({"L1"}, {"L2"})}
+    changes = plan_label_changes(desired, {"m1": None})
+    assert [(c.add, c.remove) for c in changes] == [(("L1",), ("L2",))]
+
+
+def test_remove_never_drops_a_desired_label():
+    desired = {"m1": ({"L1"}, {"L1", "L2"})}
+    changes = plan_label_changes(desired, {"m1": ["L1", "L2"]})
+    assert [(c.add, c.remove) for c in changes] == [((), ("L2",))]
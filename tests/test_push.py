@@ -0,0 +1,76 @@
+"""Push-Modus: Zusammenfassen von Benachrichtigungen, Webhook und `notify`-CLI."""
+import base64
+import json
+
+import httpx
+import pytest
+
+from app import push
+
+
+@pytest.fixture
+def server():
+    """Webhook auf freiem Port mit Token -> (trigger, URL)."""
+    trigger = push.PushTrigger()
+    srv = push.start_push_server(trigger, "127.0.0.1", 0, token="geheim")
+    yield trigger, f"http://127.0.0.1:{srv.server_address[1]}{push.PUSH_PATH}?token=geheim"
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_notifications_are_coalesced_into_one_run():
+    trigger = push.PushTrigger()
+    for _ in range(3):
+        trigger.notify()
+    assert trigger.wait(0) is True
+    assert trigger.wait(0) is False
+    assert trigger.received == 3
+
+
+def test_stop_wakes_waiter_without_run():
+    trigger = push.PushTrigger()
+    trigger.stop()
+    assert trigger.wait(5) is False
+    assert trigger.stopped
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [
+        json.dumps({"message": {"data": base64.b64encode(b'{"emailAddress": "a@x.de", "historyId": 7}').decode()}}),
+        json.dumps({"emailAddress": "a@x.de", "historyId": 7}),
+    ],
+)
+def test_parse_pubsub_and_plain_notifications(raw):
+    assert push.parse_push_notification(raw.encode()) == {"emailAddress": "a@x.de", "historyId": "7"}
+
+
+def test_fake_notifier_triggers_run(server):
+    trigger, url = server
+    assert push.send_fake_notification(url, history_id="42") == 204
+    assert trigger.wait(5) is True
+
+
+@pytest.mark.parametrize("body", [b"kein json", b"[]", b'{"message": {"data": "%%%"}}', b'{"emailAddress": "a@x.de"}'])
+def test_malformed_body_is_acknowledged_but_ignored(server, body):
+    trigger, url = server
+    assert httpx.post(url, content=body).status_code == 204
+    assert trigger.received == 0
+
+
+@pytest.mark.parametrize("path, status", [(f"{push.PUSH_PATH}?token=falsch", 403), ("/anders?token=geheim", 404)])
+def test_wrong_token_or_path_is_rejected(server, path, status):
+    trigger, url = server
+    base = url[: url.index(push.PUSH_PATH)]
+    assert push.send_fake_notification(base + path) == status
+    assert trigger.received == 0
+
+
+def test_notify_cli_sends_count_notifications(server, monkeypatch, capsys):
+    trigger, url = server
+    monkeypatch.setattr("sys.argv", ["push", "notify", "--url", url, "--count", "3"])
+    push.main()
+    assert capsys.readouterr().out.count("-> HTTP 204") == 3
+    assert trigger.received == 3
+    assert trigger.wait(0) is True
+    assert trigger.wait(0) is False
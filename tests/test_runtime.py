@@ -0,0 +1,41 @@
+"""Token-Refresh im Hintergrund darf nicht mit einem Reload (SIGHUP) kollidieren."""
+import threading
+import time
+
+from app import runtime
+from app.runtime import Mailbox, Runtime
+
+
+class _Gmail:
+    def __init__(self, events):
+        self.events = events
+        self.creds = self
+        self.refreshing = threading.Event()
+
+    def ensure_fresh(self, request):
+        self.refreshing.set()
+        time.sleep(0.2)
+        self.events.append("refreshed")
+
+    def close(self):
+        self.events.append("closed")
+
+
+def test_reload_waits_for_running_token_refresh(monkeypatch):
+    monkeypatch.setattr(runtime, "CREDENTIAL_CHECK_SECONDS", 0.01)
+    events = []
+    gmail = _Gmail(events)
+    rt = Runtime.__new__(Runtime)
+    rt.stop_event = threading.Event()
+    rt._clients_lock = threading.Lock()
+    rt._pool = None
+    rt.classifier = type("C", (), {"close": lambda self: None})()
+    rt.mailboxes = [Mailbox(name="token", cfg=None, gmail=gmail, classify_many=None)]
+    refresher = threading.Thread(target=rt._refresh_loop, daemon=True)
+    refresher.start()
+    assert gmail.refreshing.wait(5)
+    rt._teardown()
+    rt.stop_event.set()
+    refresher.join(5)
+    assert events[:2] == ["refreshed", "closed"]
+    assert rt.mailboxes == []
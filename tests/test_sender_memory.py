@@ -0,0 +1,26 @@
+"""Sender-Memory: Statistik pro Adresse und (nicht geteilter) Domain."""
+from app.sender_memory import SenderMemory
+
+
+def _memory(tmp_path):
+    return SenderMemory(str(tmp_path / "senders.sqlite3"), min_count=2, sample_rate=0.0)
+
+
+def test_company_domain_covers_other_addresses(tmp_path):
+    memory = _memory(tmp_path)
+    memory.record([("a@shop.de", ["Shopping"]), ("b@shop.de", ["Shopping"])])
+    assert memory.suggest("Shop <c@shop.de>") == ["Shopping"]
+
+
+def test_freemail_domain_is_not_shared(tmp_path):
+    memory = _memory(tmp_path)
+    memory.record([(f"person{i}@gmail.com", ["Banking"]) for i in "abcdef"])
+    assert memory.suggest("stranger@gmail.com") is None
+    rows = memory._conn.execute("SELECT sender FROM sender_labels WHERE sender LIKE 'domain:%'").fetchall()
+    assert rows == []
+
+
+def test_freemail_address_still_counts(tmp_path):
+    memory = _memory(tmp_path)
+    memory.record([("anna@gmx.de", ["Support"])] * 2)
+    assert memory.suggest("Anna <anna@gmx.de>") == ["Support"]